@@ -4,9 +4,12 @@ Ravenclaw Discord Bot
 Commands to control the email bridge from Discord
 """
 
+import logging
 import os
 import sys
 
+import ravenclaw_logging
+
 # Load env
 ENV_FILE = '.env'
 if os.path.exists(ENV_FILE):
@@ -19,62 +22,141 @@ if os.path.exists(ENV_FILE):
 
 DISCORD_BOT_TOKEN = os.environ.get('DISCORD_BOT_TOKEN')
 BRIDGE_URL = os.environ.get('BRIDGE_URL', 'http://localhost:5002')
+CACHE_TTL = float(os.environ.get('BOT_CACHE_TTL', '5'))  # seconds to reuse /health and /stats
+
+# Logging (queued, rotated; same LOG_* settings as the bridge)
+logger = ravenclaw_logging.setup_logging('ravenclaw-bot', 'RAVENCLAW-BOT', 'ravenclaw-bot.log')
 
 if not DISCORD_BOT_TOKEN:
-    print("[ERROR] DISCORD_BOT_TOKEN not found in .env!")
+    logger.error("DISCORD_BOT_TOKEN not found in .env!")
     sys.exit(1)
 
+import asyncio
+import json
+import aiohttp  # Ships with discord.py
 import discord
 from discord.ext import commands
-import requests
+
+class BridgeClient:
+    """
+    Async client for the bridge API.
+    One pooled session, short-TTL cache for read endpoints, and coalescing
+    so concurrent identical commands share a single in-flight request.
+    """
+
+    def __init__(self, base_url, cache_ttl):
+        self.base_url = base_url.rstrip('/')
+        self.cache_ttl = cache_ttl
+        self.session = None
+        self._cache = {}     # key -> (expires_at, status, data)
+        self._inflight = {}  # key -> asyncio.Task
+
+    async def start(self):
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=10))
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+    async def _fetch(self, method, path, payload, timeout):
+        async with self.session.request(
+            method, f'{self.base_url}{path}', json=payload,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as r:
+            try:
+                data = await r.json(content_type=None)
+            except ValueError:
+                data = None
+            return r.status, data
+
+    async def request(self, method, path, payload=None, timeout=10, cached=False):
+        """Returns (status, data); raises on connection errors"""
+        loop = asyncio.get_running_loop()
+        key = (method, path, json.dumps(payload, sort_keys=True) if payload else None)
+
+        if cached:
+            hit = self._cache.get(key)
+            if hit and hit[0] > loop.time():
+                return hit[1], hit[2]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(method, path, payload, timeout))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        status, data = await asyncio.shield(task)
+
+        if cached and status == 200:
+            self._cache[key] = (loop.time() + self.cache_ttl, status, data)
+        elif method != 'GET':
+            self._cache.clear()  # Writes make cached stats stale
+        return status, data
+
+    async def get(self, path, timeout=5):
+        return await self.request('GET', path, timeout=timeout, cached=True)
+
+    async def post(self, path, payload=None, timeout=10):
+        return await self.request('POST', path, payload, timeout=timeout)
+
+bridge = BridgeClient(BRIDGE_URL, CACHE_TTL)
+
+class RavenclawBot(commands.Bot):
+    async def setup_hook(self):
+        await bridge.start()
+
+    async def close(self):
+        await bridge.close()
+        await super().close()
 
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+bot = RavenclawBot(command_prefix='!', intents=intents, help_command=None)  # !help below replaces the built-in one
 
 @bot.event
 async def on_ready():
-    print(f"[OK] Ravenclaw Bot online: {bot.user}")
-    print(f"[OK] Servers: {len(bot.guilds)}")
+    logger.info(f"Ravenclaw Bot online: {bot.user} ({len(bot.guilds)} servers)")
 
 @bot.command(name='check', help='Check for new emails')
 async def check(ctx):
     try:
-        requests.post(f'{BRIDGE_URL}/check', timeout=10)
+        await bridge.post('/check')
         await ctx.send('[OK] Email check triggered!')
     except Exception as e:
+        logger.error(f"!check failed: {e}")
         await ctx.send(f'[ERROR] {e}')
 
 @bot.command(name='send', help='Send email: !send <to> <subject> <message>')
 async def send(ctx, to: str, subject: str, *, message: str):
     try:
-        r = requests.post(f'{BRIDGE_URL}/send', json={
+        code, _ = await bridge.post('/send', {
             'to': to, 'subject': subject, 'body': message
-        }, timeout=10)
-        if r.status_code == 200:
+        })
+        if code == 200:
             await ctx.send(f'[OK] Sent to {to}')
         else:
+            logger.warning(f"!send to {to} returned: {code}")
             await ctx.send(f'[ERROR] Failed')
     except Exception as e:
+        logger.error(f"!send failed: {e}")
         await ctx.send(f'[ERROR] {e}')
 
 @bot.command(name='status', help='Check bridge status')
 async def status(ctx):
     try:
-        r = requests.get(f'{BRIDGE_URL}/health', timeout=5)
-        data = r.json()
+        _, data = await bridge.get('/health')
         await ctx.send(f"**Ravenclaw Status**\nAccount: {data.get('account', '?')}\nAuto-reply: {data.get('auto_reply', '?')}")
-    except:
+    except Exception as e:
+        logger.error(f"!status failed: {e}")
         await ctx.send('[ERROR] Bridge offline!')
 
 @bot.command(name='stats', help='View email stats')
 async def stats(ctx):
     try:
-        r = requests.get(f'{BRIDGE_URL}/stats', timeout=5)
-        data = r.json()
-        await ctx.send(f"**Email Stats**\nProcessed: {data.get('processed', 0)}\nRejected: {data.get('rejected', 0)}\nDomains: {', '.join(data.get('allowed_domains', []))}")
-    except:
+        _, data = await bridge.get('/stats')
+        await ctx.send(f"**Email Stats**\nTotal: {data.get('total', 0)}\nUnread: {data.get('unread', 0)}\nScheduled: {data.get('scheduled_pending', 0)} pending / {data.get('scheduled_total', 0)} total\nDomains: {', '.join(data.get('domains', []))}")
+    except Exception as e:
+        logger.error(f"!stats failed: {e}")
         await ctx.send('[ERROR] Could not fetch stats')
 
 @bot.command(name='help', help='Show help')
@@ -90,31 +172,38 @@ Slash commands also available: /check, /send, /status""")
 
 @bot.tree.command(name='check', description='Check for new emails')
 async def check_slash(interaction):
+    # Defer so a slow bridge cannot exceed Discord's 3s interaction deadline
+    await interaction.response.defer()
     try:
-        requests.post(f'{BRIDGE_URL}/check', timeout=10)
-        await interaction.response.send_message('[OK] Checked!')
-    except:
-        await interaction.response.send_message('[ERROR] Bridge offline')
+        await bridge.post('/check')
+        await interaction.followup.send('[OK] Checked!')
+    except Exception as e:
+        logger.error(f"/check failed: {e}")
+        await interaction.followup.send('[ERROR] Bridge offline')
 
 @bot.tree.command(name='send', description='Send an email')
 async def send_slash(interaction, to: str, subject: str, message: str):
+    await interaction.response.defer()
     try:
-        r = requests.post(f'{BRIDGE_URL}/send', json={'to': to, 'subject': subject, 'body': message}, timeout=10)
-        await interaction.response.send_message(f'[OK] Sent to {to}')
-    except:
-        await interaction.response.send_message('[ERROR] Failed')
+        code, _ = await bridge.post('/send', {'to': to, 'subject': subject, 'body': message})
+        await interaction.followup.send(f'[OK] Sent to {to}' if code == 200 else '[ERROR] Failed')
+    except Exception as e:
+        logger.error(f"/send failed: {e}")
+        await interaction.followup.send('[ERROR] Failed')
 
 @bot.tree.command(name='status', description='Check bridge status')
 async def status_slash(interaction):
+    await interaction.response.defer()
     try:
-        r = requests.get(f'{BRIDGE_URL}/health', timeout=5)
-        data = r.json()
-        await interaction.response.send_message(f"**Status**: {data.get('status', '?')}")
-    except:
-        await interaction.response.send_message('[ERROR] Offline')
+        _, data = await bridge.get('/health')
+        await interaction.followup.send(f"**Status**: {data.get('status', '?')}")
+    except Exception as e:
+        logger.error(f"/status failed: {e}")
+        await interaction.followup.send('[ERROR] Offline')
 
 if __name__ == '__main__':
-    print("=" * 40)
-    print("Ravenclaw Discord Bot")
-    print("=" * 40)
-    bot.run(DISCORD_BOT_TOKEN)
+    logger.info("Ravenclaw Discord Bot starting")
+    # discord.py's own records go through the same queue instead of its default stderr handler
+    logging.getLogger('discord').setLevel(logging.INFO)
+    ravenclaw_logging.attach('discord', logger)
+    bot.run(DISCORD_BOT_TOKEN, log_handler=None)
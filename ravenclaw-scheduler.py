@@ -5,11 +5,11 @@ Checks emails every 30 minutes automatically
 """
 
 import os
-import sys
 import time
-import logging
 import requests
 
+from ravenclaw_logging import setup_logging
+
 # Load env
 ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
 if os.path.exists(ENV_FILE):
@@ -23,16 +23,8 @@ if os.path.exists(ENV_FILE):
 BRIDGE_URL = os.environ.get('BRIDGE_URL', 'http://localhost:5002')
 INTERVAL = int(os.environ.get('BRIDGE_POLL_INTERVAL', '30'))
 
-# Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [RAVENCLAW-SCHEDULER] %(message)s',
-    handlers=[
-        logging.FileHandler('ravenclaw-scheduler.log', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-logger = logging.getLogger(__name__)
+# Logging (queued, rotated; same LOG_* settings as the bridge)
+logger = setup_logging('ravenclaw-scheduler', 'RAVENCLAW-SCHEDULER', 'ravenclaw-scheduler.log')
 
 def check():
     """Check emails"""
@@ -15,478 +15,50 @@ Features:
 - Memory leak prevention (max emails, log rotation)
 """
 
-import poplib
-import smtplib
-import email
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import requests
-import time
-import json
-import re
 import threading
-import logging
-import sys
+import json
 import os
-from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file
 import signal
 import atexit
-from logging.handlers import RotatingFileHandler
-
-# ========== CONFIG ==========
 
-ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
-
-def load_env():
-    """Load environment variables from .env"""
-    if not os.path.exists(ENV_FILE):
-        print(f"[WARN] {ENV_FILE} not found!")
-        return
-    
-    with open(ENV_FILE, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#') and '=' in line:
-                k, v = line.split('=', 1)
-                os.environ.setdefault(k.strip(), v.strip())
-
-load_env()
-
-def get_env(key, required=False, default=None):
-    val = os.environ.get(key, default)
-    if required and not val:
-        raise ValueError(f"Required env var {key} not set!")
-    return val
-
-# Email settings
-EMAIL = {
-    'host': get_env('EMAIL_HOST', False, 'mail.example.com'),
-    'pop_port': int(get_env('EMAIL_POP_PORT', False, '995')),
-    'smtp_port': int(get_env('EMAIL_SMTP_PORT', False, '587')),
-    'username': get_env('EMAIL_USERNAME', True),
-    'password': get_env('EMAIL_PASSWORD', True),
-    'sender_name': get_env('SENDER_NAME', False, 'Ibrahim Qureshi')
-}
-
-# Domain filter
-DOMAIN_FILTER = get_env('DOMAIN_FILTER', False, 'example.com')
-ALLOWED_DOMAINS = [d.strip() for d in DOMAIN_FILTER.split(',')]
-
-# Discord settings
-DISCORD = {
-    'webhook_url': get_env('DISCORD_WEBHOOK_URL', False, ''),
-    'use_webhook': get_env('DISCORD_USE_WEBHOOK', False, 'false').lower() == 'true',
-    'openclaw_url': get_env('OPENCLAW_URL', False, 'http://localhost:3000/api/message')
-}
-
-# Bridge settings
-BRIDGE = {
-    'host': get_env('BRIDGE_HOST', False, '0.0.0.0'),
-    'port': int(get_env('BRIDGE_PORT', False, '5002')),
-    'poll_interval': int(get_env('BRIDGE_POLL_INTERVAL', False, '30'))
-}
-
-# Auto-reply settings
-AUTO_REPLY = {
-    'enabled': get_env('AUTO_REPLY_ENABLED', False, 'false').lower() == 'true',
-    'template': get_env('AUTO_REPLY_TEMPLATE', False, 
-        "Thank you for your email. I've received your message and will respond shortly.\n\n- Enoth")
-}
-
-# Scheduled email settings
-SCHEDULED = {
-    'queue_file': 'ravenclaw_scheduled.json',
-    'sent_file': 'ravenclaw_sent.json',  # Track sent emails across restarts
-    'max_attempts': 3,
-    'check_interval': 60  # seconds
-}
-
-# Memory leak prevention
-MAX_EMAILS = 1000  # Keep last 1000 emails max
-MAX_LOG_SIZE = 1024 * 1024  # 1MB
-MAX_LOG_BACKUPS = 5
-
-# Global shutdown flag
-shutdown_requested = False
-
-# Logging with rotation
-logger = logging.getLogger('ravenclaw')
-logger.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s [RAVENCLAW] %(message)s')
-
-# File handler with rotation
-file_handler = RotatingFileHandler('ravenclaw.log', maxBytes=MAX_LOG_SIZE, backupCount=MAX_LOG_BACKUPS, encoding='utf-8')
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
-
-# Console handler
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
+import ravenclaw_core
+import ravenclaw_logging
+import ravenclaw_tracing
+from ravenclaw_httpcache import ViewCache, etag_matches, negotiate
+from ravenclaw_core import (
+    EMAIL, ALLOWED_DOMAINS, BRIDGE, AUTO_REPLY, SCHEDULED, MAX_EMAILS,
+    INBOX_FILE, logger, is_allowed, inbox_store, archive, spool, tracer, inbox_check, scheduled_check,
+    load_scheduled_queue, send_smtp, validate_scheduled, new_scheduled_entry,
+    schedule_emails, cancel_scheduled_emails, compute_stats, stats_version, scheduled_version,
+    run_scheduler, run_scheduled_checker
+)
 
 # ========== FLASK APP ==========
 
 app = Flask(__name__)
 
-# ========== FILE PATHS ==========
-
-INBOX_FILE = 'ravenclaw_inbox.json'
-PROCESSED_FILE = 'ravenclaw_processed.txt'
-
-# ========== HELPERS ==========
-
-def get_domain(email_addr):
-    """Extract domain from email"""
-    m = re.search(r'@([a-zA-Z0-9.-]+)', email_addr)
-    return m.group(1).lower() if m else None
-
-def is_allowed(email_addr):
-    """Check if email domain is allowed"""
-    domain = get_domain(email_addr)
-    return domain and any(domain == d.lower() for d in ALLOWED_DOMAINS)
-
-def parse_body(msg):
-    """Extract plain text from email"""
-    body = ""
-    if msg.is_multipart():
-        for part in msg.walk():
-            if part.get_content_type() == 'text/plain':
-                try:
-                    body = part.get_payload(decode=True).decode('utf-8', errors='replace')
-                except:
-                    body = part.get_payload(decode=True).decode('latin-1')
-                break
-    else:
-        try:
-            body = msg.get_payload(decode=True).decode('utf-8', errors='replace')
-        except:
-            body = msg.get_payload(decode=True).decode('latin-1')
-    return body
-
-def load_inbox():
-    """Load inbox from JSON file"""
-    try:
-        with open(INBOX_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return {'emails': []}
-
-def save_inbox(inbox):
-    """Save inbox to JSON file with max emails limit"""
-    # Trim to max emails to prevent memory leak
-    if 'emails' in inbox and len(inbox['emails']) > MAX_EMAILS:
-        inbox['emails'] = inbox['emails'][:MAX_EMAILS]
-        logger.info(f"Trimmed inbox to {MAX_EMAILS} emails")
-    
-    with open(INBOX_FILE, 'w', encoding='utf-8') as f:
-        json.dump(inbox, f, indent=2, ensure_ascii=False)
-
-def load_processed():
-    """Load processed message IDs"""
-    try:
-        with open(PROCESSED_FILE, 'r') as f:
-            return set(line.strip() for line in f)
-    except:
-        return set()
-
-def save_processed(msg_id):
-    """Save processed message ID"""
-    with open(PROCESSED_FILE, 'a') as f:
-        f.write(msg_id + '\n')
+# Werkzeug's per-request access log goes through the same queue instead of writing to stderr inline
+ravenclaw_logging.attach('werkzeug', logger)
 
-# ========== SCHEDULED EMAIL FUNCTIONS ==========
+# Last rendered body (and compressed variants) of each polled view
+view_cache = ViewCache(BRIDGE['compress_min_bytes'], BRIDGE['compress_level'])
 
-def load_scheduled_queue():
-    """Load scheduled email queue from JSON file"""
-    try:
-        with open(SCHEDULED['queue_file'], 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-            # Sync with persistent sent IDs to ensure no re-sending
-            sent_ids = load_sent_ids()
-            for email_entry in data.get('emails', []):
-                if email_entry.get('id') in sent_ids:
-                    email_entry['status'] = 'sent'
-                    if not email_entry.get('sent_at'):
-                        email_entry['sent_at'] = datetime.now().isoformat()
-            
-            # Filter out old sent emails (older than 7 days)
-            cutoff = datetime.now().timestamp() - (7 * 24 * 60 * 60)
-            data['emails'] = [e for e in data.get('emails', []) 
-                             if e.get('status') != 'sent' or 
-                             (e.get('status') == 'sent' and 
-                              datetime.fromisoformat(e.get('sent_at', '2000-01-01')).timestamp() > cutoff)]
-            return data
-    except:
-        return {'version': '1.0', 'emails': []}
-
-def save_scheduled_queue(queue):
-    """Save scheduled email queue to JSON file"""
-    with open(SCHEDULED['queue_file'], 'w', encoding='utf-8') as f:
-        json.dump(queue, f, indent=2, ensure_ascii=False)
-
-def load_sent_ids():
-    """Load IDs of already-sent emails"""
-    try:
-        with open(SCHEDULED['sent_file'], 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return set(data.get('sent_ids', []))
-    except:
-        return set()
-
-def save_sent_ids(sent_ids):
-    """Save sent email IDs to persistent file"""
-    with open(SCHEDULED['sent_file'], 'w', encoding='utf-8') as f:
-        json.dump({'sent_ids': list(sent_ids)}, f, indent=2)
-
-def send_smtp(to, subject, body, in_reply_to=None, cc=None, bcc=None, references=None):
-    """Send email via SMTP with optional CC, BCC and reply threading support"""
-    msg = MIMEMultipart()
-    
-    # Add "Re: " prefix if not already present
-    if subject and not subject.lower().startswith('re:'):
-        subject = f"Re: {subject}"
-    
-    msg['Subject'] = subject
-    msg['From'] = f"{EMAIL['sender_name']} <{EMAIL['username']}>"
-    msg['To'] = to
-    
-    # Add CC recipients if provided
-    if cc:
-        if isinstance(cc, str):
-            cc = [cc]
-        msg['Cc'] = ', '.join(cc)
-    
-    # Add threading headers for replies
-    if in_reply_to:
-        msg['In-Reply-To'] = in_reply_to
-    if references:
-        msg['References'] = references
-    elif in_reply_to:
-        # If only in_reply_to is provided, use it as references too
-        msg['References'] = in_reply_to
-    
-    msg.attach(MIMEText(body, 'plain', 'utf-8'))
-    
-    try:
-        with smtplib.SMTP(EMAIL['host'], EMAIL['smtp_port']) as server:
-            server.starttls()
-            server.login(EMAIL['username'], EMAIL['password'])
-            
-            # Build recipient list: To + CC + BCC
-            recipients = [to]
-            if cc:
-                recipients.extend(cc)
-            if bcc:
-                if isinstance(bcc, str):
-                    bcc = [bcc]
-                recipients.extend(bcc)
-            
-            # Use sendmail for proper CC/BCC handling
-            server.sendmail(EMAIL['username'], recipients, msg.as_string())
-        logger.info(f"Sent SMTP: {to}" + (f", CC: {cc}" if cc else "") + (f", BCC: {bcc}" if bcc else "") + (f", Thread: {in_reply_to}" if in_reply_to else ""))
-        return True
-    except Exception as e:
-        logger.error(f"SMTP error: {e}")
-        return False
-
-def check_and_send_scheduled():
-    """Check scheduled emails and send those ready"""
-    if shutdown_requested:
-        return
-    
-    queue = load_scheduled_queue()
-    now = datetime.now().isoformat()
-    now_ts = datetime.now().timestamp()
-    
-    # Load persistent sent IDs to prevent re-sending across restarts
-    sent_ids = load_sent_ids()
-    
-    updated = False
-    
-    for email_entry in queue.get('emails', []):
-        email_id = email_entry.get('id')
-        
-        # Skip if already sent (persistent check)
-        if email_id in sent_ids:
-            continue
-        
-        if email_entry.get('status') == 'sent':
-            continue
-        
-        # Check if it's time to send
-        try:
-            target_time = datetime.fromisoformat(email_entry.get('target_time'))
-            if target_time.timestamp() <= now_ts:
-                # Try to send
-                success = send_smtp(
-                    email_entry['to'],
-                    email_entry['subject'],
-                    email_entry['body'],
-                    cc=email_entry.get('cc'),
-                    bcc=email_entry.get('bcc')
-                )
-                
-                if success:
-                    email_entry['status'] = 'sent'
-                    email_entry['sent_at'] = now
-                    sent_ids.add(email_id)  # Track persistently
-                    save_sent_ids(sent_ids)  # Save immediately
-                    logger.info(f"Scheduled email sent: {email_entry['to']} ({email_id})")
-                else:
-                    email_entry['attempts'] = email_entry.get('attempts', 0) + 1
-                    email_entry['last_attempt'] = now
-                    
-                    if email_entry['attempts'] >= SCHEDULED['max_attempts']:
-                        email_entry['status'] = 'failed'
-                        email_entry['error'] = 'Max attempts reached'
-                        logger.error(f"Scheduled email failed: {email_entry['to']}")
-                
-                updated = True
-                
-        except Exception as e:
-            logger.error(f"Error processing scheduled email: {e}")
-    
-    if updated:
-        save_scheduled_queue(queue)
-
-# ========== DISCORD/EMAIL FUNCTIONS ==========
-
-def send_discord(sender, subject, body, msg_id):
-    """Forward email to Discord"""
-    content = f"""**New Email**
-
-From: {sender}
-Subject: {subject}
-Time: {datetime.now().strftime('%Y-%m-%d %H:%M')}
-ID: {msg_id}
-
----
-{body}"""
-
-    # Discord webhook
-    if DISCORD['use_webhook'] and DISCORD['webhook_url']:
-        try:
-            requests.post(DISCORD['webhook_url'], json={'content': content}, timeout=10)
-            logger.info(f"Discord: {sender}")
-            return True
-        except Exception as e:
-            logger.error(f"Webhook error: {e}")
-    
-    # OpenClaw fallback
-    try:
-        requests.post(DISCORD['openclaw_url'], json={
-            'channel': 'discord',
-            'message': content,
-            'metadata': {'reply_to': sender, 'message_id': msg_id, 'type': 'email'}
-        }, timeout=10)
-        logger.info(f"OpenClaw: {sender}")
-        return True
-    except:
-        return False
-
-# ========== EMAIL PROCESSING ==========
-
-def check_inbox():
-    """Main email check function - reads emails and saves to JSON"""
-    if shutdown_requested:
-        logger.info("Shutdown requested, skipping inbox check")
-        return
-    
-    logger.info("Checking inbox...")
-    
-    processed_ids = load_processed()
-    inbox = load_inbox()
-    
-    new_emails = []
+def cached_json(name, version, build):
+    """
+    JSON response for a view labelled with its store version: 304 when the
+    client's ETag still matches, otherwise the cached (compressed) body.
+    """
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    etag = view_cache.etag(name, version, encoding)
+    headers = {'ETag': etag, 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return Response(status=304, headers=headers)
     
-    try:
-        mail = poplib.POP3_SSL(EMAIL['host'], EMAIL['pop_port'])
-        mail.user(EMAIL['username'])
-        mail.pass_(EMAIL['password'])
-        
-        _, msg_list, _ = mail.list()
-        
-        if not msg_list:
-            mail.quit()
-            logger.info("No emails found")
-            return
-        
-        for line in msg_list:
-            msg_num = line.decode().split()[0]
-            
-            if msg_num in processed_ids:
-                continue
-            
-            try:
-                _, lines, _ = mail.retr(msg_num)
-                msg = email.message_from_bytes(b'\r\n'.join(lines))
-                
-                sender = email.utils.parseaddr(msg['From'])[1]
-                subject = msg['Subject']
-                msg_id = msg.get('Message-ID', f'<{msg_num}@ravenclaw>')
-                body = parse_body(msg)
-                timestamp = datetime.now().isoformat()
-                
-                # Check domain filter
-                if not is_allowed(sender):
-                    logger.info(f"Rejected: {sender} (domain not allowed)")
-                    save_processed(msg_num)
-                    continue
-                
-                # Save to inbox JSON
-                email_data = {
-                    'id': msg_id,
-                    'msg_num': msg_num,
-                    'sender': sender,
-                    'subject': subject,
-                    'body': body,
-                    'timestamp': timestamp,
-                    'read': False,
-                    'replied': False
-                }
-                
-                inbox['emails'].insert(0, email_data)
-                new_emails.append(email_data)
-                
-                logger.info(f"Received: {sender} - {subject}")
-                
-            except Exception as e:
-                logger.error(f"Error processing msg {msg_num}: {e}")
-        
-        # Save updated inbox (with trim)
-        if new_emails:
-            save_inbox(inbox)
-            
-            # Forward to Discord
-            for email_data in new_emails:
-                send_discord(email_data['sender'], email_data['subject'], 
-                           email_data['body'], email_data['id'])
-                
-                # Auto-reply with proper threading
-                if AUTO_REPLY['enabled']:
-                    auto_body = AUTO_REPLY['template']
-                    send_smtp(
-                        email_data['sender'], 
-                        email_data['subject'], 
-                        auto_body, 
-                        in_reply_to=email_data['id'],
-                        references=email_data['id']
-                    )
-        
-        mail.quit()
-        
-        # Mark all as processed (don't delete from server)
-        for msg_num in msg_list:
-            msg_num = msg_num.decode().split()[0]
-            if msg_num not in processed_ids:
-                save_processed(msg_num)
-        
-        logger.info(f"Check complete. New: {len(new_emails)}, Total in inbox: {len(inbox['emails'])}")
-        
-    except Exception as e:
-        logger.error(f"Inbox check failed: {e}")
+    body, encoding = view_cache.body(name, version, build, encoding)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, mimetype='application/json', headers=headers)
 
 # ========== ROUTES ==========
 
@@ -496,7 +68,7 @@ def index():
 <p>Status: Running</p>
 <p>Account: {EMAIL['username'][:5]}***</p>
 <p>Domains: {', '.join(ALLOWED_DOMAINS)}</p>
-<p>Emails in inbox: {len(load_inbox().get('emails', []))}</p>
+<p>Emails in inbox: {inbox_store.counts()['total']}</p>
 <p>Auto-reply: {'Enabled' if AUTO_REPLY['enabled'] else 'Disabled'}</p>"""
 
 @app.route('/health')
@@ -505,33 +77,97 @@ def health():
         'status': 'running',
         'account': EMAIL['username'][:5] + '***',
         'domains': ALLOWED_DOMAINS,
-        'emails_count': len(load_inbox().get('emails', [])),
-        'auto_reply': AUTO_REPLY['enabled']
+        'emails_count': inbox_store.counts()['total'],
+        'auto_reply': AUTO_REPLY['enabled'],
+        'auto_reply_cache': ravenclaw_core.reply_suppressor.stats(),
+        'dedupe_index': ravenclaw_core.dedupe_index.stats(),
+        'poller': ravenclaw_core.poller.snapshot(),
+        'destinations': ravenclaw_core.router.stats(),
+        'smtp_rate_limit': ravenclaw_core.limiter.stats(),
+        'circuits': ravenclaw_core.breakers.snapshot(),
+        'log_dropped': ravenclaw_logging.dropped(logger)
     })
 
 @app.route('/inbox')
 def get_inbox():
-    """Get all emails from inbox JSON"""
-    inbox = load_inbox()
-    return jsonify(inbox)
+    """Get all emails from inbox JSON (conditional: ETag / If-None-Match)"""
+    return cached_json('inbox', inbox_store.version(),
+                       lambda: {'emails': [e.to_dict() for e in inbox_store.snapshot()]})
 
 @app.route('/inbox/<msg_id>')
 def get_email(msg_id):
     """Get specific email by ID"""
-    inbox = load_inbox()
-    for email_data in inbox.get('emails', []):
-        if email_data['id'] == msg_id or email_data['msg_num'] == msg_id:
-            email_data['read'] = True
-            save_inbox(inbox)
-            return jsonify(email_data)
-    return jsonify({'error': 'Email not found'}), 404
+    email_data = inbox_store.find(msg_id)
+    if email_data is None:
+        return jsonify({'error': 'Email not found'}), 404
+    if not email_data.get('read', False):
+        inbox_store.mark_read([msg_id])
+    return jsonify({**email_data.to_dict(), 'read': True})
+
+@app.route('/inbox/<msg_id>/attachments/<int:n>')
+def get_attachment(msg_id, n):
+    """Download the n-th attachment (0-based) of an email straight from the spool"""
+    email_data = inbox_store.find(msg_id)
+    attachments = email_data.get('attachments', []) if email_data else []
+    if not 0 <= n < len(attachments):
+        return jsonify({'error': 'Attachment not found'}), 404
+    
+    att = attachments[n]
+    path = os.path.abspath(spool.path(att['sha256']))
+    if not os.path.exists(path):
+        return jsonify({'error': 'Attachment file missing'}), 410
+    # send_file hands the open file to the WSGI server (sendfile where supported)
+    return send_file(path, mimetype=att['content_type'], as_attachment=True,
+                     download_name=att['filename'], conditional=True)
+
+@app.route('/trace/<msg_id>')
+def get_trace(msg_id):
+    """
+    Stage timeline of one email (fetch, filter, parse, persist, forward
+    attempts, auto-reply). ?format=otlp returns the raw spans as an OTLP/JSON
+    export body instead.
+    """
+    email_data = inbox_store.find(msg_id)
+    trace_id = (email_data.get('trace_id') if email_data else None) or tracer.find_trace(msg_id)
+    spans = tracer.spans(trace_id) if trace_id else []
+    if not spans:
+        return jsonify({'error': 'Trace not found'}), 404
+    
+    if request.args.get('format') == 'otlp':
+        return jsonify({'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'ravenclaw'}}]},
+            'scopeSpans': [{'scope': {'name': 'ravenclaw'}, 'spans': spans}]
+        }]})
+    return jsonify({'id': msg_id, **ravenclaw_tracing.timeline(spans)})
 
 @app.route('/unread')
 def get_unread():
-    """Get unread emails"""
-    inbox = load_inbox()
-    unread = [e for e in inbox.get('emails', []) if not e.get('read', False)]
-    return jsonify({'unread': unread, 'count': len(unread)})
+    """Get unread emails (conditional: ETag / If-None-Match)"""
+    def build():
+        unread = [e.to_dict() for e in inbox_store.snapshot() if not e.read]
+        return {'unread': unread, 'count': len(unread)}
+    return cached_json('unread', inbox_store.version(), build)
+
+@app.route('/archive')
+def get_archive():
+    """
+    Stream archived (trimmed) emails as NDJSON, oldest first.
+    Query: from=YYYY-MM-DD, to=YYYY-MM-DD, sender=address-or-domain, limit=N
+    """
+    limit = request.args.get('limit', type=int)
+    emails = archive.query(
+        start=request.args.get('from'),
+        end=request.args.get('to'),
+        sender=request.args.get('sender'),
+        limit=limit
+    )
+    lines = (json.dumps(e, ensure_ascii=False) + '\n' for e in emails)
+    return Response(lines, mimetype='application/x-ndjson')
+
+@app.route('/archive/segments')
+def get_archive_segments():
+    """Archive segment index: per-day count, size and sender domains"""
+    return jsonify({'segments': [{'day': day, **entry} for day, entry in archive.segments()]})
 
 @app.route('/send', methods=['POST'])
 def send_email():
@@ -545,6 +181,13 @@ def send_email():
     if not is_allowed(data['to']):
         return jsonify({'error': 'Domain not allowed'}), 403
     
+    blocked, wait = ravenclaw_core.smtp_gate(
+        ravenclaw_core.smtp_recipients(data['to'], data.get('cc'), data.get('bcc')))
+    if blocked:
+        retry_after = max(1, int(wait + 0.999))
+        error, code = ('Rate limited', 429) if blocked == 'rate_limited' else ('SMTP unavailable (circuit open)', 503)
+        return jsonify({'error': error, 'retry_after': retry_after}), code, {'Retry-After': str(retry_after)}
+    
     success = send_smtp(
         data['to'], 
         data['subject'], 
@@ -573,135 +216,177 @@ def schedule_email():
     }
     """
     data = request.json
-    required = ['to', 'subject', 'body', 'target_time']
-    for r in required:
-        if r not in data:
-            return jsonify({'error': f'Missing: {r}'}), 400
+    error, code = validate_scheduled(data)
+    if error:
+        return jsonify({'error': error}), code
     
-    # Validate target_time format
-    try:
-        target = datetime.fromisoformat(data['target_time'])
-        if target.timestamp() <= datetime.now().timestamp():
-            return jsonify({'error': 'target_time must be in the future'}), 400
-    except ValueError:
-        return jsonify({'error': 'Invalid target_time format. Use ISO-8601 (e.g., 2026-02-17T09:00:00)'}), 400
+    email_entry = new_scheduled_entry(data)
+    schedule_emails([email_entry])
     
-    if not is_allowed(data['to']):
-        return jsonify({'error': 'Domain not allowed'}), 403
+    logger.info(f"Scheduled email: {data['to']} for {data['target_time']}")
     
-    # Load queue and add email
-    queue = load_scheduled_queue()
+    return jsonify({
+        'status': 'scheduled',
+        'id': email_entry['id'],
+        'target_time': data['target_time']
+    })
+
+@app.route('/schedule/batch', methods=['POST'])
+def schedule_email_batch():
+    """
+    Schedule many emails in one request and one queue write.
+    Body: {"emails": [<same fields as /schedule>, ...]}
+    All items are validated first; if any fails, nothing is scheduled.
+    """
+    items = (request.json or {}).get('emails')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Missing: emails'}), 400
     
-    email_entry = {
-        'id': f"sched_{datetime.now().strftime('%Y%m%d%H%M%S')}_{len(queue.get('emails', []))}",
-        'to': data['to'],
-        'cc': data.get('cc'),  # Optional CC recipients
-        'bcc': data.get('bcc'),  # Optional BCC recipients
-        'subject': data['subject'],
-        'body': data['body'],
-        'target_time': data['target_time'],
-        'created_at': datetime.now().isoformat(),
-        'status': 'pending',
-        'attempts': 0,
-        'last_attempt': None,
-        'error': None,
-        'priority': data.get('priority', 'normal')
-    }
+    errors = []
+    for i, data in enumerate(items):
+        error, code = validate_scheduled(data) if isinstance(data, dict) else ('Invalid item', 400)
+        if error:
+            errors.append({'index': i, 'error': error, 'code': code})
+    if errors:
+        return jsonify({'error': 'Validation failed', 'errors': errors}), 400
     
-    queue['emails'].append(email_entry)
-    save_scheduled_queue(queue)
+    entries = [new_scheduled_entry(data) for data in items]
+    schedule_emails(entries)
     
-    logger.info(f"Scheduled email: {data['to']} for {data['target_time']}")
+    logger.info(f"Scheduled batch: {len(entries)} emails")
     
     return jsonify({
         'status': 'scheduled',
-        'id': email_entry['id'],
-        'target_time': data['target_time']
+        'count': len(entries),
+        'ids': [e['id'] for e in entries]
     })
 
 @app.route('/schedule/list')
 def list_scheduled():
-    """List all scheduled emails"""
-    queue = load_scheduled_queue()
-    pending = [e for e in queue.get('emails', []) if e.get('status') == 'pending']
-    return jsonify({
-        'total': len(queue.get('emails', [])),
-        'pending': len(pending),
-        'emails': pending
-    })
+    """List all scheduled emails (conditional: ETag / If-None-Match)"""
+    def build():
+        queue = load_scheduled_queue()
+        pending = [e.to_dict() for e in queue.get('emails', []) if e.status == 'pending']
+        return {
+            'total': len(queue.get('emails', [])),
+            'pending': len(pending),
+            'emails': pending
+        }
+    return cached_json('schedule', scheduled_version(), build)
+
+@app.route('/schedule/recurring', methods=['POST'])
+def schedule_recurring():
+    """
+    Store a recurring email. Body: the /schedule fields without target_time, plus
+    exactly one of "cron": "0 9 * * 1-5" or "every": "1d" (m/h/d/w), and optional
+    "timezone": "Europe/Berlin", "start", "until" (ISO-8601), "count": N.
+    """
+    data = request.json or {}
+    error, code = ravenclaw_core.validate_recurring(data)
+    if error:
+        return jsonify({'error': error}), code
+    try:
+        schedule = ravenclaw_core.new_recurring(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    logger.info(f"Recurring email: {data['to']} ({data.get('cron') or 'every ' + str(data.get('every'))}), "
+                f"first {schedule['next_fire']}")
+    return jsonify({'status': 'scheduled', 'id': schedule['id'], 'next_fire': schedule['next_fire']})
+
+@app.route('/schedule/recurring')
+def list_recurring():
+    """List recurring emails with their next fire time (conditional: ETag / If-None-Match)"""
+    def build():
+        schedules = ravenclaw_core.recurring.list()
+        return {'total': len(schedules), 'schedules': schedules}
+    return cached_json('recurring', ravenclaw_core.recurring.version, build)
+
+@app.route('/schedule/recurring/cancel/<schedule_id>', methods=['POST'])
+def cancel_recurring(schedule_id):
+    """Stop a recurring email"""
+    if ravenclaw_core.recurring.cancel(schedule_id):
+        return jsonify({'status': 'cancelled', 'id': schedule_id})
+    return jsonify({'error': 'Recurring email not found or finished'}), 404
 
 @app.route('/schedule/cancel/<email_id>', methods=['POST'])
 def cancel_scheduled(email_id):
     """Cancel a scheduled email"""
-    queue = load_scheduled_queue()
-    
-    for email_entry in queue.get('emails', []):
-        if email_entry.get('id') == email_id and email_entry.get('status') == 'pending':
-            email_entry['status'] = 'cancelled'
-            save_scheduled_queue(queue)
-            return jsonify({'status': 'cancelled', 'id': email_id})
+    if cancel_scheduled_emails([email_id]):
+        return jsonify({'status': 'cancelled', 'id': email_id})
     
     return jsonify({'error': 'Scheduled email not found or already sent'}), 404
 
+@app.route('/schedule/cancel/batch', methods=['POST'])
+def cancel_scheduled_batch():
+    """Cancel many scheduled emails in one queue write. Body: {"ids": [...]}"""
+    ids = (request.json or {}).get('ids')
+    if not isinstance(ids, list) or not ids:
+        return jsonify({'error': 'Missing: ids'}), 400
+    if not all(isinstance(i, str) for i in ids):
+        return jsonify({'error': 'Invalid ids: use a list of strings'}), 400
+    
+    cancelled = cancel_scheduled_emails(ids)
+    done = set(cancelled)
+    return jsonify({
+        'status': 'cancelled',
+        'cancelled': cancelled,
+        'not_found': [i for i in ids if i not in done]
+    })
+
 @app.route('/check', methods=['POST'])
 def trigger_check():
-    """Trigger manual email check"""
-    threading.Thread(target=check_inbox).start()
-    return jsonify({'status': 'checking'})
+    """Trigger manual email check (joins the running check if there is one)"""
+    _, started = inbox_check.request()
+    return jsonify({'status': 'checking' if started else 'already_checking'})
 
 @app.route('/check-scheduled', methods=['POST'])
 def trigger_scheduled_check():
     """Trigger manual check of scheduled emails"""
-    threading.Thread(target=check_and_send_scheduled).start()
-    return jsonify({'status': 'checking'})
+    _, started = scheduled_check.request()
+    return jsonify({'status': 'checking' if started else 'already_checking'})
 
 @app.route('/stats')
 def stats():
-    """Get processing stats"""
-    inbox = load_inbox()
-    emails = inbox.get('emails', [])
-    unread = len([e for e in emails if not e.get('read', False)])
-    
-    queue = load_scheduled_queue()
-    pending = len([e for e in queue.get('emails', []) if e.get('status') == 'pending'])
-    
-    return jsonify({
-        'total': len(emails),
-        'unread': unread,
-        'domains': ALLOWED_DOMAINS,
-        'scheduled_pending': pending,
-        'scheduled_total': len(queue.get('emails', []))
-    })
+    """Get processing stats (conditional: ETag / If-None-Match)"""
+    return cached_json('stats', stats_version(), compute_stats)
 
 @app.route('/mark-read/<msg_id>', methods=['POST'])
 def mark_read(msg_id):
     """Mark email as read"""
-    inbox = load_inbox()
-    for email_data in inbox.get('emails', []):
-        if email_data['id'] == msg_id or email_data['msg_num'] == msg_id:
-            email_data['read'] = True
-            save_inbox(inbox)
-            return jsonify({'status': 'marked', 'id': msg_id})
+    if inbox_store.mark_read([msg_id]):
+        return jsonify({'status': 'marked', 'id': msg_id})
     return jsonify({'error': 'Email not found'}), 404
 
+@app.route('/mark-read/batch', methods=['POST'])
+def mark_read_batch():
+    """Mark many emails as read in one inbox write. Body: {"ids": [...]}"""
+    ids = (request.json or {}).get('ids')
+    if not isinstance(ids, list) or not ids:
+        return jsonify({'error': 'Missing: ids'}), 400
+    if not all(isinstance(i, str) for i in ids):
+        return jsonify({'error': 'Invalid ids: use a list of strings'}), 400
+    
+    marked = inbox_store.mark_read(ids)
+    done = set(marked)
+    return jsonify({
+        'status': 'marked',
+        'marked': marked,
+        'not_found': [i for i in ids if i not in done]
+    })
+
 @app.route('/mark-all-read', methods=['POST'])
 def mark_all_read():
     """Mark all emails as read"""
-    inbox = load_inbox()
-    count = 0
-    for email_data in inbox.get('emails', []):
-        email_data['read'] = True
-        count += 1
-    save_inbox(inbox)
+    count = inbox_store.mark_all_read()
     return jsonify({'status': 'marked_all', 'count': count})
 
 # ========== MAIN ==========
 
 def signal_handler(signum, frame):
     """Handle shutdown signals gracefully"""
-    global shutdown_requested
     logger.info(f"Received signal {signum}, shutting down...")
-    shutdown_requested = True
+    ravenclaw_core.request_shutdown()
 
 def cleanup():
     """Cleanup on exit"""
@@ -712,41 +397,21 @@ signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 atexit.register(cleanup)
 
-def run_scheduler():
-    """Background scheduler with shutdown support"""
-    while not shutdown_requested:
-        try:
-            check_inbox()
-            check_and_send_scheduled()
-        except Exception as e:
-            logger.error(f"Scheduler error: {e}")
-        
-        if not shutdown_requested:
-            time.sleep(BRIDGE['poll_interval'] * 60)
-
-def run_scheduled_checker():
-    """Background checker for scheduled emails (more frequent)"""
-    while not shutdown_requested:
-        try:
-            check_and_send_scheduled()
-        except Exception as e:
-            logger.error(f"Scheduled checker error: {e}")
-        
-        if not shutdown_requested:
-            time.sleep(SCHEDULED['check_interval'])
-
 if __name__ == '__main__':
     print("=" * 50)
     print("RAVENCLAW EMAIL BRIDGE")
     print("=" * 50)
     print(f"Account: {EMAIL['username'][:5]}***")
     print(f"Domains: {', '.join(ALLOWED_DOMAINS)}")
-    print(f"Check every: {BRIDGE['poll_interval']} minutes")
+    print(f"Check every: {BRIDGE['poll_min']}s - {BRIDGE['poll_interval']} minutes (adaptive)")
     print(f"Inbox file: {INBOX_FILE}")
     print(f"Max emails: {MAX_EMAILS}")
     print(f"Scheduled emails: {SCHEDULED['queue_file']}")
     print("=" * 50)
     
+    # Load the inbox (and its counters) before serving, so requests never wait on the file
+    inbox_store.start()
+    
     # Start Flask in background
     def run_flask():
         app.run(host=BRIDGE['host'], port=BRIDGE['port'], debug=False, use_reloader=False)
@@ -0,0 +1,288 @@
+# ravenclaw_actor.py
+"""
+Ravenclaw Actor - Single-writer inbox ownership
+===============================================
+One thread owns the inbox and applies mutations from a command queue.
+Commands queued while a write is in progress are applied together and
+committed with a single save, so concurrent API traffic cannot lose
+updates or trigger duplicate full-file writes.
+
+Readers get an immutable tuple snapshot without taking any lock. Records
+(ravenclaw_records.EmailRecord) inside a published snapshot are never
+mutated; commands replace them.
+Counts (total, unread, per sender domain) are updated by the same
+commands and published with the snapshot, so reading them is O(1).
+version() goes up with every published change (backs HTTP ETags).
+
+SingleFlight collapses concurrent requests for the same job (e.g. /check)
+into one in-flight run whose Future every caller shares.
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+
+
+def _lookup_keys(email_data):
+    """
+    Ids an email answers to: its Message-ID, plus 'uid:<UIDL>' or, only for
+    mail fetched without UIDL, its POP3 msg_num (reused once mail is deleted)
+    """
+    uid = email_data.get('uid')
+    return email_data['id'], f'uid:{uid}' if uid else email_data.get('msg_num')
+
+
+def _sender_domain(email_data):
+    domain = getattr(email_data, 'domain', None)  # Precomputed (and interned) on EmailRecord
+    if domain is not None:
+        return domain
+    sender = (email_data.get('sender') or '').lower()
+    return sender.rsplit('@', 1)[-1] if '@' in sender else ''
+
+
+class InboxCounts:
+    """Total, unread and per-domain counts kept in step with the inbox"""
+    __slots__ = ('total', 'unread', 'domains')
+
+    def __init__(self, emails=()):
+        self.total = 0
+        self.unread = 0
+        self.domains = {}
+        for email_data in emails:
+            self.add(email_data)
+
+    def copy(self):
+        counts = InboxCounts()
+        counts.total, counts.unread, counts.domains = self.total, self.unread, dict(self.domains)
+        return counts
+
+    def add(self, email_data):
+        self.total += 1
+        if not email_data.get('read', False):
+            self.unread += 1
+        domain = _sender_domain(email_data)
+        self.domains[domain] = self.domains.get(domain, 0) + 1
+
+    def remove(self, email_data):
+        self.total -= 1
+        if not email_data.get('read', False):
+            self.unread -= 1
+        domain = _sender_domain(email_data)
+        left = self.domains.get(domain, 0) - 1
+        if left > 0:
+            self.domains[domain] = left
+        else:
+            self.domains.pop(domain, None)
+
+    def as_dict(self):
+        return {'total': self.total, 'unread': self.unread, 'by_domain': dict(sorted(self.domains.items()))}
+
+
+class InboxActor:
+    def __init__(self, load, save, limit=None, logger=None, on_trim=None):
+        self._load = load
+        self._save = save
+        self._limit = limit
+        self._on_trim = on_trim
+        self._logger = logger
+        self._commands = queue.Queue()
+        self._emails = ()
+        self._counts = InboxCounts()
+        self._published_counts = self._counts.as_dict()
+        self._version = 0
+        self._archived = []  # Handed to on_trim but not yet dropped by a successful save
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.writes = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._emails = tuple(self._load().get('emails', []))
+                    self._counts = InboxCounts(self._emails)
+                    self._published_counts = self._counts.as_dict()
+                    thread = threading.Thread(target=self._run, name='inbox-actor', daemon=True)
+                    thread.start()
+                    self._thread = thread
+
+    def start(self):
+        """Load the inbox now rather than on first use"""
+        self._ensure_started()
+
+    # ---- reads ----
+
+    def snapshot(self):
+        """Current emails, newest first, as an immutable tuple"""
+        self._ensure_started()
+        return self._emails
+
+    def counts(self):
+        """{'total', 'unread', 'by_domain'} for the current snapshot, without scanning it"""
+        self._ensure_started()
+        return self._published_counts
+
+    def version(self):
+        """Number of changes published so far; read it before snapshot() to label a view"""
+        self._ensure_started()
+        return self._version
+
+    def find(self, msg_id):
+        """Email matching a Message-ID, 'uid:<UIDL>' or (without UIDL) POP3 msg_num, or None"""
+        for email_data in self.snapshot():
+            if msg_id in _lookup_keys(email_data):
+                return email_data
+        return None
+
+    # ---- writes ----
+
+    def submit(self, command, *args):
+        """Queue command(emails, counts, *args) -> (result, changed). Returns a Future"""
+        self._ensure_started()
+        future = Future()
+        self._commands.put((command, args, future))
+        return future
+
+    def add(self, new_emails):
+        """Prepend emails (given oldest first) and wait until they are committed"""
+        return self.submit(_add, new_emails).result()
+
+    def mark_read(self, msg_ids):
+        """Mark emails read by id (see find()) in one commit; returns the given ids that matched"""
+        return self.submit(_mark_read, msg_ids).result()
+
+    def mark_all_read(self):
+        """Mark every email read; returns the number of emails"""
+        return self.submit(_mark_all_read).result()
+
+    def _run(self):
+        while True:
+            batch = [self._commands.get()]
+            while True:
+                try:
+                    batch.append(self._commands.get_nowait())
+                except queue.Empty:
+                    break
+
+            emails = list(self._emails)
+            counts = self._counts.copy()
+            dirty = False
+            outcomes = []
+            for command, args, future in batch:
+                try:
+                    result, changed = command(emails, counts, *args)
+                    dirty = dirty or changed
+                    outcomes.append((future, result, None))
+                except Exception as e:
+                    outcomes.append((future, None, e))
+
+            if dirty:
+                self._trim(emails, counts)
+                try:
+                    self._save({'emails': list(emails)})
+                except Exception as e:
+                    # Nothing is published: the batch failed and readers keep the saved state
+                    if self._logger:
+                        self._logger.error(f"Inbox save failed: {e}")
+                    outcomes = [(future, None, exc or e) for future, _, exc in outcomes]
+                else:
+                    self.writes += 1
+                    self._archived = []
+                    self._emails = tuple(emails)
+                    self._counts = counts
+                    self._published_counts = counts.as_dict()
+                    self._version += 1  # After the snapshot, so a reader never labels old data as new
+
+            for future, result, exc in outcomes:
+                if exc is not None:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+
+
+    def _trim(self, emails, counts):
+        """Drop emails beyond the limit, handing them to on_trim first"""
+        if not self._limit or len(emails) <= self._limit:
+            return
+        if self._on_trim:
+            # Overflow archived for a batch whose save failed is still in the saved inbox
+            archived = {id(email_data) for email_data in self._archived}
+            overflow = [email_data for email_data in emails[self._limit:] if id(email_data) not in archived]
+            try:
+                if overflow:
+                    self._on_trim(overflow)
+            except Exception as e:
+                # Keep the overflow in the inbox rather than lose it
+                if self._logger:
+                    self._logger.error(f"Inbox trim deferred, archive failed: {e}")
+                return
+            self._archived.extend(overflow)
+        for email_data in emails[self._limit:]:
+            counts.remove(email_data)
+        del emails[self._limit:]
+        if self._logger:
+            self._logger.info(f"Trimmed inbox to {self._limit} emails")
+
+
+def _add(emails, counts, new_emails):
+    # new_emails arrive oldest first; the inbox is stored newest first
+    emails[:0] = new_emails[::-1]
+    for email_data in new_emails:
+        counts.add(email_data)
+    return len(new_emails), bool(new_emails)
+
+
+def _mark_read(emails, counts, msg_ids):
+    wanted = set(msg_ids)
+    found = set()
+    changed = False
+    for i, email_data in enumerate(emails):
+        keys = set(_lookup_keys(email_data)) & wanted
+        if keys:
+            found |= keys
+            if not email_data.get('read', False):
+                emails[i] = email_data.replace(read=True)
+                counts.unread -= 1
+                changed = True
+    return [msg_id for msg_id in msg_ids if msg_id in found], changed
+
+
+def _mark_all_read(emails, counts):
+    changed = False
+    for i, email_data in enumerate(emails):
+        if not email_data.get('read', False):
+            emails[i] = email_data.replace(read=True)
+            counts.unread -= 1
+            changed = True
+    return len(emails), changed
+
+
+class SingleFlight:
+    """Run a job on a worker thread, sharing one in-flight run between callers"""
+
+    def __init__(self, job, name):
+        self._job = job
+        self._name = name
+        self._lock = threading.Lock()
+        self._future = None
+
+    def request(self):
+        """Returns (future, started) - started is False when joining a running job"""
+        with self._lock:
+            if self._future is not None and not self._future.done():
+                return self._future, False
+            future = Future()
+            self._future = future
+        threading.Thread(target=self._run, args=(future,), name=self._name, daemon=True).start()
+        return future, True
+
+    def run(self):
+        """Run (or join) the job and wait for its result"""
+        future, _ = self.request()
+        return future.result()
+
+    def _run(self, future):
+        try:
+            future.set_result(self._job())
+        except Exception as e:
+            future.set_exception(e)
@@ -0,0 +1,114 @@
+# ravenclaw_archive.py
+"""
+Ravenclaw Archive - Compressed history of trimmed mail
+======================================================
+Emails trimmed from the hot inbox (MAX_EMAILS) are appended to per-day
+segments, <dir>/YYYY-MM-DD.jsonl.gz. Each append adds a gzip member, so
+segments are append-only and never rewritten.
+
+<dir>/index.json keeps a small summary per segment (count, bytes, sender
+domains) so queries only open segments that can match.
+"""
+
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+from ravenclaw_persist import atomic_write_text, read_json
+
+DAY_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def _day_of(email_data):
+    day = (email_data.get('timestamp') or '')[:10]
+    return day if DAY_RE.match(day) else datetime.now().strftime('%Y-%m-%d')
+
+
+def _domain_of(address):
+    return address.rsplit('@', 1)[-1].lower() if address and '@' in address else ''
+
+
+class Archive:
+    def __init__(self, directory, logger=None):
+        self.directory = directory
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._index = None
+
+    @property
+    def index_file(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def _segment(self, day):
+        return os.path.join(self.directory, f'{day}.jsonl.gz')
+
+    def _load_index(self):
+        if self._index is None:
+            self._index = read_json(self.index_file, dict, self._logger)
+        return self._index
+
+    def append(self, emails):
+        """Append emails to their day segments, then update the index"""
+        if not emails:
+            return
+        by_day = {}
+        for email_data in emails:
+            by_day.setdefault(_day_of(email_data), []).append(email_data)
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            index = self._load_index()
+            for day, items in by_day.items():
+                path = self._segment(day)
+                with open(path, 'ab') as raw:
+                    with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+                        for email_data in items:
+                            gz.write(json.dumps(email_data, ensure_ascii=False).encode('utf-8') + b'\n')
+                    raw.flush()
+                    os.fsync(raw.fileno())
+
+                entry = index.setdefault(day, {'count': 0, 'bytes': 0, 'domains': []})
+                entry['count'] += len(items)
+                entry['bytes'] = os.path.getsize(path)
+                entry['domains'] = sorted(set(entry['domains']) | {_domain_of(e.get('sender')) for e in items})
+            atomic_write_text(self.index_file, json.dumps(index, indent=2, sort_keys=True))
+
+        if self._logger:
+            self._logger.info(f"Archived {len(emails)} emails into {len(by_day)} segment(s)")
+
+    def segments(self):
+        """Index entries sorted by day"""
+        with self._lock:
+            return sorted(self._load_index().items())
+
+    def query(self, start=None, end=None, sender=None, limit=None):
+        """
+        Yield archived emails, oldest day first. start/end are inclusive
+        YYYY-MM-DD strings; sender is a full address or a bare domain.
+        """
+        sender = (sender or '').lower()
+        sender_domain = _domain_of(sender) if '@' in sender else sender
+        returned = 0
+        for day, entry in self.segments():
+            if (start and day < start) or (end and day > end):
+                continue
+            if sender_domain and sender_domain not in entry.get('domains', []):
+                continue
+            try:
+                with gzip.open(self._segment(day), 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        email_data = json.loads(line)
+                        address = (email_data.get('sender') or '').lower()
+                        if sender and address != sender and _domain_of(address) != sender:
+                            continue
+                        yield email_data
+                        returned += 1
+                        if limit and returned >= limit:
+                            return
+            except (OSError, EOFError, ValueError) as e:
+                # A torn final member (crash mid-append) ends that segment early
+                if self._logger:
+                    self._logger.error(f"Archive segment {day} unreadable: {e}")
@@ -0,0 +1,312 @@
+# ravenclaw_attachments.py
+"""
+Ravenclaw Attachments - Streamed MIME extraction
+================================================
+poplib.retr() and email.message_from_bytes() hold the whole message, and
+every decoded attachment, in memory. Here the message is consumed line
+by line straight off the POP3 socket: headers are parsed as soon as they
+end, the first text/plain part is kept (capped), and attachments are
+decoded chunk by chunk into a spool directory. Memory per message stays
+flat regardless of attachment size.
+
+Spooled files are named by SHA-256 of their content, so the same file
+received many times is stored once.
+"""
+
+import binascii
+import email.parser
+import email.policy
+import hashlib
+import itertools
+import os
+import poplib
+import re
+import tempfile
+
+MAX_TEXT_BYTES = 1024 * 1024  # Cap on the kept text/plain body
+
+_B64_JUNK = re.compile(rb'[^A-Za-z0-9+/=]')
+
+
+class RetrLines:
+    """
+    RETR whose message lines are yielded as they arrive (CRLF stripped,
+    dot-unstuffed). complete is true once the whole reply has been read;
+    until then its remaining lines are still on the socket, and the next
+    command would read them as its own reply.
+    """
+
+    def __init__(self, mail, which):
+        self._mail = mail
+        self._which = which
+        self._sent = False
+        self.complete = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.complete:
+            raise StopIteration
+        if not self._sent:
+            self._sent = True
+            self._mail._putcmd('RETR %s' % self._which)
+            try:
+                self._mail._getresp()
+            except poplib.error_proto as e:
+                # A server -ERR (bytes) is the whole reply; poplib's own errors (EOF, overlong line) are str
+                self.complete = bool(e.args) and isinstance(e.args[0], bytes)
+                raise
+        line, _ = self._mail._getline()
+        if line == b'.':
+            self.complete = True
+            raise StopIteration
+        if line.startswith(b'..'):
+            line = line[1:]
+        return line
+
+    def finish(self):
+        """Read and discard the rest of the reply"""
+        for _ in self:
+            pass
+
+
+class AttachmentSpool:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, sha256):
+        return os.path.join(self.directory, sha256)
+
+    def writer(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return _SpoolWriter(self)
+
+
+class _SpoolWriter:
+    def __init__(self, spool):
+        self.spool = spool
+        self.hash = hashlib.sha256()
+        self.size = 0
+        fd, self.tmp = tempfile.mkstemp(suffix='.part', dir=spool.directory)
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        if data:
+            self.hash.update(data)
+            self.size += len(data)
+            self.file.write(data)
+
+    def commit(self):
+        """Close and move into place under the content hash. Returns the hash"""
+        self.file.close()
+        sha256 = self.hash.hexdigest()
+        final = self.spool.path(sha256)
+        if os.path.exists(final):
+            os.remove(self.tmp)  # Already spooled: deduplicated
+        else:
+            os.replace(self.tmp, final)
+        return sha256
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+
+class _TextSink:
+    def __init__(self, limit):
+        self.chunks = []
+        self.size = 0
+        self.limit = limit
+
+    def write(self, data):
+        room = self.limit - self.size
+        if room > 0 and data:
+            data = data[:room]
+            self.chunks.append(data)
+            self.size += len(data)
+
+
+class _NullSink:
+    def write(self, data):
+        pass
+
+
+class _Decoder:
+    """Content-Transfer-Encoding decoding, one line at a time"""
+
+    def __init__(self, encoding, sink, newline):
+        self.encoding = (encoding or '7bit').lower()
+        self.sink = sink
+        self.newline = newline
+        self.pending_newline = False
+        self.b64_rest = b''
+
+    def feed(self, line):
+        if self.encoding == 'base64':
+            data = self.b64_rest + _B64_JUNK.sub(b'', line)
+            cut = len(data) - len(data) % 4
+            self.b64_rest = data[cut:]
+            if cut:
+                self.sink.write(binascii.a2b_base64(data[:cut]))
+            return
+        if self.pending_newline:
+            self.sink.write(self.newline)
+        if self.encoding == 'quoted-printable':
+            soft = line.endswith(b'=')
+            self.sink.write(binascii.a2b_qp(line[:-1] if soft else line))
+            self.pending_newline = not soft
+        else:
+            self.sink.write(line)
+            self.pending_newline = True
+
+    def close(self):
+        # The line break before a boundary belongs to the boundary, so it is dropped
+        if self.b64_rest:
+            self.sink.write(binascii.a2b_base64(self.b64_rest + b'=' * (-len(self.b64_rest) % 4)))
+
+
+class MessageReader:
+    """
+    Two-step reader over a line iterator:
+        msg = reader.headers()          # cheap, decide whether to keep it
+        body, attachments = reader.read_body(spool)   # or reader.drain()
+    """
+
+    def __init__(self, lines, text_limit=MAX_TEXT_BYTES):
+        self._lines = iter(lines)
+        self._text_limit = text_limit
+        self._msg = None
+        self._body = None
+        self._attachments = []
+
+    def headers(self):
+        if self._msg is None:
+            self._msg = self._read_headers()
+        return self._msg
+
+    def body_prefix(self, limit=1024):
+        """First ~limit raw (undecoded) body bytes; the lines are put back for read_body()"""
+        self.headers()
+        peeked, size = [], 0
+        for line in self._lines:
+            peeked.append(line)
+            size += len(line) + 2
+            if size >= limit:
+                break
+        self._lines = itertools.chain(peeked, self._lines)
+        return b'\r\n'.join(peeked)[:limit]
+
+    def drain(self):
+        """Consume the rest of the message without decoding it"""
+        for _ in self._lines:
+            pass
+
+    def read_body(self, spool):
+        """Decode the body: returns (text, [attachment metadata])"""
+        msg = self.headers()
+        try:
+            self._read_entity(msg, frozenset(), spool)
+        finally:
+            self.drain()
+        return self._body or '', self._attachments
+
+    def _read_headers(self):
+        raw = []
+        for line in self._lines:
+            if not line:
+                break
+            raw.append(line)
+        parser = email.parser.BytesHeaderParser(policy=email.policy.compat32)
+        return parser.parsebytes(b'\r\n'.join(raw) + b'\r\n\r\n')
+
+    def _read_entity(self, part, outer, spool):
+        """
+        Read one entity body. outer is the set of delimiter lines of the
+        enclosing multiparts; returns the delimiter line that ended this
+        entity, or None at end of message.
+        """
+        if part.get_content_maintype() == 'multipart' and part.get_boundary():
+            return self._read_multipart(part, outer, spool)
+
+        sink, finish = self._open_sink(part, spool, top=not outer)
+        decoder = _Decoder(part.get('Content-Transfer-Encoding', '').strip(),
+                           sink, b'\n' if isinstance(sink, _TextSink) else b'\r\n')
+        ended_by = None
+        try:
+            for line in self._lines:
+                if outer and line.rstrip() in outer:
+                    ended_by = line.rstrip()
+                    break
+                decoder.feed(line)
+            decoder.close()
+        except BaseException:
+            if isinstance(sink, _SpoolWriter):
+                sink.abort()
+            raise
+        finish()
+        return ended_by
+
+    def _read_multipart(self, part, outer, spool):
+        boundary = part.get_boundary().encode('ascii', 'replace')
+        delim, close = b'--' + boundary, b'--' + boundary + b'--'
+        inner = outer | {delim, close}
+
+        # Preamble
+        line = None
+        for raw in self._lines:
+            raw = raw.rstrip()
+            if raw in inner:
+                line = raw
+                break
+        while line is not None:
+            if line in outer and line not in (delim, close):
+                return line
+            if line == close:
+                # Epilogue runs until an enclosing delimiter or the end
+                for raw in self._lines:
+                    raw = raw.rstrip()
+                    if raw in outer:
+                        return raw
+                return None
+            child = self._read_headers()
+            line = self._read_entity(child, inner, spool)
+        return None
+
+    def _open_sink(self, part, spool, top):
+        ctype = part.get_content_type()
+        disposition = part.get_content_disposition()
+        filename = part.get_filename()
+        # A single-part text message is the body whatever its subtype
+        is_text = ctype == 'text/plain' or (top and part.get_content_maintype() == 'text')
+
+        if is_text and disposition != 'attachment' and not filename and self._body is None:
+            sink = _TextSink(self._text_limit)
+
+            def finish():
+                data = b''.join(sink.chunks)
+                charset = part.get_content_charset() or 'utf-8'
+                try:
+                    self._body = data.decode(charset, errors='replace')
+                except LookupError:
+                    self._body = data.decode('latin-1')
+            return sink, finish
+
+        if disposition == 'attachment' or filename or not part.get_content_maintype() == 'text':
+            sink = spool.writer()
+
+            def finish():
+                sha256 = sink.commit()
+                self._attachments.append({
+                    'filename': filename or f'attachment-{len(self._attachments) + 1}',
+                    'content_type': ctype,
+                    'size': sink.size,
+                    'sha256': sha256
+                })
+            return sink, finish
+
+        # Alternative bodies (text/html, extra inline text) are skipped
+        return _NullSink(), lambda: None
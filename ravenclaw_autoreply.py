@@ -0,0 +1,89 @@
+# ravenclaw_autoreply.py
+"""
+Ravenclaw Auto-Reply - Loop and flood protection
+================================================
+is_auto_generated() recognises mail that must never be answered
+automatically (RFC 3834 Auto-Submitted, Precedence: bulk/junk/list and
+the common vendor headers), which stops reply loops between bridges.
+
+ReplySuppressor remembers when each sender was last auto-replied to, so
+a sender who mails 50 times gets one reply per TTL. It is a bounded LRU
+(oldest senders are evicted first) and is persisted so a restart does
+not reset it.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from ravenclaw_persist import read_json
+
+_BULK_PRECEDENCE = {'bulk', 'junk', 'list', 'auto_reply'}
+
+
+def is_auto_generated(headers):
+    """True if the message headers mark it as automatic or bulk mail"""
+    if headers is None:
+        return False
+    auto_submitted = (headers.get('Auto-Submitted') or '').strip().lower()
+    if auto_submitted and auto_submitted != 'no':
+        return True
+    if (headers.get('Precedence') or '').strip().lower() in _BULK_PRECEDENCE:
+        return True
+    suppress = (headers.get('X-Auto-Response-Suppress') or '').lower()
+    if 'all' in suppress or 'autoreply' in suppress:
+        return True
+    return any(headers.get(name) for name in ('X-Autoreply', 'X-Autorespond', 'List-Id'))
+
+
+class ReplySuppressor:
+    def __init__(self, path, ttl, capacity, writer, logger=None):
+        self.path = path
+        self.ttl = ttl
+        self.capacity = capacity
+        self._writer = writer
+        self._lock = threading.Lock()
+        self._last = OrderedDict()  # sender -> unix time of last reply, oldest first
+        self.suppressed = 0
+        loaded = read_json(path, dict, logger).get('senders', {})
+        now = time.time()
+        for sender, ts in sorted(loaded.items(), key=lambda item: item[1]):
+            if now - ts < ttl:
+                self._last[sender] = ts
+        self._evict()
+
+    def should_reply(self, sender):
+        """False if sender was auto-replied to within the TTL"""
+        sender = sender.lower()
+        with self._lock:
+            ts = self._last.get(sender)
+            if ts is not None and time.time() - ts < self.ttl:
+                self.suppressed += 1
+                return False
+            return True
+
+    def record(self, senders):
+        """Remember replies to senders and persist in the background"""
+        now = time.time()
+        with self._lock:
+            for sender in senders:
+                sender = sender.lower()
+                self._last.pop(sender, None)
+                self._last[sender] = now
+            self._evict()
+        self._writer.replace(self.path, self._render, wait=False)
+
+    def _evict(self):
+        while len(self._last) > self.capacity:
+            self._last.popitem(last=False)
+
+    def _render(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            senders = {s: ts for s, ts in self._last.items() if ts > cutoff}
+        return json.dumps({'senders': senders})
+
+    def stats(self):
+        with self._lock:
+            return {'tracked_senders': len(self._last), 'suppressed': self.suppressed}
@@ -0,0 +1,81 @@
+# ravenclaw_bench_records.py
+"""
+Ravenclaw Records Bench - Memory held by the inbox, dicts vs records
+====================================================================
+Builds an inbox of typical entries, loads it from JSON once as plain
+dicts and once as EmailRecords, and reports what each keeps allocated
+(tracemalloc). Senders and routes repeat the way real mail does, so
+interning is measured as well as the missing per-record dict.
+
+Usage:
+    python ravenclaw_bench_records.py                # 100000 entries
+    python ravenclaw_bench_records.py --count 20000
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+from datetime import datetime
+
+from ravenclaw_records import EmailRecord
+
+SENDERS = 50  # Distinct senders in the sample inbox
+
+
+def sample_email(i):
+    """One inbox entry as check_inbox() stores it"""
+    sender = f'user{i % SENDERS}@example.com'
+    return {
+        'id': f'<{i:08d}.{i * 7919 % 100003:05d}@mail.example.com>',
+        'msg_num': str(i % 500 + 1),
+        'sender': sender,
+        'subject': f'Weekly report #{i}',
+        'body': f'Hello,\n\nthe numbers for week {i % 52 + 1} are attached.\n\nRegards,\n{sender}\n',
+        'attachments': [],
+        'timestamp': datetime.fromtimestamp(1780000000 + i * 60).isoformat(),
+        'read': i % 3 == 0,
+        'replied': False,
+        'routes': ['discord'],
+        'trace_id': f'{i * 2654435761 % 2 ** 128:032x}',
+        'uid': f'UID{i:010d}'
+    }
+
+
+def _retained(build):
+    """Bytes still allocated by what build() returns, once its temporaries are gone"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return current
+
+
+def measure(count=100_000):
+    """{'count', 'dicts_bytes', 'records_bytes', 'ratio'} for an inbox of count entries"""
+    text = json.dumps({'emails': [sample_email(i) for i in range(count)]})
+    dicts = _retained(lambda: json.loads(text)['emails'])
+    records = _retained(lambda: [EmailRecord.from_dict(e) for e in json.loads(text)['emails']])
+    return {'count': count, 'dicts_bytes': dicts, 'records_bytes': records, 'ratio': round(records / dicts, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='ravenclaw_bench_records', description=__doc__.split('\n')[1])
+    parser.add_argument('--count', type=int, default=100_000, help='Inbox entries (default: 100000)')
+    args = parser.parse_args(argv)
+
+    result = measure(args.count)
+    mb = 1024 * 1024
+    print(f"{result['count']} emails: {result['dicts_bytes'] / mb:.1f} MB as dicts, "
+          f"{result['records_bytes'] / mb:.1f} MB as records ({result['ratio']:.0%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
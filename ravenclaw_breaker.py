@@ -0,0 +1,161 @@
+# ravenclaw_breaker.py
+"""
+Ravenclaw Breaker - Circuit breakers for outbound endpoints
+===========================================================
+Each endpoint (Discord webhook, OpenClaw URL, SMTP relay) gets a breaker
+that watches the outcome of its last `window` calls:
+
+  closed     calls go through; once at least `min_calls` outcomes are in
+             the window and the failure rate reaches `failure_rate`, opens
+  open       calls fail fast without touching the network until
+             `open_seconds` have passed
+  half_open  one probe call is let through; success closes the breaker,
+             failure opens it again for another `open_seconds`
+
+Callers treat a refused call like a failed one and leave the work in
+their retry storage (scheduled queue, delivery retry list).
+"""
+
+import hashlib
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    def __init__(self, name, window=20, min_calls=5, failure_rate=0.5, open_seconds=30, clock=time.monotonic):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)  # True = success
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def available(self):
+        """True if a call would be let through now (does not take the half-open probe)"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                return self._clock() - self._opened_at >= self.open_seconds
+            return not self._probing
+
+    def retry_after(self):
+        """Seconds until the next call may be let through (0 if now)"""
+        with self._lock:
+            if self._state == CLOSED:
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - self._clock())
+
+    def allow(self):
+        """Ask to make a call. Must be followed by record() when True"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success):
+        """Report the outcome of an allowed call"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing = False
+                if success:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._trip()
+                return
+            self._outcomes.append(bool(success))
+            if self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._trip()
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        self.opened += 1
+
+    def snapshot(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                'state': self._state,
+                'failure_rate': round(self._outcomes.count(False) / calls, 2) if calls else 0.0,
+                'calls_in_window': calls,
+                'retry_after': round(max(0.0, self._opened_at + self.open_seconds - self._clock()), 1)
+                               if self._state != CLOSED else 0.0,
+                'opened': self.opened,
+                'rejected': self.rejected
+            }
+
+
+def endpoint_label(kind, url):
+    """Log/health-safe name for a URL endpoint: webhook tokens never leave the process"""
+    host = urlsplit(url).netloc or url
+    return f"{kind}:{host}#{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}"
+
+
+class BreakerBoard:
+    """One breaker per endpoint key, created on first use with shared settings"""
+
+    def __init__(self, logger=None, **settings):
+        self._logger = logger
+        self._settings = settings
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get(self, name):
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = _LoggingBreaker(name, self._logger, **self._settings)
+            return breaker
+
+    def snapshot(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {b.name: b.snapshot() for b in breakers}
+
+
+class _LoggingBreaker(CircuitBreaker):
+    """Logs state transitions"""
+
+    def __init__(self, name, logger, **settings):
+        super().__init__(name, **settings)
+        self._logger = logger
+
+    def record(self, success):
+        before = self.state
+        super().record(success)
+        after = self.state
+        if self._logger and after != before:
+            if after == OPEN:
+                self._logger.error(f"Circuit {self.name} open: failing fast for {self.open_seconds}s")
+            elif after == CLOSED:
+                self._logger.info(f"Circuit {self.name} closed")
@@ -0,0 +1,145 @@
+# ravenclaw_cli.py
+"""
+Ravenclaw CLI - One-shot commands without the HTTP bridge
+=========================================================
+For cron jobs, scripts and ephemeral containers that should not keep a
+Flask server and background loops resident.
+
+Usage:
+    python ravenclaw_cli.py check --once
+    python ravenclaw_cli.py send <to> <subject> <body> [--cc x] [--bcc y]
+    python ravenclaw_cli.py schedule <to> <subject> <body> <target_time>
+    python ravenclaw_cli.py flush-scheduled
+    python ravenclaw_cli.py stats
+    python ravenclaw_cli.py migrate
+
+Only ravenclaw_core is imported; Flask is never loaded and requests is
+only loaded when an email actually needs forwarding.
+"""
+
+import argparse
+import json
+import sys
+
+
+def cmd_check(core, args):
+    """Fetch new mail once (--once) or keep polling in the foreground"""
+    if args.once:
+        try:
+            core.check_inbox()
+        except Exception:
+            return 1  # Logged by check_inbox
+        core.router.wait_idle()
+    else:
+        core.run_scheduler()
+    return 0
+
+
+def cmd_send(core, args):
+    """Send an email immediately via SMTP"""
+    if not core.is_allowed(args.to):
+        print('[ERROR] Domain not allowed', file=sys.stderr)
+        return 1
+    success = core.send_smtp(args.to, args.subject, args.body, cc=args.cc, bcc=args.bcc)
+    print(json.dumps({'status': 'sent' if success else 'failed'}))
+    return 0 if success else 1
+
+
+def cmd_schedule(core, args):
+    """Add an email to the scheduled queue"""
+    data = {
+        'to': args.to,
+        'subject': args.subject,
+        'body': args.body,
+        'target_time': args.target_time,
+        'priority': args.priority
+    }
+    if args.cc:
+        data['cc'] = args.cc
+    if args.bcc:
+        data['bcc'] = args.bcc
+
+    error, _ = core.validate_scheduled(data)
+    if error:
+        print(f'[ERROR] {error}', file=sys.stderr)
+        return 1
+
+    email_entry = core.new_scheduled_entry(data)
+    core.schedule_emails([email_entry])
+    core.logger.info(f"Scheduled email: {data['to']} for {data['target_time']}")
+
+    print(json.dumps({'status': 'scheduled', 'id': email_entry['id'], 'target_time': data['target_time']}))
+    return 0
+
+
+def cmd_flush_scheduled(core, args):
+    """Send every scheduled email whose target_time has passed"""
+    core.check_and_send_scheduled()
+    return 0
+
+
+def cmd_stats(core, args):
+    """Print inbox and queue statistics as JSON"""
+    print(json.dumps(core.compute_stats(), indent=2))
+    return 0
+
+
+def cmd_migrate(core, args):
+    """Upgrade state files from older versions"""
+    print(json.dumps(core.migrate_state(), indent=2))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='ravenclaw', description='Ravenclaw one-shot commands')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('check', help='Check for new emails')
+    p.add_argument('--once', action='store_true', help='Run a single check and exit')
+    p.set_defaults(func=cmd_check)
+
+    p = sub.add_parser('send', help='Send an email now')
+    p.add_argument('to')
+    p.add_argument('subject')
+    p.add_argument('body')
+    p.add_argument('--cc', action='append')
+    p.add_argument('--bcc', action='append')
+    p.set_defaults(func=cmd_send)
+
+    p = sub.add_parser('schedule', help='Schedule an email')
+    p.add_argument('to')
+    p.add_argument('subject')
+    p.add_argument('body')
+    p.add_argument('target_time', help='ISO-8601, e.g. 2026-12-31T09:00:00')
+    p.add_argument('--cc', action='append')
+    p.add_argument('--bcc', action='append')
+    p.add_argument('--priority', default='normal', choices=['low', 'normal', 'high'])
+    p.set_defaults(func=cmd_schedule)
+
+    p = sub.add_parser('flush-scheduled', help='Send due scheduled emails and exit')
+    p.set_defaults(func=cmd_flush_scheduled)
+
+    p = sub.add_parser('stats', help='Show inbox and queue statistics')
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser('migrate', help='Upgrade state files')
+    p.set_defaults(func=cmd_migrate)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # Imported after argument parsing so --help and usage errors stay instant
+    import ravenclaw_core as core
+
+    try:
+        return args.func(core, args)
+    except KeyboardInterrupt:
+        core.request_shutdown()
+        return 130
+
+
+if __name__ == '__main__':
+    sys.exit(main())
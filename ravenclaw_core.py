@@ -0,0 +1,1307 @@
+# ravenclaw_core.py
+"""
+Ravenclaw Core - Shared bridge logic
+====================================
+Config, inbox/queue storage, SMTP sending and POP3 checking used by
+both the Flask bridge (ravenclaw.py) and the one-shot CLI (ravenclaw_cli.py).
+
+Kept free of Flask and requests at import time so short-lived CLI runs
+start fast; requests is imported on first use.
+"""
+
+import poplib
+import smtplib
+import email
+import email.utils
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+import json
+import re
+import os
+import time
+import uuid
+import threading
+from datetime import datetime
+
+import atexit
+
+from ravenclaw_actor import InboxActor, SingleFlight
+from ravenclaw_archive import Archive
+from ravenclaw_attachments import AttachmentSpool, MessageReader, RetrLines
+from ravenclaw_autoreply import ReplySuppressor, is_auto_generated
+from ravenclaw_breaker import BreakerBoard, endpoint_label
+from ravenclaw_counters import Counters
+from ravenclaw_dedupe import DedupeIndex, message_key
+from ravenclaw_logging import setup_logging, setup_sink
+from ravenclaw_persist import GroupCommitWriter, atomic_write_text, read_json
+from ravenclaw_poller import AdaptivePoller
+from ravenclaw_ratelimit import SendLimiter, parse_domain_rates, parse_rate
+from ravenclaw_records import EmailRecord, ScheduledEntry, as_dict
+from ravenclaw_recurring import RecurringStore
+from ravenclaw_retention import MODES as RETENTION_MODES, RetentionLedger
+from ravenclaw_routing import PendingRetries, Router
+from ravenclaw_tracing import Tracer
+
+# ========== CONFIG ==========
+
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+
+def load_env():
+    """Load environment variables from .env"""
+    if not os.path.exists(ENV_FILE):
+        print(f"[WARN] {ENV_FILE} not found!")
+        return
+    
+    with open(ENV_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                k, v = line.split('=', 1)
+                os.environ.setdefault(k.strip(), v.strip())
+
+load_env()
+
+def get_env(key, required=False, default=None):
+    val = os.environ.get(key, default)
+    if required and not val:
+        raise ValueError(f"Required env var {key} not set!")
+    return val
+
+# Email settings
+EMAIL = {
+    'host': get_env('EMAIL_HOST', False, 'mail.example.com'),
+    'pop_port': int(get_env('EMAIL_POP_PORT', False, '995')),
+    'smtp_port': int(get_env('EMAIL_SMTP_PORT', False, '587')),
+    'username': get_env('EMAIL_USERNAME', True),
+    'password': get_env('EMAIL_PASSWORD', True),
+    'sender_name': get_env('SENDER_NAME', False, 'Ibrahim Qureshi')
+}
+
+# Domain filter
+DOMAIN_FILTER = get_env('DOMAIN_FILTER', False, 'example.com')
+ALLOWED_DOMAINS = [d.strip() for d in DOMAIN_FILTER.split(',')]
+
+# Server-side retention (see ravenclaw_retention.py): keep, after_ingest or after_days
+RETENTION = {
+    'mode': get_env('POP3_RETENTION', False, 'keep').lower(),
+    'days': float(get_env('POP3_RETENTION_DAYS', False, '30')),  # after_days only
+    'delete_rejected': get_env('POP3_DELETE_REJECTED', False, 'false').lower() == 'true',
+    'ledger_file': 'ravenclaw_retention.json'
+}
+if RETENTION['mode'] not in RETENTION_MODES:
+    raise ValueError(f"POP3_RETENTION must be one of: {', '.join(RETENTION_MODES)}")
+
+# Seen-message index (Message-ID, else From/Date/Subject/body hash); the file may be shared
+DEDUPE = {
+    'file': get_env('DEDUPE_FILE', False, 'ravenclaw_dedupe.txt'),
+    'capacity': int(get_env('DEDUPE_CAPACITY', False, '100000')),
+    'prefix_bytes': 1024  # raw body bytes hashed when there is no Message-ID
+}
+
+# Discord settings
+DISCORD = {
+    'webhook_url': get_env('DISCORD_WEBHOOK_URL', False, ''),
+    'use_webhook': get_env('DISCORD_USE_WEBHOOK', False, 'false').lower() == 'true',
+    'openclaw_url': get_env('OPENCLAW_URL', False, 'http://localhost:3000/api/message'),
+    # Attachments up to this total size are uploaded with the webhook message
+    'max_upload': int(float(get_env('DISCORD_MAX_UPLOAD_MB', False, '10')) * 1024 * 1024),
+    'max_files': 10
+}
+
+# Bridge settings
+BRIDGE = {
+    'host': get_env('BRIDGE_HOST', False, '0.0.0.0'),
+    'port': int(get_env('BRIDGE_PORT', False, '5002')),
+    'poll_interval': int(get_env('BRIDGE_POLL_INTERVAL', False, '30')),  # minutes, upper bound when idle
+    'poll_min': int(get_env('BRIDGE_POLL_MIN', False, '60')),  # seconds, interval right after new mail
+    'poll_backoff': float(get_env('BRIDGE_POLL_BACKOFF', False, '2')),
+    'compress_min_bytes': int(get_env('BRIDGE_COMPRESS_MIN_BYTES', False, '1024')),  # smaller bodies go as-is
+    'compress_level': int(get_env('BRIDGE_COMPRESS_LEVEL', False, '6'))
+}
+
+# Auto-reply settings
+AUTO_REPLY = {
+    'enabled': get_env('AUTO_REPLY_ENABLED', False, 'false').lower() == 'true',
+    'template': get_env('AUTO_REPLY_TEMPLATE', False, 
+        "Thank you for your email. I've received your message and will respond shortly.\n\n- Enoth"),
+    'ttl': float(get_env('AUTO_REPLY_TTL_HOURS', False, '24')) * 3600,  # one reply per sender per TTL
+    'cache_size': int(get_env('AUTO_REPLY_CACHE_SIZE', False, '10000')),
+    'state_file': 'ravenclaw_autoreply.json'
+}
+
+# RFC 3834: marks our replies so other responders do not answer them
+AUTO_REPLY_HEADERS = {'Auto-Submitted': 'auto-replied'}
+
+# Scheduled email settings
+SCHEDULED = {
+    'queue_file': 'ravenclaw_scheduled.json',
+    'sent_file': 'ravenclaw_sent.json',  # Track sent emails across restarts
+    'recurring_file': 'ravenclaw_recurring.jsonl',  # Recurring definitions and fire journal
+    'max_attempts': 3,
+    'check_interval': 60  # seconds
+}
+
+# Outbound SMTP rate limits ("N/s", "N/min", "N/h"); unset means unlimited
+SMTP_LIMITS = {
+    'global': get_env('SMTP_RATE_GLOBAL', False, ''),
+    'default': get_env('SMTP_RATE_DEFAULT', False, ''),  # per recipient domain
+    'domains': get_env('SMTP_RATE_DOMAINS', False, '')  # e.g. gmail.com=20/min,example.com=100/h
+}
+
+# Circuit breakers per outbound endpoint (Discord webhook, OpenClaw, SMTP)
+BREAKER = {
+    'window': int(get_env('BREAKER_WINDOW', False, '20')),  # recent calls considered
+    'min_calls': int(get_env('BREAKER_MIN_CALLS', False, '5')),
+    'failure_rate': float(get_env('BREAKER_FAILURE_RATE', False, '0.5')),
+    'open_seconds': float(get_env('BREAKER_OPEN_SECONDS', False, '60'))  # fail fast, then probe
+}
+
+# Per-email stage spans, written as OTLP-style JSONL (no collector needed)
+TRACING = {
+    'enabled': get_env('TRACING', False, 'true').lower() == 'true',
+    'file': get_env('TRACE_FILE', False, 'ravenclaw_traces.jsonl'),
+    'max_bytes': int(get_env('TRACE_MAX_BYTES', False, str(5 * 1024 * 1024))),
+    'backups': int(get_env('TRACE_BACKUPS', False, '3')),
+    'keep': int(get_env('TRACE_KEEP', False, '2000'))  # recent traces served from memory
+}
+
+# Persistence: writes arriving within this window share one group commit
+PERSIST = {
+    'commit_window': float(get_env('PERSIST_COMMIT_WINDOW_MS', False, '50')) / 1000
+}
+
+# Memory leak prevention
+MAX_EMAILS = 1000  # Keep last 1000 emails in the hot inbox; older ones go to the archive
+
+# Global shutdown flag
+shutdown_requested = False
+
+# Last POP3 STAT (count, octets) seen by a full check; unchanged means no new mail
+mailbox_fingerprint = None
+
+# Logging: callers only enqueue; a listener thread writes the rotated JSON file and console
+logger = setup_logging('ravenclaw', 'RAVENCLAW', 'ravenclaw.log')
+
+# Stage spans per email; the sink shares the logging queue/rotation machinery
+tracer = Tracer(setup_sink('ravenclaw.trace', TRACING['file'], TRACING['max_bytes'], TRACING['backups']),
+                TRACING['file'], TRACING['keep']) if TRACING['enabled'] else Tracer()
+
+# Crash-safe writer shared by every state file
+writer = GroupCommitWriter(PERSIST['commit_window'], logger)
+atexit.register(writer.flush)
+
+# ========== FILE PATHS ==========
+
+INBOX_FILE = 'ravenclaw_inbox.json'
+PROCESSED_FILE = 'ravenclaw_processed.txt'
+COUNTERS_FILE = 'ravenclaw_counters.json'
+ARCHIVE_DIR = get_env('ARCHIVE_DIR', False, 'ravenclaw_archive')
+
+ATTACHMENT_DIR = get_env('ATTACHMENT_DIR', False, 'ravenclaw_attachments')
+ROUTES_FILE = get_env('ROUTES_FILE', False, 'ravenclaw_routes.json')
+RETRIES_FILE = 'ravenclaw_retries.json'
+
+# Per-day compressed segments for mail trimmed from the inbox
+archive = Archive(ARCHIVE_DIR, logger)
+
+# Content-addressed store for decoded attachments
+spool = AttachmentSpool(ATTACHMENT_DIR)
+
+# ========== HELPERS ==========
+
+def get_domain(email_addr):
+    """Extract domain from email"""
+    m = re.search(r'@([a-zA-Z0-9.-]+)', email_addr)
+    return m.group(1).lower() if m else None
+
+def is_allowed(email_addr):
+    """Check if email domain is allowed"""
+    domain = get_domain(email_addr)
+    return domain and any(domain == d.lower() for d in ALLOWED_DOMAINS)
+
+def load_inbox():
+    """Load inbox from JSON file"""
+    return read_json(INBOX_FILE, lambda: {'emails': []}, logger)
+
+def load_inbox_records():
+    """Load inbox with emails as EmailRecord objects (what the inbox actor holds)"""
+    inbox = load_inbox()
+    inbox['emails'] = [EmailRecord.from_dict(e) for e in inbox.get('emails', [])]
+    return inbox
+
+def save_inbox(inbox):
+    """Save inbox (records or dicts) to JSON file; inbox_store trims it to MAX_EMAILS first"""
+    emails = inbox.get('emails', [])
+    # Records are rendered to JSON on the writer thread, at commit time
+    writer.replace(INBOX_FILE, lambda: json.dumps({**inbox, 'emails': [as_dict(e) for e in emails]},
+                                                  indent=2, ensure_ascii=False))
+
+def archive_emails(emails):
+    archive.append([as_dict(e) for e in emails])
+
+# Lifetime counters (received, rejected, forwarded, forward_failed)
+counters = Counters(COUNTERS_FILE, writer, logger)
+
+# Keys of every stored message, probed before a body is parsed
+dedupe_index = DedupeIndex(DEDUPE['file'], DEDUPE['capacity'], writer, logger)
+
+# Server messages awaiting deletion under RETENTION (empty when mode is keep)
+retention_ledger = RetentionLedger(RETENTION['ledger_file'], writer, logger)
+
+def retention_due():
+    """UIDs the retention policy wants deleted from the server now"""
+    if RETENTION['mode'] == 'after_ingest':
+        return retention_ledger.due(time.time(), wait_for_routes=False)
+    if RETENTION['mode'] == 'after_days':
+        return retention_ledger.due(time.time() - RETENTION['days'] * 86400)
+    return set()
+
+def on_delivery(name, ok, email_data):
+    """Final outcome of one route for one email"""
+    counters.incr('forwarded' if ok else 'forward_failed')
+    if email_data.get('uid'):
+        retention_ledger.delivered(email_data['uid'], name, ok)
+
+# Senders auto-replied to recently (bounded LRU, persisted)
+reply_suppressor = ReplySuppressor(AUTO_REPLY['state_file'], AUTO_REPLY['ttl'],
+                                   AUTO_REPLY['cache_size'], writer, logger)
+
+# Single writer for the inbox: check_inbox() and the routes go through it
+inbox_store = InboxActor(load_inbox_records, save_inbox, limit=MAX_EMAILS, logger=logger, on_trim=archive_emails)
+
+def load_processed():
+    """Load processed message IDs"""
+    try:
+        with open(PROCESSED_FILE, 'r') as f:
+            return set(line.strip() for line in f)
+    except:
+        return set()
+
+def save_processed(*msg_ids):
+    """Append processed message IDs in one durable write"""
+    if msg_ids:
+        writer.append(PROCESSED_FILE, ''.join(msg_id + '\n' for msg_id in msg_ids))
+
+def rewrite_processed(msg_ids):
+    """Replace the processed set (drops entries for messages deleted from the server)"""
+    msg_ids = sorted(msg_ids)
+    writer.replace(PROCESSED_FILE, lambda: ''.join(msg_id + '\n' for msg_id in msg_ids))
+
+def processed_key(msg_num, uid):
+    """Processed-set entry for a server message: its UIDL when known, else the session msg_num"""
+    return f'uid:{uid}' if uid else msg_num
+
+def list_mailbox(mail, processed_ids):
+    """
+    [(msg_num, uid)] for every message on the server. uid is the UIDL
+    (stable across sessions, so deletion cannot confuse the processed set)
+    or None when the server has no UIDL.
+    """
+    try:
+        _, lines, _ = mail.uidl()
+    except poplib.error_proto:
+        _, lines, _ = mail.list()
+        return [(line.decode().split()[0], None) for line in lines]
+    
+    listing = [tuple(line.decode().split()[:2]) for line in lines]
+    # One-time upgrade: the processed set was keyed by msg_num before UIDL was used
+    if processed_ids and not any(key.startswith('uid:') for key in processed_ids):
+        migrated = [processed_key(num, uid) for num, uid in listing if num in processed_ids]
+        save_processed(*migrated)
+        processed_ids.update(migrated)
+        logger.info(f"Processed set moved to UIDL keys ({len(migrated)} messages)")
+    return listing
+
+# ========== SCHEDULED EMAIL FUNCTIONS ==========
+
+def load_scheduled_queue():
+    """Load scheduled email queue from JSON file"""
+    try:
+        data = read_json(SCHEDULED['queue_file'], lambda: {'version': '1.0', 'emails': []}, logger)
+        
+        entries = [ScheduledEntry.from_dict(e) for e in data.get('emails', [])]
+        
+        # Sync with persistent sent IDs to ensure no re-sending
+        sent_ids = load_sent_ids()
+        now = int(time.time())
+        for email_entry in entries:
+            if email_entry.id in sent_ids:
+                email_entry.status = 'sent'
+                if not email_entry.sent_at:
+                    email_entry.sent_at = now
+        
+        # Filter out finished emails (sent, failed, cancelled) older than 7 days
+        cutoff = now - (7 * 24 * 60 * 60)
+        data['emails'] = [e for e in entries if e.status == 'pending' or finished_at(e) > cutoff]
+        return data
+    except:
+        return {'version': '1.0', 'emails': []}
+
+def finished_at(email_entry):
+    """When a sent, failed or cancelled entry was settled (best known time)"""
+    if email_entry.status == 'sent':
+        return email_entry.sent_at or 0
+    return email_entry.last_attempt or email_entry.target or 0
+
+# Bumped by every save from this process; the file signatures cover other processes
+scheduled_saves = 0
+
+# Recurring schedules, kept apart from the one-shot queue (see ravenclaw_recurring.py)
+recurring = RecurringStore(SCHEDULED['recurring_file'], writer, logger)
+
+def save_scheduled_queue(queue):
+    """Save scheduled email queue (entries or dicts) to JSON file"""
+    global scheduled_saves
+    emails = list(queue.get('emails', []))
+    writer.replace(SCHEDULED['queue_file'], lambda: json.dumps({**queue, 'emails': [as_dict(e) for e in emails]},
+                                                               indent=2, ensure_ascii=False))
+    scheduled_saves += 1
+    remember_scheduled_counts(queue)
+
+def scheduled_version():
+    """Changes whenever load_scheduled_queue() could return something different"""
+    return (scheduled_saves, file_signature(SCHEDULED['queue_file']), file_signature(SCHEDULED['sent_file']),
+            int(time.time()) // 3600)  # Sent entries also age out of the listing over time
+
+# Per-status counts of the scheduled queue, tagged with the file version they describe
+scheduled_counts_cache = (None, None)
+
+def file_signature(path):
+    """(mtime_ns, size) of path, or None if missing - changes whenever the file is replaced"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def remember_scheduled_counts(queue):
+    """Record per-status counts for the queue just loaded or saved"""
+    global scheduled_counts_cache
+    counts = {}
+    for email_entry in queue.get('emails', []):
+        status = email_entry.get('status', 'pending')
+        counts[status] = counts.get(status, 0) + 1
+    scheduled_counts_cache = (file_signature(SCHEDULED['queue_file']), counts)
+    return counts
+
+def scheduled_counts():
+    """Per-status counts; the queue file is only parsed if another process changed it"""
+    signature, counts = scheduled_counts_cache
+    if counts is None or signature != file_signature(SCHEDULED['queue_file']):
+        with scheduled_lock:
+            counts = remember_scheduled_counts(load_scheduled_queue())
+    return counts
+
+# Serializes load-modify-save cycles on the scheduled queue within this process
+scheduled_lock = threading.Lock()
+
+def update_scheduled_queue(mutate):
+    """Apply mutate(queue) -> (result, changed) under the queue lock; saves once if changed"""
+    with scheduled_lock:
+        queue = load_scheduled_queue()
+        result, changed = mutate(queue)
+        if changed:
+            save_scheduled_queue(queue)
+        return result
+
+def load_sent_ids():
+    """Load IDs of already-sent emails"""
+    data = read_json(SCHEDULED['sent_file'], dict, logger)
+    return set(data.get('sent_ids', []))
+
+def save_sent_ids(sent_ids, queue):
+    """Save sent email IDs to persistent file (only ids still in the queue; the rest can never resend)"""
+    live = {email_entry.id for email_entry in queue.get('emails', [])}
+    sent_ids &= live
+    writer.replace_json(SCHEDULED['sent_file'], {'sent_ids': list(sent_ids)}, indent=2)
+
+# Outbound endpoints fail fast while their breaker is open
+breakers = BreakerBoard(logger, **BREAKER)
+smtp_breaker = breakers.get('smtp')
+
+# Token buckets shared by every SMTP send in this process
+limiter = SendLimiter(parse_rate(SMTP_LIMITS['global']),
+                      parse_domain_rates(SMTP_LIMITS['domains']),
+                      parse_rate(SMTP_LIMITS['default']))
+
+def as_list(value):
+    """None, one address or a list of addresses -> list"""
+    if not value:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+def smtp_recipients(to, cc=None, bcc=None):
+    """Every envelope recipient of a message (To + CC + BCC)"""
+    return [to] + as_list(cc) + as_list(bcc)
+
+def smtp_gate(recipients):
+    """
+    Non-blocking check before a send. Returns (None, 0) to send now, or
+    (reason, seconds_to_wait) with reason 'circuit_open' or 'rate_limited'.
+    """
+    if not smtp_breaker.available():
+        return 'circuit_open', max(1.0, smtp_breaker.retry_after())
+    allowed, wait = limiter.try_acquire(recipients)
+    return (None, 0.0) if allowed else ('rate_limited', wait)
+
+def build_smtp_message(to, subject, body, in_reply_to=None, cc=None, references=None, headers=None):
+    """MIME message with optional CC, extra headers and reply threading"""
+    msg = MIMEMultipart()
+    
+    # Add "Re: " prefix if not already present
+    if subject and not subject.lower().startswith('re:'):
+        subject = f"Re: {subject}"
+    
+    msg['Subject'] = subject
+    msg['From'] = f"{EMAIL['sender_name']} <{EMAIL['username']}>"
+    msg['To'] = to
+    
+    # Add CC recipients if provided
+    if cc:
+        msg['Cc'] = ', '.join(as_list(cc))
+    
+    # Add threading headers for replies
+    if in_reply_to:
+        msg['In-Reply-To'] = in_reply_to
+    if references:
+        msg['References'] = references
+    elif in_reply_to:
+        # If only in_reply_to is provided, use it as references too
+        msg['References'] = in_reply_to
+    
+    for name, value in (headers or {}).items():
+        msg[name] = value
+    
+    msg.attach(MIMEText(body, 'plain', 'utf-8'))
+    return msg
+
+class SMTPSession:
+    """
+    One SMTP connection reused for several sends (connects on first send,
+    reconnects after a connection error). Use as a context manager.
+    """
+    
+    def __init__(self):
+        self._server = None
+        self.sent = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+    
+    def _connect(self):
+        server = smtplib.SMTP(EMAIL['host'], EMAIL['smtp_port'], timeout=30)
+        try:
+            server.starttls()
+            server.login(EMAIL['username'], EMAIL['password'])
+        except BaseException:
+            server.close()
+            raise
+        self._server = server
+    
+    def send(self, to, subject, body, in_reply_to=None, cc=None, bcc=None, references=None, headers=None):
+        """Send one message over the session. Returns True on success"""
+        msg = build_smtp_message(to, subject, body, in_reply_to, cc, references, headers)
+        
+        if not smtp_breaker.allow():
+            logger.error(f"SMTP circuit open, not sending to {to}")
+            return False
+        
+        try:
+            if self._server is None:
+                self._connect()
+            # Use sendmail for proper CC/BCC handling
+            self._server.sendmail(EMAIL['username'], smtp_recipients(to, cc, bcc), msg.as_string())
+            smtp_breaker.record(True)
+            self.sent += 1
+            logger.info(f"Sent SMTP: {to}" + (f", CC: {cc}" if cc else "") + (f", BCC: {bcc}" if bcc else "") + (f", Thread: {in_reply_to}" if in_reply_to else ""))
+            return True
+        except Exception as e:
+            # A refused message means the relay is up; anything else counts against it
+            refused = isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused))
+            smtp_breaker.record(refused)
+            if not refused:
+                self._server, server = None, self._server
+                if server is not None:
+                    server.close()
+            logger.error(f"SMTP error: {e}")
+            return False
+
+def send_smtp(to, subject, body, in_reply_to=None, cc=None, bcc=None, references=None, headers=None):
+    """Send email via SMTP with optional CC, BCC and reply threading support"""
+    with SMTPSession() as session:
+        return session.send(to, subject, body, in_reply_to, cc, bcc, references, headers)
+
+PRIORITY_ORDER = {'high': 0, 'normal': 1, 'low': 2}
+
+def check_and_send_scheduled():
+    """
+    Check scheduled emails (one-shot and recurring) and send those ready.
+    Entries throttled by the rate limiter, or held while the SMTP circuit
+    is open, stay pending without using an attempt. Returns seconds until
+    the earliest of them may go or the next recurring fire, or None.
+    """
+    if shutdown_requested:
+        return None
+    
+    queue = load_scheduled_queue()
+    now_ts = time.time()
+    
+    # Load persistent sent IDs to prevent re-sending across restarts
+    sent_ids = load_sent_ids()
+    
+    due = []
+    for email_entry in queue.get('emails', []):
+        # Skip sent, failed and cancelled entries (and ids sent by an earlier run)
+        if email_entry.status != 'pending' or email_entry.id in sent_ids:
+            continue
+        if email_entry.target is None:
+            logger.error(f"Scheduled email {email_entry.id} has no valid target_time")
+            continue
+        if email_entry.target <= now_ts:
+            due.append((PRIORITY_ORDER.get(email_entry.priority, 1), email_entry.target, email_entry))
+    due.sort(key=lambda item: item[:2])
+    
+    updated = set()
+    deferred = 0
+    retry_after = None
+    
+    session = SMTPSession()  # One connection for everything due this pass
+    for _, _, email_entry in due:
+        if shutdown_requested:
+            break
+        email_id = email_entry.id
+        try:
+            # Non-blocking: a throttled entry waits for a later pass, other domains go ahead;
+            # while the SMTP circuit is open everything waits without using an attempt
+            blocked, wait = smtp_gate(smtp_recipients(email_entry.to, email_entry.cc, email_entry.bcc))
+            if blocked:
+                retry_after = wait if retry_after is None else min(retry_after, wait)
+                deferred += 1
+                continue
+            
+            success = session.send(
+                email_entry.to,
+                email_entry.subject,
+                email_entry.body,
+                in_reply_to=email_entry.in_reply_to,
+                cc=email_entry.cc,
+                bcc=email_entry.bcc,
+                references=email_entry.references,
+                headers=email_entry.headers
+            )
+            now = int(time.time())
+            
+            if success:
+                email_entry.status = 'sent'
+                email_entry.sent_at = now
+                sent_ids.add(email_id)  # Track persistently
+                save_sent_ids(sent_ids, queue)  # Save immediately
+                logger.info(f"Scheduled email sent: {email_entry.to} ({email_id})")
+            else:
+                email_entry.attempts += 1
+                email_entry.last_attempt = now
+                
+                if email_entry.attempts >= SCHEDULED['max_attempts']:
+                    email_entry.status = 'failed'
+                    email_entry.error = 'Max attempts reached'
+                    logger.error(f"Scheduled email failed: {email_entry.to}")
+            
+            updated.add(email_id)
+            
+        except Exception as e:
+            logger.error(f"Error processing scheduled email: {e}")
+    recurring_retry = send_recurring_due(session)
+    session.close()
+    
+    if retry_after is not None:
+        logger.info(f"Deferred {deferred} scheduled email(s) (rate limit or SMTP circuit), next in {retry_after:.1f}s")
+    next_fire = recurring.next_due()
+    for wait in (recurring_retry, None if next_fire is None else max(0, next_fire - time.time())):
+        if wait is not None:
+            retry_after = wait if retry_after is None else min(retry_after, wait)
+    
+    if updated:
+        # Merge by id so entries scheduled or cancelled while sending are kept
+        changes = {e.id: e for e in queue['emails'] if e.id in updated}
+        def apply(latest):
+            latest['emails'] = [changes.get(e.id, e) for e in latest.get('emails', [])]
+            return None, True
+        update_scheduled_queue(apply)
+    
+    return retry_after
+
+def send_recurring_due(session):
+    """
+    Send every due recurring occurrence over session. Throttled ones are
+    retried when the limiter allows; failed sends count towards
+    SCHEDULED['max_attempts'] for that occurrence. Returns seconds until a
+    throttled one may go, or None.
+    """
+    retry_after = None
+    due = recurring.due()
+    for definition, at in due:
+        schedule_id = definition['id']
+        try:
+            if shutdown_requested:
+                recurring.postpone(schedule_id, at, time.time())
+                continue
+            blocked, wait = smtp_gate(smtp_recipients(definition['to'], definition.get('cc'), definition.get('bcc')))
+            if blocked:
+                recurring.postpone(schedule_id, at, time.time() + wait)
+                retry_after = wait if retry_after is None else min(retry_after, wait)
+                continue
+            
+            if session.send(definition['to'], definition['subject'], definition['body'],
+                            cc=definition.get('cc'), bcc=definition.get('bcc')):
+                recurring.fired(schedule_id, at)
+                logger.info(f"Recurring email sent: {definition['to']} ({schedule_id})")
+            elif recurring.failed_attempt(schedule_id) >= SCHEDULED['max_attempts']:
+                recurring.fired(schedule_id, at, 'failed')
+                logger.error(f"Recurring email failed, skipping this occurrence: {definition['to']} ({schedule_id})")
+            else:
+                recurring.postpone(schedule_id, at, time.time() + SCHEDULED['check_interval'])
+        except Exception as e:
+            logger.error(f"Error processing recurring email {schedule_id}: {e}")
+            recurring.postpone(schedule_id, at, time.time() + SCHEDULED['check_interval'])
+    if due:
+        recurring.flush()  # Fires of this pass are committed together
+    return retry_after
+
+# ========== DISCORD/EMAIL FUNCTIONS ==========
+
+def discord_uploads(attachments):
+    """Attachments that fit in one webhook upload (Discord's file count and size limits)"""
+    uploads, total = [], 0
+    for att in attachments or []:
+        if len(uploads) >= DISCORD['max_files']:
+            break
+        if total + att['size'] <= DISCORD['max_upload'] and os.path.exists(spool.path(att['sha256'])):
+            uploads.append(att)
+            total += att['size']
+    return uploads
+
+def format_discord_message(sender, subject, body, msg_id, attachments=None):
+    """Discord message text for an email"""
+    listing = ''.join(f"\n- {a['filename']} ({a['size']} bytes)" for a in attachments or [])
+    return f"""**New Email**
+
+From: {sender}
+Subject: {subject}
+Time: {datetime.now().strftime('%Y-%m-%d %H:%M')}
+ID: {msg_id}""" + (f"\nAttachments:{listing}" if listing else "") + f"""
+
+---
+{body}"""
+
+def post_endpoint(kind, url, **kwargs):
+    """
+    POST through the endpoint's circuit breaker. Returns the response, or
+    None if the breaker is open or the request failed.
+    """
+    import requests  # Lazy: keeps one-shot CLI runs fast
+
+    breaker = breakers.get(endpoint_label(kind, url))
+    if not breaker.allow():
+        logger.error(f"{breaker.name} circuit open, failing fast")
+        return None
+    try:
+        response = requests.post(url, **kwargs)
+    except Exception as e:
+        breaker.record(False)
+        logger.error(f"{kind} error: {e}")
+        return None
+    # 5xx and 429 mean the endpoint is unhealthy; other errors are about this request
+    breaker.record(response.status_code < 500 and response.status_code != 429)
+    if response.status_code >= 400:
+        logger.error(f"{kind} error: HTTP {response.status_code}")
+        return None
+    return response
+
+def send_webhook(url, sender, content, attachments=None):
+    """Post to a Discord webhook, uploading attachments under the size limit"""
+    uploads = discord_uploads(attachments)
+    handles = []
+    try:
+        if uploads:
+            # Multipart upload; request size is bounded by max_upload
+            handles = [open(spool.path(a['sha256']), 'rb') for a in uploads]
+            files = {f'files[{i}]': (a['filename'], fh, a['content_type'])
+                     for i, (a, fh) in enumerate(zip(uploads, handles))}
+            response = post_endpoint('webhook', url, data={'payload_json': json.dumps({'content': content})},
+                                     files=files, timeout=30)
+        else:
+            response = post_endpoint('webhook', url, json={'content': content}, timeout=10)
+    except OSError as e:
+        logger.error(f"Webhook error: {e}")
+        return False
+    finally:
+        for fh in handles:
+            fh.close()
+    if response is None:
+        return False
+    logger.info(f"Discord: {sender}" + (f" (+{len(uploads)} files)" if uploads else ""))
+    return True
+
+def send_openclaw(url, sender, content, msg_id):
+    """Post to the OpenClaw message API"""
+    response = post_endpoint('openclaw', url, json={
+        'channel': 'discord',
+        'message': content,
+        'metadata': {'reply_to': sender, 'message_id': msg_id, 'type': 'email'}
+    }, timeout=10)
+    if response is None:
+        return False
+    logger.info(f"OpenClaw: {sender}")
+    return True
+
+def send_discord(sender, subject, body, msg_id, attachments=None):
+    """Forward email to Discord (webhook, falling back to OpenClaw)"""
+    content = format_discord_message(sender, subject, body, msg_id, attachments)
+
+    # Discord webhook
+    if DISCORD['use_webhook'] and DISCORD['webhook_url']:
+        if send_webhook(DISCORD['webhook_url'], sender, content, attachments):
+            return True
+    
+    # OpenClaw fallback
+    return send_openclaw(DISCORD['openclaw_url'], sender, content, msg_id)
+
+# ---- Routing destinations: send(destination_config, email_data) -> bool ----
+
+def deliver_discord(dest, email_data):
+    return send_discord(email_data['sender'], email_data['subject'], email_data['body'],
+                        email_data['id'], email_data.get('attachments'))
+
+def deliver_webhook(dest, email_data):
+    content = format_discord_message(email_data['sender'], email_data['subject'], email_data['body'],
+                                     email_data['id'], email_data.get('attachments'))
+    return send_webhook(dest['url'], email_data['sender'], content, email_data.get('attachments'))
+
+def deliver_openclaw(dest, email_data):
+    content = format_discord_message(email_data['sender'], email_data['subject'], email_data['body'],
+                                     email_data['id'], email_data.get('attachments'))
+    return send_openclaw(dest.get('url', DISCORD['openclaw_url']), email_data['sender'], content, email_data['id'])
+
+# Compiled once; a bad routes file fails at startup rather than per email
+router = Router.from_file(ROUTES_FILE, {
+    'discord': deliver_discord,
+    'webhook': deliver_webhook,
+    'openclaw': deliver_openclaw
+}, logger, on_result=on_delivery, tracer=tracer, retries=PendingRetries(RETRIES_FILE, writer, logger))
+atexit.register(router.wait_idle, 10)
+
+# ========== EMAIL PROCESSING ==========
+
+def send_auto_replies(emails):
+    """
+    Auto-reply to new emails with proper threading: at most one reply per
+    sender per AUTO_REPLY['ttl'], all sent over one SMTP connection.
+    Replies that cannot go now (rate limit, SMTP circuit) are queued.
+    """
+    own_address = EMAIL['username'].lower()
+    replies, seen = [], set()
+    for email_data in emails:
+        sender = email_data['sender'].lower()
+        if sender == own_address or sender in seen or not reply_suppressor.should_reply(sender):
+            now = time.time_ns()
+            tracer.record(email_data.get('trace_id'), 'auto_reply', now, now, {'outcome': 'suppressed'})
+            continue
+        seen.add(sender)
+        replies.append(email_data)
+    if len(replies) < len(emails):
+        logger.info(f"Auto-reply: {len(emails) - len(replies)} suppressed (repeat sender or own address)")
+    if not replies:
+        return
+    
+    auto_body = AUTO_REPLY['template']
+    sent, deferred = [], []
+    with SMTPSession() as session:
+        for email_data in replies:
+            with tracer.span(email_data.get('trace_id'), 'auto_reply') as span:
+                blocked, wait = smtp_gate([email_data['sender']])
+                if blocked:
+                    # Throttled or SMTP down: hand it to the scheduled queue instead of waiting here
+                    deferred.append(deferred_reply_entry(email_data, auto_body, wait))
+                    span.set('outcome', f'deferred_{blocked}')
+                elif session.send(email_data['sender'], email_data['subject'], auto_body,
+                                  in_reply_to=email_data['id'], references=email_data['id'],
+                                  headers=AUTO_REPLY_HEADERS):
+                    sent.append(email_data['sender'])
+                    span.set('outcome', 'sent')
+                else:
+                    span.set('outcome', 'failed')
+                    span.fail('SMTP send failed')
+    
+    if deferred:
+        schedule_emails(deferred)
+        logger.info(f"Deferred {len(deferred)} auto-replies to the scheduled queue")
+    reply_suppressor.record(sent + [entry['to'] for entry in deferred])
+
+def apply_retention(mail, listing):
+    """DELE messages due under RETENTION (takes effect at QUIT); returns their UIDs"""
+    if RETENTION['mode'] == 'keep':
+        return set()
+    due = retention_due()
+    if not due:
+        return set()
+    if listing and listing[0][1] is None:
+        logger.warning("Retention needs UIDL, which this server lacks; nothing deleted")
+        return set()
+    deleted = set()
+    for msg_num, uid in listing:
+        if uid in due:
+            mail.dele(msg_num)
+            deleted.add(uid)
+    return deleted
+
+def check_inbox():
+    """
+    Main email check function - reads emails and saves to JSON.
+    Returns the number of new server messages, or None when STAT showed
+    the mailbox unchanged and UIDL was skipped.
+    
+    Under a RETENTION mode other than keep, due messages are DELEted in
+    the same session, after the inbox and processed set are committed.
+    A failed check (server down, login refused) is logged and re-raised.
+    """
+    global mailbox_fingerprint
+    
+    if shutdown_requested:
+        logger.info("Shutdown requested, skipping inbox check")
+        return 0
+    
+    logger.info("Checking inbox...")
+    
+    new_emails = []
+    new_keys = set()  # dedupe keys of new_emails
+    auto_generated = set()
+    rejected = []
+    duplicates = []  # UIDs of server copies of mail already stored
+    unfinished = set()  # processed keys of messages left for the next check
+    new_count = 0
+    
+    try:
+        mail = poplib.POP3_SSL(EMAIL['host'], EMAIL['pop_port'])
+        mail.user(EMAIL['username'])
+        mail.pass_(EMAIL['password'])
+        
+        # Cheap fast path: STAT is one line, UIDL is one line per message
+        fingerprint = mail.stat()
+        if fingerprint == mailbox_fingerprint and not retention_due():
+            mail.quit()
+            logger.info(f"Mailbox unchanged ({fingerprint[0]} msgs, {fingerprint[1]} octets), skipping UIDL")
+            return None
+        
+        processed_ids = load_processed()
+        
+        listing = list_mailbox(mail, processed_ids)
+        
+        if not listing:
+            mail.quit()
+            retention_ledger.forget(retention_ledger.uids())
+            if processed_ids:
+                rewrite_processed(())  # Everything it named is gone from the server
+            mailbox_fingerprint = fingerprint
+            logger.info("No emails found")
+            return 0
+        
+        for index, (msg_num, uid) in enumerate(listing):
+            if processed_key(msg_num, uid) in processed_ids:
+                continue
+            
+            new_count += 1
+            trace_id = tracer.new_trace()
+            retr = RetrLines(mail, msg_num)
+            try:
+                # Stream the message: headers first, body only if we keep it
+                with tracer.span(trace_id, 'fetch', **{'pop3.msg_num': msg_num}) as span:
+                    reader = MessageReader(retr)
+                    msg = reader.headers()
+                    
+                    sender = email.utils.parseaddr(msg['From'])[1]
+                    subject = msg['Subject']
+                    if subject is not None:
+                        subject = str(subject)  # compat32 gives a Header for raw 8-bit values
+                    msg_id = msg.get('Message-ID', f'<{uid or msg_num}@ravenclaw>')
+                    span.set('email.message_id', msg_id)
+                timestamp = int(time.time())
+                
+                # Check domain filter
+                with tracer.span(trace_id, 'filter', **{'email.sender': sender}) as span:
+                    allowed = is_allowed(sender)
+                    span.set('allowed', bool(allowed))
+                if not allowed:
+                    logger.info(f"Rejected: {sender} (domain not allowed)")
+                    counters.incr('rejected')
+                    reader.drain()
+                    if uid:
+                        rejected.append(uid)
+                    continue
+                
+                # Same mail seen before (other mailbox, renumbered, restarted): skip before parsing
+                with tracer.span(trace_id, 'dedupe') as span:
+                    key = message_key(msg, lambda: reader.body_prefix(DEDUPE['prefix_bytes']))
+                    duplicate = key in new_keys or key in dedupe_index
+                    span.set('duplicate', duplicate)
+                if duplicate:
+                    logger.info(f"Duplicate: {sender} - {subject} ({msg_id}), skipped")
+                    counters.incr('duplicates')
+                    reader.drain()
+                    if uid:
+                        duplicates.append(uid)
+                    continue
+                
+                with tracer.span(trace_id, 'parse') as span:
+                    body, attachments = reader.read_body(spool)
+                    span.set('attachments', len(attachments))
+                if is_auto_generated(msg):
+                    auto_generated.add(msg_id)  # Never auto-reply to automatic mail (loops)
+                
+                # Save to inbox JSON
+                email_data = {
+                    'id': msg_id,
+                    'msg_num': msg_num,
+                    'sender': sender,
+                    'subject': subject,
+                    'body': body,
+                    'attachments': attachments,
+                    'timestamp': timestamp,
+                    'read': False,
+                    'replied': False,
+                    'trace_id': trace_id,
+                    'uid': uid
+                }
+                email_data['routes'] = router.route(email_data, msg)
+                
+                new_emails.append(EmailRecord.from_dict(email_data))
+                new_keys.add(key)
+                
+                logger.info(f"Received: {sender} - {subject}")
+                
+            except Exception as e:
+                logger.error(f"Error processing msg {msg_num}: {e}")
+                # Unread lines of this reply would be taken as the next command's reply
+                try:
+                    retr.finish()
+                except Exception as drain_error:
+                    logger.error(f"Could not read the rest of msg {msg_num}: {drain_error}")
+                if not retr.complete:
+                    unfinished = {processed_key(num, uid) for num, uid in listing[index:]}
+                    logger.error(f"POP3 session out of step, leaving {len(unfinished)} messages for the next check")
+                    break
+        
+        # Commit through the inbox actor (one write, with trim)
+        if new_emails:
+            start = time.time_ns()
+            inbox_store.add(new_emails)
+            dedupe_index.add(new_keys)  # Committed before anything is forwarded or replied to
+            end = time.time_ns()
+            counters.incr('received', len(new_emails))
+            for email_data in new_emails:
+                tracer.record(email_data.trace_id, 'persist', start, end,
+                              {'batch': len(new_emails), 'routes': ','.join(email_data.routes)})
+                if email_data.uid and RETENTION['mode'] != 'keep':
+                    retention_ledger.track(email_data.uid, email_data.routes)
+            
+            # Fan out to every routed destination (per-destination workers)
+            for email_data in new_emails:
+                router.dispatch(email_data)
+            
+            if AUTO_REPLY['enabled']:
+                for email_data in new_emails:
+                    if email_data['id'] in auto_generated:
+                        tracer.record(email_data.trace_id, 'auto_reply', time.time_ns(), time.time_ns(),
+                                      {'outcome': 'skipped_auto_generated'})
+                send_auto_replies([e for e in new_emails if e['id'] not in auto_generated])
+        
+        if rejected and RETENTION['mode'] != 'keep' and RETENTION['delete_rejected']:
+            for uid in rejected:
+                retention_ledger.track(uid, ())
+        if RETENTION['mode'] != 'keep':
+            # The first copy is stored (and tracked) already; this one has nothing to deliver
+            for uid in duplicates:
+                retention_ledger.track(uid, ())
+        
+        # Mark all as processed in one durable append, before any DELE can take effect
+        save_processed(*[key for key in (processed_key(num, uid) for num, uid in listing)
+                         if key not in processed_ids and key not in unfinished])
+        
+        if unfinished:
+            # No DELE or QUIT over a connection whose replies no longer line up
+            mail.close()
+            mailbox_fingerprint = None
+            return new_count
+        
+        deleted = apply_retention(mail, listing)
+        
+        mail.quit()  # The server only removes DELEted messages here
+        
+        on_server = {processed_key(num, uid) for num, uid in listing}
+        if deleted:
+            retention_ledger.forget(deleted)
+            logger.info(f"Retention: deleted {len(deleted)} messages from the server")
+        # Drop entries for mail no longer on the server: ours at once, other clients' deletions
+        # once they outnumber the live entries (keeps the append-only file from growing forever)
+        if deleted or len(processed_ids - on_server) > len(on_server):
+            rewrite_processed(on_server - {f'uid:{uid}' for uid in deleted})
+        # Messages removed from the server by someone else
+        retention_ledger.forget(retention_ledger.uids() - {uid for _, uid in listing})
+        
+        mailbox_fingerprint = None if deleted else fingerprint
+        logger.info(f"Check complete. New: {len(new_emails)}, Total in inbox: {len(inbox_store.snapshot())}")
+        
+    except Exception as e:
+        logger.error(f"Inbox check failed: {e}")
+        raise  # So the poller can tell an outage from an empty mailbox
+    
+    return new_count
+
+# ========== SHARED OPERATIONS ==========
+
+def validate_scheduled(data):
+    """Validate a schedule request. Returns (error, status_code) or (None, None)"""
+    required = ['to', 'subject', 'body', 'target_time']
+    for r in required:
+        if r not in data:
+            return f'Missing: {r}', 400
+    
+    # Validate target_time format
+    try:
+        target = datetime.fromisoformat(data['target_time'])
+        if target.timestamp() <= datetime.now().timestamp():
+            return 'target_time must be in the future', 400
+    except (TypeError, ValueError):  # TypeError: not a string
+        return 'Invalid target_time format. Use ISO-8601 (e.g., 2026-02-17T09:00:00)', 400
+    
+    # A stored entry with a bad field would fail on every scheduler pass
+    error = mistyped_fields(data)
+    if error:
+        return error, 400
+    if not is_allowed(data['to']):
+        return 'Domain not allowed', 403
+    
+    return None, None
+
+def mistyped_fields(data):
+    """Error for to/subject/body not being strings or cc/bcc not an address or list of them, else None"""
+    for field in ('to', 'subject', 'body'):
+        if not isinstance(data[field], str):
+            return f'Invalid {field}'
+    for field in ('cc', 'bcc'):
+        value = data.get(field)
+        if value is not None and not isinstance(value, str) and not (
+                isinstance(value, list) and all(isinstance(address, str) for address in value)):
+            return f'Invalid {field}: use an address or a list of addresses'
+    return None
+
+def validate_recurring(data):
+    """Validate a recurring schedule request. Returns (error, status_code) or (None, None)"""
+    for r in ['to', 'subject', 'body']:
+        if r not in data:
+            return f'Missing: {r}', 400
+    error = mistyped_fields(data)
+    if error:
+        return error, 400
+    for field in ('cron', 'every', 'timezone', 'start', 'until'):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f'Invalid {field}', 400
+    count = data.get('count')
+    if count is not None and (not isinstance(count, int) or isinstance(count, bool)):
+        return 'Invalid count: use a whole number', 400
+    if not is_allowed(data['to']):
+        return 'Domain not allowed', 403
+    return None, None
+
+def new_recurring(data):
+    """Store a validated recurring schedule; raises ValueError for a bad cron/every/timezone/end"""
+    fields = ('to', 'cc', 'bcc', 'subject', 'body', 'cron', 'every', 'timezone', 'start', 'until', 'count')
+    return recurring.add({k: data[k] for k in fields if data.get(k) is not None})
+
+def new_scheduled_id():
+    """Collision-free scheduled email id (timestamp kept for readability)"""
+    return f"sched_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:12]}"
+
+def new_scheduled_entry(data):
+    """Build a pending queue entry from a validated schedule request"""
+    return ScheduledEntry.from_dict({
+        'id': new_scheduled_id(),
+        'to': data['to'],
+        'cc': data.get('cc'),  # Optional CC recipients
+        'bcc': data.get('bcc'),  # Optional BCC recipients
+        'subject': data['subject'],
+        'body': data['body'],
+        'target_time': data['target_time'],
+        'created_at': datetime.now().isoformat(),
+        'status': 'pending',
+        'attempts': 0,
+        'last_attempt': None,
+        'error': None,
+        'priority': data.get('priority', 'normal')
+    })
+
+def deferred_reply_entry(email_data, body, delay):
+    """Queue entry for a threaded reply that could not go now; sent after delay seconds"""
+    entry = new_scheduled_entry({
+        'to': email_data['sender'],
+        'subject': email_data['subject'] or '',
+        'body': body,
+        'target_time': datetime.fromtimestamp(time.time() + delay).isoformat()
+    })
+    entry.in_reply_to = email_data['id']
+    entry.references = email_data['id']
+    entry.headers = AUTO_REPLY_HEADERS
+    return entry
+
+def schedule_emails(entries):
+    """Append entries to the queue in one write"""
+    def apply(queue):
+        queue.setdefault('emails', []).extend(entries)
+        return None, bool(entries)
+    update_scheduled_queue(apply)
+
+def cancel_scheduled_emails(email_ids):
+    """Cancel pending entries in one write. Returns the ids that were cancelled"""
+    wanted = set(email_ids)
+    def apply(queue):
+        cancelled = []
+        for email_entry in queue.get('emails', []):
+            if email_entry.id in wanted and email_entry.status == 'pending':
+                email_entry.status = 'cancelled'
+                cancelled.append(email_entry.id)
+        return cancelled, bool(cancelled)
+    return update_scheduled_queue(apply)
+
+def stats_version():
+    """Changes whenever compute_stats() could return something different"""
+    return (inbox_store.version(), scheduled_version(), counters.version, recurring.version)
+
+def compute_stats():
+    """
+    Inbox, scheduled queue and lifetime counts (served by /stats and
+    `ravenclaw_cli.py stats`). Reads maintained counters; nothing is scanned.
+    """
+    inbox = inbox_store.counts()
+    scheduled = scheduled_counts()
+    lifetime = counters.snapshot()
+    
+    return {
+        'total': inbox['total'],
+        'unread': inbox['unread'],
+        'by_domain': inbox['by_domain'],
+        'domains': ALLOWED_DOMAINS,
+        'scheduled_pending': scheduled.get('pending', 0),
+        'scheduled_total': sum(scheduled.values()),
+        'scheduled': scheduled,
+        'recurring': len(recurring),
+        'received': lifetime.get('received', 0),
+        'rejected': lifetime.get('rejected', 0),
+        'duplicates': lifetime.get('duplicates', 0),
+        'forwarded': lifetime.get('forwarded', 0),
+        'forward_failed': lifetime.get('forward_failed', 0)
+    }
+
+def migrate_state():
+    """Upgrade state files written by older versions in place. Returns a summary dict"""
+    summary = {'inbox': 0, 'scheduled': 0, 'processed_dupes': 0}
+    
+    # Inbox: ensure every record carries the fields the routes rely on
+    if os.path.exists(INBOX_FILE):
+        inbox = load_inbox()
+        if isinstance(inbox, list):
+            inbox = {'emails': inbox}
+        for email_data in inbox.setdefault('emails', []):
+            before = len(email_data)
+            email_data.setdefault('msg_num', '')
+            email_data.setdefault('read', False)
+            email_data.setdefault('replied', False)
+            if len(email_data) != before:
+                summary['inbox'] += 1
+        save_inbox(inbox)
+    
+    # Scheduled queue: fill in fields that hand-written entries may lack
+    if os.path.exists(SCHEDULED['queue_file']):
+        # Raw dicts: ScheduledEntry would fill the defaults before we could count them
+        queue = read_json(SCHEDULED['queue_file'], lambda: {'emails': []}, logger)
+        queue['version'] = '1.1'
+        for email_entry in queue.setdefault('emails', []):
+            before = len(email_entry)
+            email_entry.setdefault('id', new_scheduled_id())
+            email_entry.setdefault('created_at', datetime.now().isoformat())
+            email_entry.setdefault('status', 'pending')
+            email_entry.setdefault('attempts', 0)
+            email_entry.setdefault('last_attempt', None)
+            email_entry.setdefault('error', None)
+            email_entry.setdefault('priority', 'normal')
+            if len(email_entry) != before:
+                summary['scheduled'] += 1
+        save_scheduled_queue(queue)
+    
+    # Processed IDs: the append-only file accumulates duplicates
+    if os.path.exists(PROCESSED_FILE):
+        with open(PROCESSED_FILE, 'r') as f:
+            lines = [line.strip() for line in f if line.strip()]
+        unique = list(dict.fromkeys(lines))
+        summary['processed_dupes'] = len(lines) - len(unique)
+        if summary['processed_dupes']:
+            atomic_write_text(PROCESSED_FILE, ''.join(msg_id + '\n' for msg_id in unique))
+    
+    logger.info(f"Migration complete: {summary}")
+    return summary
+
+# ========== LOOPS ==========
+
+def request_shutdown():
+    """Ask the background loops to stop after their current cycle"""
+    global shutdown_requested
+    shutdown_requested = True
+
+# Concurrent /check requests and the poll loop share one in-flight run
+inbox_check = SingleFlight(check_inbox, 'inbox-check')
+scheduled_check = SingleFlight(check_and_send_scheduled, 'scheduled-check')
+
+poller = AdaptivePoller(inbox_check.run, BRIDGE['poll_min'], BRIDGE['poll_interval'] * 60, BRIDGE['poll_backoff'])
+
+def run_scheduler():
+    """Background scheduler with adaptive interval and shutdown support"""
+    while not shutdown_requested:
+        try:
+            interval = poller.poll_once()
+        except Exception:
+            interval = poller.interval  # Already logged; keeps its pace through an outage
+        try:
+            scheduled_check.run()
+        except Exception as e:
+            logger.error(f"Scheduler error: {e}")
+        
+        logger.info(f"Next check in {interval:.0f}s (skip rate {poller.snapshot()['skip_rate']:.0%})")
+        deadline = time.time() + interval
+        while not shutdown_requested and time.time() < deadline:
+            time.sleep(1)
+
+def run_scheduled_checker():
+    """Background checker for scheduled emails (more frequent)"""
+    while not shutdown_requested:
+        retry_after = None
+        try:
+            retry_after = scheduled_check.run()
+        except Exception as e:
+            logger.error(f"Scheduled checker error: {e}")
+        
+        # Come back early when the rate limiter said when throttled mail may go
+        interval = SCHEDULED['check_interval']
+        if retry_after is not None:
+            interval = max(1, min(interval, retry_after))
+        deadline = time.time() + interval
+        while not shutdown_requested and time.time() < deadline:
+            time.sleep(1)
@@ -0,0 +1,38 @@
+# ravenclaw_counters.py
+"""
+Ravenclaw Counters - Lifetime event counters
+============================================
+Counts of things that leave no trace in the inbox (received, rejected,
+forwarded, ...). Increments are in memory; the file is rewritten by the
+group-commit writer, so a burst of increments costs one write.
+"""
+
+import json
+import threading
+
+from ravenclaw_persist import read_json
+
+
+class Counters:
+    def __init__(self, path, writer, logger=None):
+        self.path = path
+        self._writer = writer
+        self._lock = threading.Lock()
+        self._values = dict(read_json(path, dict, logger))
+        self.version = 0  # Bumped on every change
+
+    def incr(self, name, n=1):
+        if not n:
+            return
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + n
+            self.version += 1
+        self._writer.replace(self.path, self._render, wait=False)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def _render(self):
+        with self._lock:
+            return json.dumps(self._values, indent=2, sort_keys=True)
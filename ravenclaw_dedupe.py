@@ -0,0 +1,137 @@
+# ravenclaw_dedupe.py
+"""
+Ravenclaw Dedupe - Seen-message index across restarts and mailboxes
+===================================================================
+The same mail delivered to two mailboxes, or re-numbered by the server,
+must not be stored and forwarded twice. Each message gets a key as soon
+as its headers are read:
+
+  - its Message-ID, normalized (angle brackets and whitespace dropped,
+    domain part lowercased), or
+  - without one, a hash of From, Date, Subject and the first raw body
+    bytes.
+
+Keys are 64-bit blake2b digests held as ints in a bounded set that
+forgets the oldest first. The set is backed by an append-only file of hex
+keys, compacted when it reaches twice the capacity. A probe that misses
+in memory first reads any lines other processes appended to the same
+file (DEDUPE_FILE can be shared between bridges running different
+accounts), so the check stays a set lookup plus one stat(). Compaction
+reads those lines too before rewriting the file; only a key appended
+during the rename itself can be missed, which costs at most one
+duplicate.
+"""
+
+import email.utils
+import hashlib
+import os
+import threading
+
+from ravenclaw_records import SyncState
+
+
+def _header(value):
+    """Header value as str: compat32 gives a Header object for raw 8-bit or undecodable values"""
+    return '' if value is None else str(value)
+
+
+def normalize_message_id(value):
+    """'<Local@Example.COM> ' -> 'Local@example.com'; None if there is no usable id"""
+    value = _header(value).strip()
+    if '<' in value and '>' in value:
+        value = value[value.index('<') + 1:value.index('>', value.index('<'))]
+    value = ''.join(value.split())
+    if not value:
+        return None
+    local, at, domain = value.rpartition('@')
+    return f'{local}@{domain.lower()}' if at else value
+
+
+def _digest(*parts):
+    h = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else (part or '').encode('utf-8', 'replace'))
+        h.update(b'\0')
+    return int.from_bytes(h.digest(), 'big')
+
+
+def message_key(msg, body_prefix):
+    """
+    Dedupe key for a message from its parsed headers. body_prefix() -> bytes
+    is only called when there is no Message-ID.
+    """
+    msg_id = normalize_message_id(msg.get('Message-ID'))
+    if msg_id:
+        return _digest('mid', msg_id)
+    sender = email.utils.parseaddr(_header(msg.get('From')))[1].lower()
+    return _digest('hash', sender, _header(msg.get('Date')).strip(), _header(msg.get('Subject')).strip(),
+                   body_prefix())
+
+
+class DedupeIndex:
+    def __init__(self, path, capacity, writer, logger=None):
+        self.path = path
+        self.capacity = capacity
+        self._writer = writer
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._keys = SyncState((), capacity)
+        self._offset = 0  # Bytes of the file already read
+        self._file_lines = 0  # Lines in the file as of the last read, ours included
+        self._inode = None
+        with self._lock:
+            self._refresh()
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._keys:
+                return True
+            self._refresh()
+            return key in self._keys
+
+    def add(self, keys, wait=True):
+        """Remember keys of messages just stored; persisted in one append"""
+        keys = list(keys)
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self._keys.add(key)
+            compact = self._file_lines + len(keys) >= 2 * self.capacity
+        if compact:
+            # Rewrites the file; other processes see it shrink and reload
+            self._writer.replace(self.path, self._render, wait)
+        else:
+            self._writer.append(self.path, ''.join(f'{key:016x}\n' for key in keys), wait)
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._keys.order), 'capacity': self.capacity, 'file_lines': self._file_lines}
+
+    def _render(self):
+        with self._lock:
+            self._refresh()  # Keep what other bridges appended since we last looked
+            return ''.join(f'{key:016x}\n' for key in self._keys.order)
+
+    def _refresh(self):
+        """Read lines appended since the last look; reload if the file was replaced"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            self._inode, self._offset, self._file_lines = st.st_ino, 0, 0
+        if st.st_size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        complete = data[:data.rfind(b'\n') + 1]  # A line still being written is read next time
+        self._offset += len(complete)
+        for line in complete.split():
+            try:
+                self._keys.add(int(line, 16))
+                self._file_lines += 1
+            except ValueError:
+                if self._logger:
+                    self._logger.warning(f"Dedupe index: skipped bad line in {self.path}")
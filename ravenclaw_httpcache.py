@@ -0,0 +1,104 @@
+# ravenclaw_httpcache.py
+"""
+Ravenclaw HTTP Cache - Versioned JSON views with ETags and compression
+======================================================================
+Read-heavy routes (/inbox, /unread, /schedule/list, /stats) are labelled
+with the version of the store they render. The ETag is derived from that
+version, so an If-None-Match poll is answered with 304 without building or
+serializing anything.
+
+The last body of each view is kept with its gzip/deflate variants
+(compressed once, on first request), so repeated full polls of an
+unchanged view do not re-serialize or re-compress either. Bodies under
+min_size are sent uncompressed.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import zlib
+
+ENCODINGS = ('gzip', 'deflate')  # Preference order when q-values tie
+
+
+def negotiate(accept_encoding):
+    """Best of gzip/deflate allowed by an Accept-Encoding header, or None"""
+    best, best_q = None, 0.0
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        candidates = ENCODINGS if name == '*' else (name,) if name in ENCODINGS else ()
+        for candidate in candidates:
+            better = q > best_q or (q == best_q and best and ENCODINGS.index(candidate) < ENCODINGS.index(best))
+            if q > 0 and better:
+                best, best_q = candidate, q
+    return best
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check (weak comparison, as RFC 9110 requires for GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith('W/') else tag) == etag:
+            return True
+    return False
+
+
+class _View:
+    __slots__ = ('version', 'body', 'variants')
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.variants = {}  # encoding -> compressed body
+
+
+class ViewCache:
+    def __init__(self, min_size=1024, level=6):
+        self.min_size = min_size
+        self.level = level
+        # Versions restart with the process; the boot id keeps old ETags from matching
+        self._boot = os.urandom(4).hex()
+        self._lock = threading.Lock()
+        self._views = {}  # name -> _View (latest only)
+
+    def etag(self, name, version, encoding=None):
+        """Strong ETag for one representation of a view at a version"""
+        digest = hashlib.blake2b(repr((name, version)).encode(), digest_size=8).hexdigest()
+        return f'"{self._boot}-{digest}{"-" + encoding if encoding else ""}"'
+
+    def body(self, name, version, build, encoding=None):
+        """
+        (body bytes, content encoding or None) for a view at version; build()
+        -> JSON-able data is only called when the version changed.
+        """
+        view = self._views.get(name)
+        if view is None or view.version != version:
+            data = json.dumps(build(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            view = _View(version, data)
+            with self._lock:
+                self._views[name] = view
+        if encoding is None or len(view.body) < self.min_size:
+            return view.body, None
+        compressed = view.variants.get(encoding)
+        if compressed is None:
+            if encoding == 'gzip':
+                compressed = gzip.compress(view.body, self.level, mtime=0)
+            else:
+                compressed = zlib.compress(view.body, self.level)
+            view.variants[encoding] = compressed
+        return compressed, encoding
@@ -0,0 +1,177 @@
+# ravenclaw_logging.py
+"""
+Ravenclaw Logging - Queue-based logging shared by every component
+=================================================================
+Callers only put records on an in-memory queue (QueueHandler); one
+listener thread per process does the formatting, file rotation and
+console writes. A slow terminal or a rotation never stalls the fetch
+loop, delivery workers or SMTP sends. If the queue is full the record is
+dropped and counted rather than blocking.
+
+Files get one JSON object per line; the console keeps the readable
+"time [COMPONENT] message" format. Repeated identical warnings/errors are
+rate limited per message.
+
+Environment (shared by all components):
+  LOG_MAX_BYTES   rotate at this size (default 1048576)
+  LOG_BACKUPS     rotated files kept (default 5)
+  LOG_FORMAT      file format: json (default) or text
+  LOG_QUEUE_SIZE  records buffered before dropping (default 10000)
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+REPEAT_WINDOW = 60  # seconds
+REPEAT_BURST = 5  # identical warnings/errors let through per window
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, component):
+        super().__init__()
+        self.component = component
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'component': self.component,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage()
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed_repeats'] = record.suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RepeatFilter(logging.Filter):
+    """Let through REPEAT_BURST copies of an identical warning/error per window"""
+
+    def __init__(self, window=REPEAT_WINDOW, burst=REPEAT_BURST):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._seen = {}  # (level, message) -> [window_start, count]
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            slot = self._seen.get(key)
+            if slot is None or now - slot[0] >= self.window:
+                if len(self._seen) > 1000:
+                    self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window}
+                suppressed = max(0, slot[1] - self.burst) if slot else 0
+                self._seen[key] = [now, 1]
+                if suppressed:
+                    record.suppressed = suppressed
+                    record.msg = f"{record.getMessage()} (+{suppressed} identical suppressed)"
+                    record.args = None
+                return True
+            slot[1] += 1
+            return slot[1] <= self.burst
+
+
+class _DroppingQueueHandler(QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listeners = []
+
+
+def setup_logging(name, component, log_file, level=logging.INFO, console=True):
+    """
+    Attach the queue pipeline to logger `name` and return it. Output goes
+    to log_file (rotated) and, if console, stdout.
+    """
+    max_bytes = int(os.environ.get('LOG_MAX_BYTES', 1024 * 1024))
+    backups = int(os.environ.get('LOG_BACKUPS', 5))
+    text = logging.Formatter(f'%(asctime)s [{component}] %(message)s')
+
+    file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter(component) if os.environ.get('LOG_FORMAT', 'json') == 'json' else text)
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(text)
+        handlers.append(console_handler)
+
+    log_queue = queue.Queue(int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RepeatFilter())
+
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+    return logger
+
+
+def setup_sink(name, path, max_bytes=None, backups=None):
+    """
+    Queued, rotated file of raw lines (e.g. trace spans): each message is
+    written as-is, one per line. Shares the drop-when-full behaviour.
+    """
+    max_bytes = max_bytes or int(os.environ.get('LOG_MAX_BYTES', 1024 * 1024))
+    backups = backups if backups is not None else int(os.environ.get('LOG_BACKUPS', 5))
+    file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter('%(message)s'))
+
+    log_queue = queue.Queue(int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    _listeners.append(listener)
+
+    sink = logging.getLogger(name)
+    sink.setLevel(logging.INFO)
+    sink.addHandler(_DroppingQueueHandler(log_queue))
+    sink.propagate = False
+    return sink
+
+
+def attach(logger_name, parent):
+    """Send another library's logger (e.g. werkzeug) through parent's pipeline"""
+    other = logging.getLogger(logger_name)
+    for handler in parent.handlers:
+        other.addHandler(handler)
+    other.propagate = False
+
+
+def dropped(logger):
+    """Records dropped because the queue was full"""
+    return sum(getattr(h, 'dropped', 0) for h in logger.handlers)
+
+
+@atexit.register
+def _stop_listeners():
+    # Drains whatever is still queued
+    for listener in _listeners:
+        listener.stop()
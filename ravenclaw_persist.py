@@ -0,0 +1,183 @@
+# ravenclaw_persist.py
+"""
+Ravenclaw Persist - Crash-safe state files
+=========================================
+Every state file is written to a temp file in the same directory,
+fsynced and renamed over the original, so a crash leaves either the old
+or the new version on disk, never a half-written one.
+
+GroupCommitWriter coalesces bursts: mutations that arrive within the
+commit window are written together by one background thread, and for
+whole-file replacements only the latest version of each file is written.
+"""
+
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+
+def _fsync_dir(path):
+    if os.name == 'nt':
+        return  # Directories cannot be opened for fsync on Windows
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _current_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# os.umask() can only be read by setting it, which races with files other
+# threads create; so it is read once, at import
+_NEW_FILE_MODE = 0o666 & ~_current_umask()
+
+
+def atomic_write_text(path, text):
+    """Replace path with text via temp file + fsync + rename"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        # mkstemp creates 0600; keep the permissions a plain open() would give
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = _NEW_FILE_MODE
+        os.chmod(tmp, mode)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(path)
+
+
+def append_durable(path, text):
+    """Append text in one write and fsync it"""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_json(path, default, logger=None):
+    """
+    Load JSON from path. Missing files return default(). A corrupt file is
+    moved aside (never silently overwritten) and default() is returned.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default()
+    except OSError as e:
+        if logger:
+            logger.error(f"Cannot read {path}: {e}")
+        return default()
+    except (ValueError, UnicodeDecodeError) as e:
+        aside = f"{path}.corrupt-{int(time.time())}"
+        try:
+            os.replace(path, aside)
+        except OSError:
+            aside = None
+        if logger:
+            logger.error(f"Corrupt state file {path}: {e}" + (f" (moved to {aside})" if aside else ""))
+        return default()
+
+
+class GroupCommitWriter:
+    def __init__(self, window=0.05, logger=None):
+        self.window = window
+        self._logger = logger
+        self._cond = threading.Condition()
+        self._pending = {}  # path -> [mode, payload, futures]
+        self._writing = []  # futures of the batch being written
+        self._thread = None
+        self.commits = 0
+        self.files_written = 0
+
+    def replace(self, path, render, wait=True):
+        """Queue a whole-file replacement; render() -> str runs at commit time, latest wins"""
+        return self._enqueue(path, 'replace', render, wait)
+
+    def replace_json(self, path, data, wait=True, **dump_args):
+        """Queue a JSON replacement of path with data"""
+        return self.replace(path, lambda: json.dumps(data, **dump_args), wait)
+
+    def append(self, path, text, wait=True):
+        """Queue text to append to path"""
+        return self._enqueue(path, 'append', text, wait)
+
+    def flush(self):
+        """Block until everything queued so far is on disk"""
+        with self._cond:
+            futures = self._writing + [f for entry in self._pending.values() for f in entry[2]]
+        for future in futures:
+            future.exception()
+
+    def _enqueue(self, path, mode, payload, wait):
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+            entry = self._pending.get(path)
+            if entry is None or entry[0] != mode:
+                if entry is not None:
+                    # Mode switch on the same file: commit what is queued first
+                    self._cond.notify_all()
+                    while path in self._pending:
+                        self._cond.wait()
+                self._pending[path] = [mode, payload if mode == 'replace' else [payload], [future]]
+            elif mode == 'replace':
+                entry[1] = payload
+                entry[2].append(future)
+            else:
+                entry[1].append(payload)
+                entry[2].append(future)
+            self._cond.notify_all()
+        if wait:
+            future.result()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # Let the rest of the burst arrive
+            time.sleep(self.window)
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                self._writing = [f for entry in batch.values() for f in entry[2]]
+                self._cond.notify_all()
+
+            for path, (mode, payload, futures) in batch.items():
+                try:
+                    if mode == 'replace':
+                        atomic_write_text(path, payload())
+                    else:
+                        append_durable(path, ''.join(payload))
+                    self.files_written += 1
+                    for future in futures:
+                        future.set_result(True)
+                except Exception as e:
+                    if self._logger:
+                        self._logger.error(f"Commit of {path} failed: {e}")
+                    for future in futures:
+                        future.set_exception(e)
+            self.commits += 1
@@ -0,0 +1,63 @@
+# ravenclaw_poller.py
+"""
+Ravenclaw Poller - Adaptive inbox polling
+=========================================
+Polls quickly while mail is arriving and backs off exponentially when the
+mailbox is idle, always staying within [min_interval, max_interval].
+
+The check callable returns the number of new messages it saw, or None
+when the mailbox fingerprint (POP3 STAT) was unchanged and LIST was
+skipped entirely. A check that raises (server down, login refused) says
+nothing about the mailbox, so the interval is left as it was.
+"""
+
+import threading
+
+
+class AdaptivePoller:
+    def __init__(self, check, min_interval, max_interval, backoff=2.0):
+        self.check = check
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = backoff
+        self.interval = min_interval
+        self.checks = 0
+        self.skips = 0
+        self.failures = 0
+        self.last_new = 0
+        self._lock = threading.Lock()
+
+    def poll_once(self):
+        """Run one check and adjust the interval. Returns seconds until the next poll"""
+        try:
+            result = self.check()
+        except Exception:
+            with self._lock:
+                self.checks += 1
+                self.failures += 1
+            raise
+        with self._lock:
+            self.checks += 1
+            if result is None:
+                self.skips += 1
+            self.last_new = result or 0
+            if result:
+                # Mail tends to arrive in bursts: stay fast while it does
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+            return self.interval
+
+    def snapshot(self):
+        """Current interval and skip-rate metrics"""
+        with self._lock:
+            return {
+                'interval_seconds': round(self.interval, 1),
+                'min_interval': self.min_interval,
+                'max_interval': self.max_interval,
+                'checks': self.checks,
+                'stat_skips': self.skips,
+                'failures': self.failures,
+                'skip_rate': round(self.skips / self.checks, 3) if self.checks else 0.0,
+                'last_new': self.last_new
+            }
@@ -0,0 +1,137 @@
+# ravenclaw_ratelimit.py
+"""
+Ravenclaw Rate Limit - Token buckets for outbound SMTP
+======================================================
+A global bucket plus one bucket per recipient domain. try_acquire()
+never sleeps: it either takes a token from every bucket a message needs
+or takes none and says how long to wait, so callers can requeue the
+message and move on to mail for other domains.
+
+Limits are written as "N/unit" (unit: s, min, h), e.g. "60/min".
+The burst size is N.
+"""
+
+import threading
+import time
+
+_UNITS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600}
+
+MAX_IDLE_BUCKETS = 10000  # Full buckets beyond this are dropped
+
+
+def parse_rate(spec):
+    """'60/min' -> (tokens_per_second, burst); empty -> None"""
+    if not spec:
+        return None
+    count, _, unit = spec.strip().partition('/')
+    count = float(count)
+    seconds = _UNITS.get(unit.strip().lower() or 's')
+    if seconds is None or count <= 0:
+        raise ValueError(f"Invalid rate: {spec}")
+    return count / seconds, max(1.0, count)
+
+
+def parse_domain_rates(spec):
+    """'gmail.com=20/min,example.com=100/h' -> {domain: (rate, burst)}"""
+    limits = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            domain, rate = item.split('=', 1)
+            limits[domain.strip().lower()] = parse_rate(rate)
+    return limits
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n=1):
+        """Seconds until n tokens are available (0 if they are now)"""
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+
+class SendLimiter:
+    def __init__(self, global_rate=None, domain_rates=None, default_domain_rate=None, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        now = clock()
+        self._global = TokenBucket(*global_rate, now) if global_rate else None
+        self._domain_rates = domain_rates or {}
+        self._default = default_domain_rate
+        self._buckets = {}
+        self.allowed = 0
+        self.throttled = 0
+
+    @property
+    def enabled(self):
+        return bool(self._global or self._domain_rates or self._default)
+
+    def _bucket(self, domain, now):
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            rate = self._domain_rates.get(domain, self._default)
+            if rate is None:
+                return None
+            if len(self._buckets) >= MAX_IDLE_BUCKETS:
+                self._prune(now)
+            bucket = self._buckets[domain] = TokenBucket(*rate, now)
+        return bucket
+
+    def _prune(self, now):
+        for domain, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self._buckets[domain]
+
+    def try_acquire(self, recipients):
+        """
+        Take one token per recipient from the global and domain buckets.
+        Returns (True, 0) or (False, seconds_to_wait); never blocks.
+        """
+        if not self.enabled:
+            return True, 0.0
+        per_domain = {}
+        for address in recipients:
+            domain = address.rsplit('@', 1)[-1].strip().lower() if '@' in address else ''
+            per_domain[domain] = per_domain.get(domain, 0) + 1
+
+        with self._lock:
+            now = self._clock()
+            needs = []
+            if self._global:
+                needs.append((self._global, sum(per_domain.values())))
+            for domain, n in per_domain.items():
+                bucket = self._bucket(domain, now)
+                if bucket:
+                    needs.append((bucket, n))
+
+            wait = 0.0
+            for bucket, n in needs:
+                bucket.refill(now)
+                # A message wider than the burst can never fit; let it drain the bucket instead
+                wait = max(wait, bucket.wait_time(min(n, bucket.burst)))
+            if wait > 0:
+                self.throttled += 1
+                return False, wait
+            for bucket, n in needs:
+                bucket.tokens -= n
+            self.allowed += 1
+            return True, 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'allowed': self.allowed,
+                'throttled': self.throttled,
+                'tracked_domains': len(self._buckets)
+            }
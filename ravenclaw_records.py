@@ -0,0 +1,230 @@
+# ravenclaw_records.py
+"""
+Ravenclaw Records - Compact in-memory record types
+==================================================
+Inbox emails and scheduled entries are held as __slots__ objects rather
+than dicts: no per-record hash table, times kept as epoch seconds instead
+of ISO strings, and repeated strings (sender, domain, status, route names)
+interned so each distinct value is stored once.
+
+The JSON format on disk and over the API is unchanged: records are built
+with from_dict() when a file is loaded and rendered with to_dict() only
+when they are written or served. get()/[] read a record by its JSON key
+so code that treats records as read-only mappings keeps working.
+"""
+
+import sys
+from collections import deque
+from datetime import datetime
+
+_MISSING = object()
+
+
+def to_epoch(value):
+    """ISO-8601 string (or number) -> int epoch seconds; None/'' -> None"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+
+def to_iso(epoch):
+    """int epoch seconds -> local ISO-8601 string; None -> None"""
+    return None if epoch is None else datetime.fromtimestamp(epoch).isoformat()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _domain_of(address):
+    address = (address or '').lower()
+    return sys.intern(address.rsplit('@', 1)[-1]) if '@' in address else ''
+
+
+class _Record:
+    """Shared mapping-style reads and JSON conversion; subclasses list their fields"""
+    __slots__ = ()
+
+    # (json key, attribute, is_time) in output order
+    _FIELDS = ()
+    _KEYS = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        extra = dict(data)
+        for key, attr, is_time in cls._FIELDS:
+            value = extra.pop(key, None)
+            if is_time:
+                try:
+                    value = to_epoch(value)
+                except (TypeError, ValueError):
+                    extra[key], value = value, None  # Unparseable: keep it verbatim
+            setattr(record, attr, value)
+        record.extra = extra or None
+        record._normalize()
+        return record
+
+    def _normalize(self):
+        pass
+
+    def to_dict(self):
+        data = {}
+        for key, attr, is_time in self._FIELDS:
+            value = getattr(self, attr)
+            if is_time:
+                value = to_iso(value)
+            elif isinstance(value, tuple):
+                value = list(value)
+            data[key] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _MISSING
+
+    def _lookup(self, key):
+        field = self._KEYS.get(key)
+        if field is not None:
+            attr, is_time = field
+            value = getattr(self, attr)
+            return to_iso(value) if is_time else value
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        return _MISSING
+
+    def replace(self, **changes):
+        """Copy with some attributes changed (records in snapshots are never mutated)"""
+        record = self.__class__.__new__(self.__class__)
+        for attr in self.__slots__:
+            setattr(record, attr, changes[attr] if attr in changes else getattr(self, attr))
+        return record
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.id!r})"
+
+
+def _fields(*spec):
+    """(_FIELDS, _KEYS) from (json key, attribute, is_time) triples"""
+    return spec, {key: (attr, is_time) for key, attr, is_time in spec}
+
+
+class EmailRecord(_Record):
+    __slots__ = ('id', 'msg_num', 'sender', 'domain', 'subject', 'body', 'attachments',
+                 'received', 'read', 'replied', 'routes', 'trace_id', 'uid', 'extra')
+
+    _FIELDS, _KEYS = _fields(
+        ('id', 'id', False),
+        ('msg_num', 'msg_num', False),
+        ('sender', 'sender', False),
+        ('subject', 'subject', False),
+        ('body', 'body', False),
+        ('attachments', 'attachments', False),
+        ('timestamp', 'received', True),
+        ('read', 'read', False),
+        ('replied', 'replied', False),
+        ('routes', 'routes', False),
+        ('trace_id', 'trace_id', False),
+        ('uid', 'uid', False),  # POP3 UIDL: stable across sessions, unlike msg_num
+    )
+
+    def to_dict(self):
+        data = super().to_dict()
+        for key in ('trace_id', 'uid'):
+            if data.get(key) is None:
+                data.pop(key, None)  # Emails stored before these were recorded
+        return data
+
+    def _normalize(self):
+        self.msg_num = self.msg_num or ''
+        self.sender = _intern(self.sender or '')
+        self.domain = _domain_of(self.sender)
+        self.body = self.body or ''
+        self.attachments = tuple(self.attachments or ())
+        self.read = bool(self.read)
+        self.replied = bool(self.replied)
+        self.routes = tuple(_intern(r) for r in self.routes or ())
+
+
+class ScheduledEntry(_Record):
+    __slots__ = ('id', 'to', 'cc', 'bcc', 'subject', 'body', 'target', 'created', 'status',
+                 'attempts', 'last_attempt', 'error', 'priority', 'sent_at',
+                 'in_reply_to', 'references', 'headers', 'extra')
+
+    _FIELDS, _KEYS = _fields(
+        ('id', 'id', False),
+        ('to', 'to', False),
+        ('cc', 'cc', False),
+        ('bcc', 'bcc', False),
+        ('subject', 'subject', False),
+        ('body', 'body', False),
+        ('target_time', 'target', True),
+        ('created_at', 'created', True),
+        ('status', 'status', False),
+        ('attempts', 'attempts', False),
+        ('last_attempt', 'last_attempt', True),
+        ('error', 'error', False),
+        ('priority', 'priority', False),
+        ('sent_at', 'sent_at', True),
+        ('in_reply_to', 'in_reply_to', False),
+        ('references', 'references', False),
+        ('headers', 'headers', False),
+    )
+
+    def _normalize(self):
+        self.to = _intern(self.to)
+        self.status = _intern(self.status or 'pending')
+        self.priority = _intern(self.priority or 'normal')
+        self.attempts = self.attempts or 0
+
+    def to_dict(self):
+        data = super().to_dict()
+        # Optional fields are left out rather than written as null
+        for key in ('sent_at', 'in_reply_to', 'references', 'headers'):
+            if data.get(key) is None:
+                data.pop(key, None)
+        return data
+
+
+def as_dict(record):
+    """JSON-ready dict for a record; plain dicts pass through"""
+    return record.to_dict() if isinstance(record, _Record) else record
+
+
+class SyncState:
+    """Bounded set (synced msg_nums, dedupe keys) that forgets the oldest first"""
+    __slots__ = ('order', 'seen')
+
+    def __init__(self, msg_nums=(), limit=500):
+        self.order = deque(maxlen=limit)
+        self.seen = set()
+        for msg_num in msg_nums:
+            self.add(msg_num)
+
+    def __contains__(self, msg_num):
+        return msg_num in self.seen
+
+    def add(self, msg_num):
+        if msg_num in self.seen:
+            return
+        if len(self.order) == self.order.maxlen:
+            self.seen.discard(self.order[0])
+        msg_num = _intern(msg_num)
+        self.order.append(msg_num)
+        self.seen.add(msg_num)
+
+    def to_list(self):
+        return list(self.order)
@@ -0,0 +1,386 @@
+# ravenclaw_recurring.py
+"""
+Ravenclaw Recurring - Repeating scheduled emails
+================================================
+A recurring schedule is stored once and fires on a cron expression
+("0 9 * * 1-5", "@daily") or a fixed interval ("every": "1d", "2h",
+"1w"), in its own timezone, until an end time and/or a number of
+occurrences.
+
+Everything is kept in one append-only journal (one JSON object per line):
+  {"op": "add", "schedule": {...}}     definition
+  {"op": "fire", "id", "at", "status"} occurrence sent or given up
+  {"op": "cancel", "id"}
+Firing appends one short line; no other schedule is rewritten and the
+one-shot queue does not grow. The journal is compacted (rewritten with
+one add and the last fire per live schedule) once it has twice as many
+lines as needed.
+
+Next fire times live in a heap: due() pops only what is due and each
+fire pushes the schedule's next time, so a fire costs O(log n) however
+many schedules exist.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# ========== CRON ==========
+
+_MACROS = {
+    '@yearly': '0 0 1 1 *', '@annually': '0 0 1 1 *', '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0', '@daily': '0 0 * * *', '@midnight': '0 0 * * *', '@hourly': '0 * * * *'
+}
+_MONTHS = {m: i for i, m in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), 1)}
+_DAYS = {d: i for i, d in enumerate(('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'))}
+
+
+def _parse_field(text, low, high, names=None):
+    """One cron field -> (set of allowed values, restricted?)"""
+    values = set()
+    for part in text.lower().split(','):
+        spec, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if spec == '*':
+            start, end = low, high
+        else:
+            first, _, last = spec.partition('-')
+            start = names[first] if names and first in names else int(first)
+            end = (names[last] if names and last in names else int(last)) if last else (high if step > 1 else start)
+        if step < 1 or not low <= start <= end <= high:
+            raise ValueError(f"cron field out of range: {part}")
+        values.update(range(start, end + 1, step))
+    return values, text != '*'
+
+
+class CronSpec:
+    """Standard 5-field cron (minute hour day-of-month month day-of-week)"""
+
+    def __init__(self, expr):
+        fields = _MACROS.get(expr.strip().lower(), expr).split()
+        if len(fields) != 5:
+            raise ValueError("cron needs 5 fields: minute hour day month weekday")
+        self.minutes, _ = _parse_field(fields[0], 0, 59)
+        self.hours, _ = _parse_field(fields[1], 0, 23)
+        self.days, self.days_restricted = _parse_field(fields[2], 1, 31)
+        self.months, _ = _parse_field(fields[3], 1, 12, _MONTHS)
+        weekdays, self.weekdays_restricted = _parse_field(fields[4], 0, 7, _DAYS)
+        self.weekdays = {d % 7 for d in weekdays}  # 0 and 7 are both Sunday
+
+    def _day_matches(self, t):
+        dom = t.day in self.days
+        dow = (t.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return dom or dow  # cron rule: either restricted day field may match
+        return dom and dow
+
+    def next_after(self, after):
+        """First matching naive wall-clock minute strictly after `after`, or None"""
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after + timedelta(days=366 * 5)
+        while t <= limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        return None
+
+
+_UNITS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+
+def parse_every(text):
+    """'30m', '2h', '1d', '1w' -> seconds"""
+    text = str(text).strip().lower()
+    if len(text) < 2 or text[-1] not in _UNITS or not text[:-1].isdigit() or int(text[:-1]) < 1:
+        raise ValueError("every must look like 30m, 2h, 1d or 1w")
+    return int(text[:-1]) * _UNITS[text[-1]]
+
+
+# ========== SCHEDULES ==========
+
+def _zone(name):
+    if not name:
+        return None  # Local time of the host
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name}")
+
+
+def _to_wall(epoch, tz):
+    return datetime.fromtimestamp(epoch, tz).replace(tzinfo=None)
+
+
+def _from_wall(wall, tz):
+    """Epoch of a wall-clock time, or None if it does not exist (DST gap)"""
+    epoch = wall.replace(tzinfo=tz).timestamp() if tz else wall.timestamp()
+    return int(epoch) if _to_wall(epoch, tz) == wall else None
+
+
+def _parse_time(value, tz):
+    """ISO-8601 (naive means the schedule's timezone) -> epoch"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=tz) if tz else moment
+    return int(moment.timestamp())
+
+
+class Recurrence:
+    """When one schedule fires: cron or fixed interval, timezone, start, until, count"""
+
+    def __init__(self, spec):
+        self.tz = _zone(spec.get('timezone'))
+        if bool(spec.get('cron')) == bool(spec.get('every')):
+            raise ValueError("Give exactly one of cron or every")
+        self.cron = CronSpec(spec['cron']) if spec.get('cron') else None
+        self.every = parse_every(spec['every']) if spec.get('every') else None
+        self.start = _parse_time(spec.get('start'), self.tz) or int(time.time())
+        self.until = _parse_time(spec.get('until'), self.tz)
+        self.count = None if spec.get('count') in (None, '') else int(spec['count'])
+        if self.count is not None and self.count < 1:
+            raise ValueError("count must be at least 1")
+
+    def next_after(self, after, fired=0):
+        """Epoch of the first occurrence after `after` (epoch), or None when finished"""
+        if self.count is not None and fired >= self.count:
+            return None
+        if self.cron:
+            wall = _to_wall(max(after, self.start - 60), self.tz)
+            while True:
+                wall = self.cron.next_after(wall)
+                if wall is None:
+                    return None
+                epoch = _from_wall(wall, self.tz)
+                if epoch is not None and epoch > after and epoch >= self.start:
+                    break
+        elif self.every % 86400 == 0:
+            # Whole days/weeks step in wall-clock time, so 09:00 stays 09:00 across DST
+            start_wall = _to_wall(self.start, self.tz)
+            k = max(0, int((after - self.start) // self.every))
+            while True:
+                epoch = _from_wall(start_wall + timedelta(seconds=k * self.every), self.tz)
+                if epoch is not None and epoch > after and epoch >= self.start:
+                    break
+                k += 1
+        else:
+            k = 0 if after < self.start else int(after - self.start) // self.every + 1
+            epoch = self.start + k * self.every
+        if self.until is not None and epoch > self.until:
+            return None
+        return epoch
+
+
+class _Schedule:
+    __slots__ = ('definition', 'recurrence', 'fired', 'last', 'next', 'due_at', 'attempts')
+
+    def __init__(self, definition):
+        self.definition = definition
+        self.recurrence = Recurrence(definition)
+        self.fired = 0  # occurrences sent or given up
+        self.last = None  # epoch of the last occurrence
+        self.next = None  # epoch of the next occurrence
+        self.due_at = None  # when to try it (later than next after a throttle or failure)
+        self.attempts = 0  # failed sends of the current occurrence
+
+    def view(self):
+        return {**self.definition, 'fired': self.fired,
+                'last_fire': datetime.fromtimestamp(self.last).isoformat() if self.last else None,
+                'next_fire': datetime.fromtimestamp(self.next).isoformat() if self.next else None}
+
+
+def new_recurring_id():
+    return f"recur_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:12]}"
+
+
+class RecurringStore:
+    def __init__(self, path, writer, logger=None):
+        self.path = path
+        self._writer = writer
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._schedules = {}  # id -> _Schedule (live only)
+        self._heap = []  # (due_at, seq, id); stale items are skipped
+        self._seq = itertools.count()
+        self._journal_lines = 0
+        self.version = 0  # Bumped on add/cancel/fire (backs HTTP ETags)
+        self._load()
+
+    # ---- reads ----
+
+    def list(self):
+        with self._lock:
+            return [s.view() for s in sorted(self._schedules.values(), key=lambda s: s.next or 0)]
+
+    def next_due(self):
+        """Epoch when the next fire (or retry) is due, or None"""
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def __len__(self):
+        return len(self._schedules)
+
+    # ---- writes ----
+
+    def add(self, definition):
+        """Validate and store a schedule definition; returns its view (with next_fire)"""
+        # Aware: a naive default would be read in the schedule's timezone, not the host's
+        now = datetime.fromtimestamp(int(time.time()), timezone.utc).isoformat()
+        definition = {**definition, 'id': definition.get('id') or new_recurring_id(),
+                      'start': definition.get('start') or now,  # Interval anchor; fixed once stored
+                      'created_at': definition.get('created_at') or datetime.now().isoformat()}
+        schedule = _Schedule(definition)  # ValueError on a bad cron/every/timezone
+        with self._lock:
+            self._plan(schedule, time.time() - 1)
+            if schedule.next is None:
+                raise ValueError("Schedule never fires (check cron, start, until and count)")
+            self._schedules[definition['id']] = schedule
+            self._append({'op': 'add', 'schedule': definition})
+            return schedule.view()
+
+    def cancel(self, schedule_id):
+        with self._lock:
+            if self._schedules.pop(schedule_id, None) is None:
+                return False
+            self._append({'op': 'cancel', 'id': schedule_id})
+            self.version += 1
+            return True
+
+    def due(self, now=None):
+        """Pop (definition, occurrence epoch) for every schedule due now; earliest first"""
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                when, _, schedule_id = heapq.heappop(self._heap)
+                schedule = self._schedules.get(schedule_id)
+                if schedule is not None and schedule.due_at == when:
+                    schedule.due_at = None  # Out of the heap until fired() or postpone()
+                    due.append((schedule.definition, schedule.next))
+        return due
+
+    def postpone(self, schedule_id, at, retry_at):
+        """Try occurrence `at` again at retry_at (throttled, or the send failed)"""
+        with self._lock:
+            schedule = self._schedules.get(schedule_id)
+            if schedule is not None and schedule.next == at:
+                schedule.due_at = retry_at
+                heapq.heappush(self._heap, (retry_at, next(self._seq), schedule_id))
+
+    def failed_attempt(self, schedule_id):
+        """Count a failed send of the current occurrence; returns the count"""
+        with self._lock:
+            schedule = self._schedules.get(schedule_id)
+            if schedule is None:
+                return 0
+            schedule.attempts += 1
+            return schedule.attempts
+
+    def fired(self, schedule_id, at, status='sent'):
+        """Record an occurrence as done and plan the next one (missed ones are skipped)"""
+        with self._lock:
+            schedule = self._schedules.get(schedule_id)
+            if schedule is None:
+                return
+            self._record_fire(schedule, at)
+            # Not waited for one by one; the sender calls flush() once per pass
+            self._append({'op': 'fire', 'id': schedule_id, 'at': at, 'status': status}, wait=False)
+            self._plan(schedule, max(at, time.time()))
+            if schedule.next is None:
+                self._schedules.pop(schedule_id)
+                if self._logger:
+                    self._logger.info(f"Recurring email {schedule_id} finished after {schedule.fired} sends")
+
+    def flush(self):
+        """Wait until recorded fires are on disk"""
+        self._writer.flush()
+
+    # ---- internals (lock held) ----
+
+    def _record_fire(self, schedule, at):
+        schedule.fired += 1
+        schedule.last = at
+        schedule.attempts = 0
+
+    def _plan(self, schedule, after):
+        schedule.next = schedule.due_at = schedule.recurrence.next_after(after, schedule.fired)
+        if schedule.next is not None:
+            heapq.heappush(self._heap, (schedule.next, next(self._seq), schedule.definition['id']))
+        self.version += 1
+
+    def _drop_stale(self):
+        while self._heap:
+            at, _, schedule_id = self._heap[0]
+            schedule = self._schedules.get(schedule_id)
+            if schedule is not None and schedule.due_at == at:
+                return
+            heapq.heappop(self._heap)
+
+    def _append(self, entry, wait=True):
+        self._journal_lines += 1
+        if self._journal_lines > 2 * (2 * len(self._schedules)) + 100:
+            self._compact(wait)
+        else:
+            self._writer.append(self.path, json.dumps(entry, ensure_ascii=False) + '\n', wait)
+
+    def _compact(self, wait=True):
+        lines = []
+        for schedule in self._schedules.values():
+            lines.append(json.dumps({'op': 'add', 'schedule': schedule.definition}, ensure_ascii=False))
+            if schedule.last is not None:
+                lines.append(json.dumps({'op': 'fire', 'id': schedule.definition['id'], 'at': schedule.last,
+                                         'fired': schedule.fired}))
+        self._journal_lines = len(lines)
+        text = ''.join(line + '\n' for line in lines)
+        self._writer.replace(self.path, lambda: text, wait)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line
+                self._journal_lines += 1
+                op = entry.get('op')
+                if op == 'add':
+                    try:
+                        self._schedules[entry['schedule']['id']] = _Schedule(entry['schedule'])
+                    except (KeyError, ValueError) as e:
+                        if self._logger:
+                            self._logger.error(f"Recurring schedule skipped: {e}")
+                elif op == 'cancel':
+                    self._schedules.pop(entry.get('id'), None)
+                elif op == 'fire' and entry.get('id') in self._schedules:
+                    schedule = self._schedules[entry['id']]
+                    self._record_fire(schedule, entry['at'])
+                    if 'fired' in entry:
+                        schedule.fired = entry['fired']  # Compacted: total so far
+        for schedule_id, schedule in list(self._schedules.items()):
+            # Occurrences missed while stopped: the first fires at once, fired() skips the rest
+            after = schedule.last if schedule.last is not None else schedule.recurrence.start - 1
+            schedule.next = schedule.due_at = schedule.recurrence.next_after(after, schedule.fired)
+            if schedule.next is None:
+                del self._schedules[schedule_id]
+                continue
+            heapq.heappush(self._heap, (schedule.next, next(self._seq), schedule_id))
@@ -0,0 +1,82 @@
+# ravenclaw_retention.py
+"""
+Ravenclaw Retention - Server-side POP3 deletion policy
+======================================================
+Without deletion the server mailbox, and with it every UIDL response and
+processed-set comparison, grows forever. Modes (POP3_RETENTION):
+
+  keep          never delete (default)
+  after_ingest  DELE each message once it is committed to the inbox
+  after_days    DELE once every route has delivered it and it was
+                ingested more than POP3_RETENTION_DAYS ago
+
+The ledger remembers, per server UID, when a message was ingested and
+which routes have not delivered it yet. It only holds messages still on
+the server, so it stays as small as the retention window.
+
+DELE is only acted on by the server at QUIT, and QUIT is only sent after
+the inbox and processed set are committed; a crash before that leaves
+the messages on the server.
+"""
+
+import json
+import threading
+import time
+
+from ravenclaw_persist import read_json
+
+MODES = ('keep', 'after_ingest', 'after_days')
+
+
+class RetentionLedger:
+    def __init__(self, path, writer, logger=None):
+        self.path = path
+        self._writer = writer
+        self._lock = threading.Lock()
+        # uid -> [ingested epoch, [routes not yet delivered], gave_up]
+        self._entries = dict(read_json(path, dict, logger))
+
+    def track(self, uid, routes, when=None):
+        """Start the clock for a message just committed to the inbox"""
+        with self._lock:
+            self._entries[uid] = [int(when or time.time()), list(routes), False]
+        self._save()
+
+    def delivered(self, uid, route, ok):
+        """Final outcome of one route; a route that gave up keeps the message on the server"""
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None:
+                return
+            if route in entry[1]:
+                entry[1].remove(route)
+            if not ok:
+                entry[2] = True
+        self._save()
+
+    def due(self, cutoff, wait_for_routes=True):
+        """UIDs ingested before cutoff (epoch) and, unless told otherwise, delivered by every route"""
+        with self._lock:
+            return {uid for uid, (when, pending, gave_up) in self._entries.items()
+                    if when <= cutoff and not (wait_for_routes and (pending or gave_up))}
+
+    def forget(self, uids):
+        """Drop UIDs that are no longer on the server"""
+        with self._lock:
+            removed = [self._entries.pop(uid) for uid in uids if uid in self._entries]
+        if removed:
+            self._save()
+
+    def uids(self):
+        with self._lock:
+            return set(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _save(self):
+        self._writer.replace(self.path, self._render, wait=False)
+
+    def _render(self):
+        with self._lock:
+            return json.dumps(self._entries)
@@ -0,0 +1,314 @@
+# ravenclaw_routing.py
+"""
+Ravenclaw Routing - Declarative multi-destination delivery
+==========================================================
+Rules map sender domain, subject regex and header matches to one or more
+destinations. They are compiled once at startup: domain conditions go
+into a hash index (subdomains match their parents), regexes are
+precompiled, and unknown destinations fail fast.
+
+Each destination has its own delivery worker thread and queue, so one
+fetch fans out to every channel and a slow channel only delays itself.
+Failed deliveries wait in the worker's retry list with backoff. With a
+PendingRetries store the list is also kept on disk, so a restart resumes
+the backoff instead of dropping those emails.
+
+Routes file (ROUTES_FILE, JSON):
+{
+  "destinations": {
+    "ops":     {"type": "webhook", "url": "https://discord.com/api/webhooks/..."},
+    "support": {"type": "webhook", "url": "https://discord.com/api/webhooks/..."}
+  },
+  "rules": [
+    {"sender_domain": ["alerts.example.com"], "to": ["ops"]},
+    {"subject": "(?i)ticket|support", "to": ["support"], "stop": true},
+    {"header": {"X-Priority": "^1"}, "to": ["ops", "discord"]}
+  ],
+  "default": ["discord"]
+}
+All conditions in a rule must match. "discord" is the built-in
+destination (DISCORD_WEBHOOK_URL with OpenClaw fallback).
+"""
+
+import heapq
+import itertools
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+from ravenclaw_persist import read_json
+from ravenclaw_records import as_dict
+
+
+# Failed deliveries are retried with exponential backoff before they count as failed
+RETRY_ATTEMPTS = 5
+RETRY_DELAY = 30  # seconds before the first retry
+RETRY_MAX_DELAY = 15 * 60
+
+
+class PendingRetries:
+    """
+    Deliveries waiting for a retry, per destination, kept in one JSON file
+    (written through the group-commit writer) so they survive a restart
+    """
+
+    def __init__(self, path, writer, logger=None):
+        self.path = path
+        self._writer = writer
+        self._lock = threading.Lock()
+        # (destination, email id) -> [due epoch, attempt, email dict]
+        self._entries = {(e['destination'], e['email'].get('id')): [e['due'], e['attempt'], e['email']]
+                         for e in read_json(path, list, logger)}
+
+    def put(self, destination, email_data, attempt, due):
+        with self._lock:
+            self._entries[(destination, email_data.get('id'))] = [due, attempt, as_dict(email_data)]
+        self._save()
+
+    def remove(self, destination, email_data):
+        with self._lock:
+            removed = self._entries.pop((destination, email_data.get('id')), None)
+        if removed is not None:
+            self._save()
+
+    def take(self, destination):
+        """[(due, attempt, email dict)] stored for destination (they stay stored until settled)"""
+        with self._lock:
+            return [tuple(v) for (name, _), v in self._entries.items() if name == destination]
+
+    def discard_except(self, destinations):
+        """Drop retries for destinations no longer configured; returns {destination: [email ids]}"""
+        with self._lock:
+            gone = [key for key in self._entries if key[0] not in destinations]
+            dropped = {}
+            for name, msg_id in gone:
+                del self._entries[(name, msg_id)]
+                dropped.setdefault(name, []).append(msg_id)
+        if gone:
+            self._save()
+        return dropped
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _save(self):
+        self._writer.replace(self.path, self._render, wait=False)
+
+    def _render(self):
+        with self._lock:
+            return json.dumps([{'destination': name, 'due': due, 'attempt': attempt, 'email': email}
+                               for (name, _), (due, attempt, email) in self._entries.items()])
+
+
+class DeliveryWorker:
+    def __init__(self, name, destination, send, logger=None, on_result=None, tracer=None, retries=None):
+        self.name = name
+        self.destination = destination
+        self._send = send
+        self._logger = logger
+        self._on_result = on_result  # on_result(name, delivered, email_data) once per email
+        self._tracer = tracer  # one 'forward' span per attempt when the email has a trace_id
+        self._retries = retries  # PendingRetries, or None to keep retries in memory only
+        self._queue = queue.Queue()
+        self._retry = []  # heap of (due, seq, email_data, attempt); worker thread only
+        self._seq = itertools.count()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.delivered = 0
+        self.failed = 0
+        self.retried = 0
+        if retries is not None:
+            restored = retries.take(name)
+            for due, attempt, email_data in restored:
+                heapq.heappush(self._retry, (due, next(self._seq), email_data, attempt))
+            if restored:
+                if logger:
+                    logger.info(f"Resuming {len(restored)} pending retries for {name}")
+                self._ensure_started()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    thread = threading.Thread(target=self._run, name=f'deliver-{self.name}', daemon=True)
+                    thread.start()
+                    self._thread = thread
+
+    def submit(self, email_data):
+        self._ensure_started()
+        self._queue.put((email_data, 0))
+
+    def pending(self):
+        return self._queue.unfinished_tasks
+
+    def retrying(self):
+        return len(self._retry)
+
+    def _run(self):
+        while True:
+            timeout = max(0, self._retry[0][0] - time.time()) if self._retry else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                try:
+                    self._deliver(*item)
+                finally:
+                    self._queue.task_done()
+            now = time.time()
+            while self._retry and self._retry[0][0] <= now:
+                _, _, email_data, attempt = heapq.heappop(self._retry)
+                self._deliver(email_data, attempt)
+
+    def _deliver(self, email_data, attempt):
+        start = time.time_ns()
+        error = None
+        try:
+            ok = self._send(self.destination, email_data)
+        except Exception as e:
+            ok = False
+            error = str(e)
+            if self._logger:
+                self._logger.error(f"Delivery to {self.name} failed: {e}")
+        if self._tracer:
+            self._tracer.record(email_data.get('trace_id'), 'forward', start, time.time_ns(),
+                                {'destination': self.name, 'attempt': attempt + 1, 'delivered': bool(ok)},
+                                error or (None if ok else 'delivery failed'))
+        if ok:
+            self.delivered += 1
+            if self._retries is not None and attempt:
+                self._retries.remove(self.name, email_data)
+            if self._on_result:
+                self._on_result(self.name, True, email_data)
+        elif attempt + 1 < RETRY_ATTEMPTS:
+            delay = min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** attempt)
+            due = time.time() + delay
+            heapq.heappush(self._retry, (due, next(self._seq), email_data, attempt + 1))
+            if self._retries is not None:
+                self._retries.put(self.name, email_data, attempt + 1, due)
+            self.retried += 1
+        else:
+            self.failed += 1
+            if self._retries is not None:
+                self._retries.remove(self.name, email_data)
+            if self._on_result:
+                self._on_result(self.name, False, email_data)
+            if self._logger:
+                self._logger.error(f"Delivery to {self.name} gave up after {RETRY_ATTEMPTS} attempts: {email_data.get('id')}")
+
+
+class _Rule:
+    __slots__ = ('domains', 'subject', 'headers', 'to', 'stop')
+
+    def __init__(self, spec):
+        domains = spec.get('sender_domain')
+        if isinstance(domains, str):
+            domains = [domains]
+        self.domains = {d.lower() for d in domains} if domains else None
+        self.subject = re.compile(spec['subject']) if spec.get('subject') else None
+        self.headers = [(name, re.compile(pattern, re.IGNORECASE))
+                        for name, pattern in (spec.get('header') or {}).items()]
+        to = spec.get('to') or []
+        self.to = (to,) if isinstance(to, str) else tuple(to)
+        self.stop = bool(spec.get('stop', False))
+
+    def matches(self, email_data, headers):
+        # Domain is checked by the index before we get here
+        if self.subject and not self.subject.search(email_data.get('subject') or ''):
+            return False
+        for name, pattern in self.headers:
+            value = headers.get(name) if headers is not None else None
+            if value is None or not pattern.search(str(value)):
+                return False
+        return True
+
+
+class Router:
+    def __init__(self, config, senders, logger=None, on_result=None, tracer=None, retries=None):
+        self._logger = logger
+        destinations = dict(config.get('destinations') or {})
+        destinations.setdefault('discord', {'type': 'discord'})
+
+        self.workers = {}
+        for name, dest in destinations.items():
+            kind = dest.get('type', 'webhook')
+            if kind not in senders:
+                raise ValueError(f"Route destination {name}: unknown type {kind}")
+            self.workers[name] = DeliveryWorker(name, dest, senders[kind], logger, on_result, tracer, retries)
+        if retries is not None:
+            for name, msg_ids in retries.discard_except(set(self.workers)).items():
+                if logger:
+                    logger.warning(f"Dropped {len(msg_ids)} pending retries for removed destination {name}: "
+                                   f"{', '.join(map(str, msg_ids))}")
+
+        self.rules = [_Rule(spec) for spec in config.get('rules') or []]
+        default = config.get('default') or ['discord']
+        self.default = (default,) if isinstance(default, str) else tuple(default)
+        for target in [t for rule in self.rules for t in rule.to] + list(self.default):
+            if target not in self.workers:
+                raise ValueError(f"Route references unknown destination: {target}")
+
+        # Domain index: rule positions by exact domain, plus rules with no domain condition
+        self._by_domain = {}
+        self._any_domain = []
+        for i, rule in enumerate(self.rules):
+            if rule.domains is None:
+                self._any_domain.append(i)
+            else:
+                for domain in rule.domains:
+                    self._by_domain.setdefault(domain, []).append(i)
+
+    @classmethod
+    def from_file(cls, path, senders, logger=None, on_result=None, tracer=None, retries=None):
+        config = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        router = cls(config, senders, logger, on_result, tracer, retries)
+        if logger and router.rules:
+            logger.info(f"Routing: {len(router.rules)} rules, destinations: {', '.join(router.workers)}")
+        return router
+
+    def route(self, email_data, headers=None):
+        """Destination names for an email, in rule order, without duplicates"""
+        sender = (email_data.get('sender') or '').lower()
+        domain = sender.rsplit('@', 1)[-1] if '@' in sender else ''
+
+        candidates = set(self._any_domain)
+        parts = domain.split('.')
+        for i in range(len(parts) - 1):
+            candidates.update(self._by_domain.get('.'.join(parts[i:]), ()))
+
+        targets = []
+        for i in sorted(candidates):
+            rule = self.rules[i]
+            if rule.matches(email_data, headers):
+                targets.extend(t for t in rule.to if t not in targets)
+                if rule.stop:
+                    break
+        return targets or list(self.default)
+
+    def dispatch(self, email_data, targets=None):
+        """Queue the email on each destination's worker"""
+        targets = targets or email_data.get('routes') or self.route(email_data)
+        for name in targets:
+            self.workers[name].submit(email_data)
+        return targets
+
+    def wait_idle(self, timeout=None):
+        """Wait until every queued delivery has been attempted. Returns True if idle"""
+        deadline = None if timeout is None else time.time() + timeout
+        while any(w.pending() for w in self.workers.values()):
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stats(self):
+        return {name: {'pending': w.pending(), 'retrying': w.retrying(),
+                       'delivered': w.delivered, 'failed': w.failed}
+                for name, w in self.workers.items()}
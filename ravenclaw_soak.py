@@ -0,0 +1,664 @@
+# ravenclaw_soak.py
+"""
+Ravenclaw Soak - Simulated weeks of traffic, checking nothing grows
+===================================================================
+The bridge, sync watcher and scheduler all promise bounded memory and
+state. This harness runs them in one process against local fake POP3,
+SMTP and webhook servers, with time.time() pushed forward one tick
+(default 15 minutes) per loop, so weeks of traffic pass in minutes.
+
+Each tick delivers new mail (including duplicates, rejected senders,
+auto-generated mail and attachments), fires concurrent /check requests,
+schedules and cancels one-shot and recurring emails, runs the scheduler
+and the sync watcher. Every simulated hour it samples:
+
+  rss_mb     resident memory (Linux /proc)
+  fds        open file descriptors (Linux /proc)
+  threads    live Python threads
+  state_kb   state files (inbox, processed, sent, queue, dedupe, ...)
+  logs_kb    rotated logs and traces
+
+plus the entry count of each bounded structure (inbox, processed set,
+sent ids, queue, dedupe index, retention ledger, sync state, ...).
+
+After the warm-up (inbox and dedupe index full, retention window passed)
+each metric's median over the last quarter of samples must not exceed
+the median over the first quarter by more than its budget. The archive
+and attachment spool keep mail on purpose and are only reported.
+
+The fakes speak plain TCP, so POP3_SSL and STARTTLS are switched off in
+this process. Only time.time() is accelerated; sleeps, time.monotonic()
+and datetime.now() stay real.
+
+Usage:
+    python ravenclaw_soak.py                # 28 days, the first 10 warm-up
+    python ravenclaw_soak.py --days 56 --report soak.json
+
+The warm-up must outlast the 7-day queue retention (and --retention-days),
+otherwise those structures are still filling when growth is measured and
+a healthy tree fails; shorter warm-ups are refused.
+
+Exit status is 0 when every budget and invariant holds, 1 otherwise.
+"""
+
+import argparse
+import gc
+import http.server
+import json
+import os
+import poplib
+import random
+import smtplib
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import formatdate
+
+TICK_MINUTES = 15
+SAMPLE_MINUTES = 60
+
+# Growth allowed between the first and last quarter of the steady-state samples
+BUDGETS = {
+    'rss_mb': 16.0,
+    'fds': 4,
+    'threads': 4,
+    'state_kb': 256.0,
+    'logs_kb': 256.0
+}
+
+# Entry counts of each bounded structure; allowed growth is a share of the first-quarter median
+ENTRY_METRICS = ('inbox', 'processed', 'sent_ids', 'queue', 'recurring', 'dedupe_keys', 'retention',
+                 'sync_state', 'mailbox')
+ENTRY_GROWTH_PCT = 10
+
+# ravenclaw_core keeps finished queue entries this long; the warm-up must outlast it
+QUEUE_KEEP_DAYS = 7
+
+ATTACHMENT = b'soak attachment\n' * 512  # Same bytes every time: the spool stores it once
+
+
+# ========== ACCELERATED CLOCK ==========
+
+class AcceleratedClock:
+    """time.time() plus an offset the harness advances"""
+
+    def __init__(self):
+        self._real = time.time
+        self.offset = 0.0
+
+    def time(self):
+        return self._real() + self.offset
+
+    def advance(self, seconds):
+        self.offset += seconds
+
+    def install(self):
+        time.time = self.time
+
+
+# ========== FAKE SERVERS ==========
+
+class FakeMailbox:
+    """Server-side maildrop: [(uid, bytes)], oldest first"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._messages = []
+        self._next_uid = 0
+
+    def deliver(self, data):
+        with self._lock:
+            self._next_uid += 1
+            self._messages.append((f'soak-{self._next_uid}', data))
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._messages)
+
+    def remove(self, uids):
+        with self._lock:
+            self._messages = [m for m in self._messages if m[0] not in uids]
+
+    def __len__(self):
+        return len(self._messages)
+
+
+class _LineHandler(socketserver.StreamRequestHandler):
+    def reply(self, *lines):
+        self.wfile.write(''.join(line + '\r\n' for line in lines).encode('utf-8'))
+
+
+class _POP3Handler(_LineHandler):
+    """USER/PASS, STAT, LIST, UIDL, RETR, DELE (applied at QUIT), RSET, NOOP, QUIT"""
+
+    def handle(self):
+        box = self.server.mailbox
+        messages, deleted = [], set()
+        self.reply('+OK soak POP3 ready')
+        for raw in self.rfile:
+            parts = raw.decode('ascii', 'replace').split()
+            if not parts:
+                continue
+            cmd, args = parts[0].upper(), parts[1:]
+            live = [(i, m) for i, m in enumerate(messages, 1) if i not in deleted]
+            if cmd in ('USER', 'NOOP'):
+                self.reply('+OK')
+            elif cmd == 'PASS':
+                messages = box.snapshot()
+                self.reply('+OK logged in')
+            elif cmd == 'STAT':
+                self.reply(f'+OK {len(live)} {sum(len(m[1]) for _, m in live)}')
+            elif cmd in ('LIST', 'UIDL'):
+                field = (lambda m: len(m[1])) if cmd == 'LIST' else (lambda m: m[0])
+                if args:
+                    i = int(args[0])
+                    self.reply(f'+OK {i} {field(messages[i - 1])}')
+                else:
+                    self.reply('+OK', *[f'{i} {field(m)}' for i, m in live], '.')
+            elif cmd == 'RETR':
+                data = messages[int(args[0]) - 1][1]
+                lines = ['.' + line if line.startswith('.') else line
+                         for line in data.decode('utf-8').removesuffix('\r\n').split('\r\n')]
+                self.reply(f'+OK {len(data)} octets', *lines, '.')
+            elif cmd == 'DELE':
+                deleted.add(int(args[0]))
+                self.reply('+OK deleted')
+            elif cmd == 'RSET':
+                deleted.clear()
+                self.reply('+OK')
+            elif cmd == 'QUIT':
+                box.remove({messages[i - 1][0] for i in deleted})
+                self.reply('+OK bye')
+                return
+            else:
+                self.reply('-ERR unknown command')
+
+
+class Outbox:
+    """What the fake SMTP server accepted, by kind of message"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {'scheduled': 0, 'recurring': 0, 'other': 0}
+        self.scheduled_ids = []  # Drained by the harness every tick
+
+    def record(self, subject):
+        subject = subject.removeprefix('Re: ')  # build_smtp_message() prefixes every subject
+        with self._lock:
+            if subject.startswith('soak-scheduled '):
+                self.counts['scheduled'] += 1
+                self.scheduled_ids.append(subject.split()[1])
+            elif subject.startswith('soak-recurring'):
+                self.counts['recurring'] += 1
+            else:
+                self.counts['other'] += 1
+
+    def drain_scheduled(self):
+        with self._lock:
+            ids, self.scheduled_ids = self.scheduled_ids, []
+            return ids
+
+
+class _SMTPHandler(_LineHandler):
+    """EHLO (AUTH PLAIN advertised), AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+    def handle(self):
+        self.reply('220 soak ESMTP ready')
+        for raw in self.rfile:
+            cmd = raw[:4].decode('ascii', 'replace').upper()
+            if cmd == 'EHLO':
+                self.reply('250-soak', '250-AUTH PLAIN LOGIN', '250 8BITMIME')
+            elif cmd == 'AUTH':
+                self.reply('235 authenticated')
+            elif cmd in ('HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply('250 ok')
+            elif cmd == 'DATA':
+                self.reply('354 go ahead')
+                subject, in_headers = '', True
+                for line in self.rfile:
+                    if line == b'.\r\n':
+                        break
+                    if in_headers:
+                        if line == b'\r\n':
+                            in_headers = False
+                        elif line[:9].lower() == b'subject: ':
+                            subject = line[9:].decode('utf-8', 'replace').strip()
+                self.server.outbox.record(subject)
+                self.reply('250 queued')
+            elif cmd == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 unknown command')
+
+
+class _WebhookHandler(http.server.BaseHTTPRequestHandler):
+    """Accepts every POST with 204; counts bridge forwards and sync posts apart"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.hooks.record('sync' if b'New Email (Sync)' in body else 'forwarded')
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class Hooks:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {'forwarded': 0, 'sync': 0}
+
+    def record(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(server):
+    """Run server on a daemon thread; returns its port"""
+    threading.Thread(target=server.serve_forever, args=(0.2,), name='soak-server', daemon=True).start()
+    return server.server_address[1]
+
+
+# ========== TRAFFIC ==========
+
+class Traffic:
+    """Seeded mail generator; remembers the last delivery so it can resend it"""
+
+    def __init__(self, mailbox, clock, seed):
+        self.mailbox = mailbox
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.sent = 0
+        self.duplicates = 0
+        self._last = None
+
+    def deliver(self, count):
+        for _ in range(count):
+            roll = self.rng.random()
+            if roll < 0.1 and self._last is not None:
+                self.mailbox.deliver(self._last)  # Same mail again under a new UID
+                self.duplicates += 1
+                continue
+            self.sent += 1
+            if roll < 0.2:
+                self.mailbox.deliver(self._message(f'spam{self.sent % 37}@elsewhere.test'))
+                continue
+            data = self._message(f'user{self.sent % 50}@example.com',
+                                 auto=roll < 0.3, message_id=roll < 0.9, attachment=roll > 0.97)
+            self.mailbox.deliver(data)
+            self._last = data
+
+    def _message(self, sender, auto=False, message_id=True, attachment=False):
+        msg = EmailMessage()
+        msg['From'] = sender
+        msg['To'] = 'soak@example.com'
+        msg['Subject'] = f'soak mail {self.sent}'
+        msg['Date'] = formatdate(self.clock.time())
+        if message_id:
+            msg['Message-ID'] = f'<soak-{self.sent}@example.com>'
+        if auto:
+            msg['Auto-Submitted'] = 'auto-generated'
+        words = ' '.join(self.rng.choice(('raven', 'claw', 'mail', 'bridge', 'queue', 'sync'))
+                         for _ in range(self.rng.randint(20, 300)))
+        msg.set_content(f'Message {self.sent}\n\n{words}\n')
+        if attachment:
+            msg.add_attachment(ATTACHMENT, maintype='application', subtype='octet-stream', filename='soak.bin')
+        return msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+
+
+# ========== SAMPLING ==========
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+def open_fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def tree_kb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / 1024
+
+
+def disk_usage(core):
+    """KB of state files, logs/traces, archive and attachment spool in the working directory"""
+    usage = {'state_kb': 0.0, 'logs_kb': 0.0}
+    for name in os.listdir('.'):
+        if not os.path.isfile(name):
+            continue
+        kind = 'logs_kb' if '.log' in name or name.startswith(core.TRACING['file']) else 'state_kb'
+        usage[kind] += os.path.getsize(name) / 1024
+    usage['archive_kb'] = tree_kb(core.ARCHIVE_DIR)
+    usage['spool_kb'] = tree_kb(core.ATTACHMENT_DIR)
+    return usage
+
+
+def take_sample(day, core, sync, mailbox):
+    gc.collect()
+    sample = {
+        'day': round(day, 4),
+        'rss_mb': rss_mb(),
+        'fds': open_fds(),
+        'threads': threading.active_count(),
+        **disk_usage(core),
+        # Entry counts
+        'inbox': len(core.inbox_store.snapshot()),
+        'processed': len(core.load_processed()),
+        'sent_ids': len(core.load_sent_ids()),
+        'queue': len(core.load_scheduled_queue()['emails']),
+        'recurring': len(core.recurring),
+        'dedupe_keys': core.dedupe_index.stats()['keys'],
+        'retention': len(core.retention_ledger),
+        'sync_state': len(sync.state_cache['synced'].order),
+        'mailbox': len(mailbox)
+    }
+    return sample
+
+
+def evaluate(samples, budgets, warmup_days, entry_growth_pct=ENTRY_GROWTH_PCT):
+    """
+    Per-metric growth after warm-up, against its budget. Entry counts are
+    allowed entry_growth_pct percent of their starting level (at least 10),
+    so a slow leak shows even where its bytes are lost in file-size noise.
+    """
+    steady = [s for s in samples if s['day'] >= warmup_days]
+    if len(steady) < 8:
+        return {'error': f'only {len(steady)} samples after the warm-up; run more days'}
+    k = max(2, len(steady) // 4)
+    results = {}
+    budgets = {**budgets, **{metric: None for metric in ENTRY_METRICS}}
+    for metric, budget in budgets.items():
+        points = [(s['day'], s[metric]) for s in steady if s.get(metric) is not None]
+        if len(points) < 2 * k:
+            results[metric] = {'status': 'skipped', 'reason': 'not measurable on this platform'}
+            continue
+        values = [v for _, v in points]
+        first, last = statistics.median(values[:k]), statistics.median(values[-k:])
+        if budget is None:
+            budget = max(10, round(first * entry_growth_pct / 100))
+        results[metric] = {
+            'status': 'ok' if last - first <= budget else 'FAIL',
+            'first': round(first, 2),
+            'last': round(last, 2),
+            'growth': round(last - first, 2),
+            'budget': budget,
+            'per_day': round(_slope(points), 3),
+            'max': round(max(values), 2)
+        }
+    return results
+
+
+def _slope(points):
+    """Least-squares slope of value against day"""
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var if var else 0.0
+
+
+# ========== RUN ==========
+
+def configure(workdir, ports, args):
+    """Environment for ravenclaw_core and ravenclaw_sync; must run before they are imported"""
+    pop_port, smtp_port, http_port = ports
+    os.environ.update({
+        'EMAIL_HOST': '127.0.0.1',
+        'EMAIL_POP_PORT': str(pop_port),
+        'EMAIL_SMTP_PORT': str(smtp_port),
+        'EMAIL_USERNAME': 'soak@example.com',
+        'EMAIL_PASSWORD': 'soak',
+        'DOMAIN_FILTER': 'example.com',
+        'DISCORD_WEBHOOK_URL': f'http://127.0.0.1:{http_port}/webhook',
+        'DISCORD_USE_WEBHOOK': 'true',
+        'OPENCLAW_URL': f'http://127.0.0.1:{http_port}/openclaw',
+        'AUTO_REPLY_ENABLED': 'true',
+        'POP3_RETENTION': 'after_days',
+        'POP3_RETENTION_DAYS': str(args.retention_days),
+        'POP3_DELETE_REJECTED': 'true',
+        'DEDUPE_FILE': 'ravenclaw_dedupe.txt',
+        'DEDUPE_CAPACITY': str(args.dedupe_capacity),
+        'ARCHIVE_DIR': 'ravenclaw_archive',
+        'ATTACHMENT_DIR': 'ravenclaw_attachments',
+        'ROUTES_FILE': 'ravenclaw_routes.json',
+        'TRACING': 'true',
+        'TRACE_FILE': 'ravenclaw_traces.jsonl',
+        'TRACE_MAX_BYTES': str(64 * 1024),
+        'TRACE_BACKUPS': '2',
+        'TRACE_KEEP': '200',
+        'LOG_MAX_BYTES': str(64 * 1024),
+        'LOG_BACKUPS': '2',
+        'SMTP_RATE_GLOBAL': '',
+        'SMTP_RATE_DEFAULT': '',
+        'SMTP_RATE_DOMAINS': '',
+        'PERSIST_COMMIT_WINDOW_MS': '2'
+    })
+    os.chdir(workdir)
+    # The fakes have no TLS
+    poplib.POP3_SSL = poplib.POP3
+    smtplib.SMTP.starttls = lambda self, *a, **kw: (220, b'no tls')
+
+
+def run(args):
+    report_path = os.path.abspath(args.report)
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='ravenclaw-soak-'))
+    os.makedirs(workdir, exist_ok=True)
+
+    mailbox, outbox, hooks = FakeMailbox(), Outbox(), Hooks()
+    pop_server = _TCPServer(('127.0.0.1', 0), _POP3Handler)
+    pop_server.mailbox = mailbox
+    smtp_server = _TCPServer(('127.0.0.1', 0), _SMTPHandler)
+    smtp_server.outbox = outbox
+    http_server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _WebhookHandler)
+    http_server.daemon_threads = True
+    http_server.hooks = hooks
+    ports = (serve(pop_server), serve(smtp_server), serve(http_server))
+
+    configure(workdir, ports, args)
+    clock = AcceleratedClock()
+    clock.install()
+
+    import ravenclaw  # Flask bridge
+    import ravenclaw_core as core
+    import ravenclaw_sync as sync
+    core.inbox_store.start()
+    client = ravenclaw.app.test_client()
+    traffic = Traffic(mailbox, clock, args.seed)
+
+    tick_seconds = args.tick_minutes * 60
+    ticks = int(args.days * 86400 // tick_seconds)
+    sample_every = max(1, SAMPLE_MINUTES * 60 // tick_seconds)
+    ticks_per_day = max(1, 86400 // tick_seconds)
+    pending = {}  # scheduled token -> target epoch, until the fake SMTP server sees it
+    resent = 0
+    daily_recurring = None
+    samples = []
+    started = time.monotonic()
+    print(f"[SOAK] {args.days} simulated days, {ticks} ticks of {args.tick_minutes} min, workdir {workdir}")
+
+    def post(path, payload=None):
+        return ravenclaw.app.test_client().post(path, json=payload)
+
+    client.post('/schedule/recurring', json={'to': 'ops@example.com', 'subject': 'soak-recurring 6h',
+                                             'body': 'Every six hours', 'every': '6h'})
+
+    for tick in range(ticks):
+        traffic.deliver(args.mail_per_tick)
+
+        # Bridge: pollers and manual /check calls overlap; SingleFlight runs one check for all of them
+        callers = [threading.Thread(target=post, args=('/check',)) for _ in range(3)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+        core.inbox_check.run()
+        core.router.wait_idle(30)
+        client.get('/unread')
+        response = client.get('/stats')
+        client.get('/stats', headers={'If-None-Match': response.headers.get('ETag', '')})
+        if tick % 4 == 0:
+            unread = [e['id'] for e in core.inbox_store.snapshot()[:5] if not e['read']]
+            if unread:
+                client.post('/mark-read/batch', json={'ids': unread})
+            client.get('/inbox', headers={'Accept-Encoding': 'gzip'})
+
+        # Scheduler: one-shot entries (some cancelled), a recurring one per day replacing yesterday's
+        if tick % args.schedule_every == 0:
+            target = clock.time() + traffic.rng.randint(0, 6 * 3600)
+            # The subject carries a token so a resend is recognisable at the SMTP server
+            token = str(tick)
+            response = client.post('/schedule', json={
+                'to': f'user{tick % 50}@example.com', 'subject': f'soak-scheduled {token}',
+                'body': 'Scheduled by the soak run',
+                'target_time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(target))})
+            schedule_id = (response.get_json() or {}).get('id')
+            if schedule_id and traffic.rng.random() < 0.1:
+                client.post(f'/schedule/cancel/{schedule_id}')
+            elif schedule_id:
+                pending[token] = target
+        if tick % ticks_per_day == 0:
+            if daily_recurring:
+                client.post(f'/schedule/recurring/cancel/{daily_recurring}')
+            response = client.post('/schedule/recurring', json={
+                'to': 'team@example.com', 'subject': 'soak-recurring hourly', 'body': 'Hourly',
+                'every': '1h'})
+            daily_recurring = (response.get_json() or {}).get('id')
+            client.post('/schedule/recurring', json={
+                'to': 'team@example.com', 'subject': 'soak-recurring burst', 'body': 'Three times',
+                'every': '30m', 'count': 3})
+        post('/check-scheduled')
+        core.scheduled_check.run()
+        for token in outbox.drain_scheduled():
+            if pending.pop(token, None) is None:
+                resent += 1
+
+        # Sync watcher
+        sync.sync_new_emails()
+
+        clock.advance(tick_seconds)
+        if tick % sample_every == 0:
+            samples.append(take_sample(tick * tick_seconds / 86400, core, sync, mailbox))
+            if len(samples) % (24 * 7) == 1:
+                s = samples[-1]
+                print(f"[SOAK] day {s['day']:.1f}: rss {s['rss_mb']} MB, fds {s['fds']}, "
+                      f"threads {s['threads']}, state {s['state_kb']:.0f} KB, logs {s['logs_kb']:.0f} KB")
+
+    core.writer.flush()
+    lifetime = core.counters.snapshot()
+    overdue = sum(1 for target in pending.values() if target < clock.time() - 3600)
+    invariants = {
+        # Every stored email is forwarded once by the bridge and posted once by the sync watcher
+        'forwarded_once': hooks.counts['forwarded'] == lifetime.get('received', 0),
+        'synced_once': hooks.counts['sync'] == lifetime.get('received', 0),
+        'duplicates_skipped': lifetime.get('duplicates', 0) == traffic.duplicates,
+        'scheduled_not_resent': resent == 0,
+        'scheduled_not_lost': overdue == 0
+    }
+    results = evaluate(samples, args.budgets, args.warmup_days, args.entry_growth_pct)
+    passed = 'error' not in results and all(invariants.values()) and \
+        all(r['status'] != 'FAIL' for r in results.values())
+
+    report = {
+        'passed': passed,
+        'config': {'days': args.days, 'tick_minutes': args.tick_minutes, 'mail_per_tick': args.mail_per_tick,
+                   'warmup_days': args.warmup_days, 'seed': args.seed, 'workdir': workdir},
+        'elapsed_seconds': round(time.monotonic() - started, 1),
+        'results': results,
+        'invariants': invariants,
+        'traffic': {'delivered': traffic.sent, 'duplicates': traffic.duplicates, **lifetime,
+                    'webhook': hooks.counts, 'smtp': outbox.counts, 'scheduled_resent': resent,
+                    'scheduled_overdue': overdue},
+        'samples': samples
+    }
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print_summary(report, report_path)
+    core.request_shutdown()
+    for server in (pop_server, smtp_server, http_server):
+        server.shutdown()
+    return 0 if passed else 1
+
+
+def print_summary(report, report_path):
+    print("=" * 72)
+    print(f"RAVENCLAW SOAK - {report['config']['days']} days in {report['elapsed_seconds']}s")
+    print("=" * 72)
+    results = report['results']
+    if 'error' in results:
+        print(f"[ERROR] {results['error']}")
+    else:
+        print(f"{'metric':<12} {'first':>10} {'last':>10} {'growth':>10} {'budget':>8} {'/day':>8}  status")
+        for metric, r in results.items():
+            if r['status'] == 'skipped':
+                print(f"{metric:<12} {'-':>10} {'-':>10} {'-':>10} {'-':>8} {'-':>8}  skipped")
+                continue
+            print(f"{metric:<12} {r['first']:>10} {r['last']:>10} {r['growth']:>10} {r['budget']:>8} "
+                  f"{r['per_day']:>8}  {r['status']}")
+    for name, ok in report['invariants'].items():
+        print(f"{name:<22} {'ok' if ok else 'FAIL'}")
+    print(f"Traffic: {json.dumps(report['traffic'])}")
+    print(f"Report: {report_path}")
+    print("PASSED" if report['passed'] else "FAILED")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='ravenclaw_soak', description='Ravenclaw long-run boundedness check')
+    parser.add_argument('--days', type=float, default=28, help='Simulated days (default: 28)')
+    parser.add_argument('--warmup-days', type=float, default=10,
+                        help='Days ignored before growth is measured (default: 10; queues keep 7 days)')
+    parser.add_argument('--tick-minutes', type=int, default=TICK_MINUTES, help='Simulated minutes per loop')
+    parser.add_argument('--mail-per-tick', type=int, default=4)
+    parser.add_argument('--schedule-every', type=int, default=8, help='Ticks between one-shot schedules')
+    parser.add_argument('--retention-days', type=float, default=2, help='POP3_RETENTION_DAYS for the run')
+    parser.add_argument('--dedupe-capacity', type=int, default=2000, help='DEDUPE_CAPACITY for the run')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help='State directory (default: a new temporary directory)')
+    parser.add_argument('--report', default='ravenclaw_soak_report.json')
+    for metric, budget in BUDGETS.items():
+        parser.add_argument(f"--max-{metric.replace('_', '-')}-growth", dest=metric, type=float, default=budget,
+                            help=f'Allowed {metric} growth after warm-up (default: {budget})')
+    parser.add_argument('--max-entries-growth-pct', dest='entry_growth_pct', type=float, default=ENTRY_GROWTH_PCT,
+                        help=f'Allowed growth of each structure\'s entry count, in percent (default: {ENTRY_GROWTH_PCT})')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    min_warmup = max(QUEUE_KEEP_DAYS, args.retention_days)
+    if args.warmup_days <= min_warmup:
+        parser.error(f"--warmup-days must exceed {min_warmup:g} (queue and retention windows still filling)")
+    if args.days <= args.warmup_days:
+        parser.error("--days must exceed --warmup-days, or nothing is measured")
+    args.budgets = {metric: getattr(args, metric) for metric in BUDGETS}
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,6 +5,7 @@ Features:
 - Memory leak prevention (max state size)
 - In-memory state caching
 - Graceful shutdown
+- Queued, rotated logging (ravenclaw-sync.log)
 """
 
 import json
@@ -14,27 +15,31 @@ import requests
 from datetime import datetime
 import signal
 
+from ravenclaw_logging import setup_logging
+from ravenclaw_persist import atomic_write_text, read_json
+from ravenclaw_records import EmailRecord, SyncState
+
 # Config
 INBOX_FILE = 'ravenclaw_inbox.json'
 SYNC_STATE_FILE = 'ravenclaw_sync_state.json'
 POLL_INTERVAL = 5  # seconds
-MAX_SYNC_STATE = 500  # Max msg_nums to track (prevent memory leak)
+MAX_SYNC_STATE = 1000  # Max msg_nums to track (prevent memory leak); at least the bridge's MAX_EMAILS
 STATE_CACHE_TTL = 60  # Refresh state from disk every 60 seconds
 
+# Logging (queued, rotated; same LOG_* settings as the bridge)
+logger = setup_logging('ravenclaw-sync', 'RAVENCLAW-SYNC', 'ravenclaw-sync.log')
+
 # Global state
 shutdown_requested = False
 state_cache = {
-    'last_synced_msg_nums': [],
-    'last_refresh': 0
+    'synced': SyncState(limit=MAX_SYNC_STATE),
+    'last_refresh': 0,
+    'inbox_signature': None  # (mtime_ns, size) of the inbox last fully synced
 }
 
 def load_state():
     """Load state from file"""
-    try:
-        with open(SYNC_STATE_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return {'last_synced_msg_nums': []}
+    return read_json(SYNC_STATE_FILE, lambda: {'last_synced_msg_nums': []})
 
 def save_state(state):
     """Save state to file with size limit"""
@@ -42,8 +47,8 @@ def save_state(state):
     if 'last_synced_msg_nums' in state:
         state['last_synced_msg_nums'] = state['last_synced_msg_nums'][-MAX_SYNC_STATE:]
     
-    with open(SYNC_STATE_FILE, 'w') as f:
-        json.dump(state, f)
+    # Atomic replace: a crash mid-write must not reset sync state
+    atomic_write_text(SYNC_STATE_FILE, json.dumps(state))
 
 def get_env(key, default=''):
     return os.environ.get(key, default)
@@ -63,15 +68,15 @@ ID: {msg_id}
 {body}"""
 
     if not DISCORD_WEBHOOK_URL:
-        print(f"[SKIP] No webhook URL configured")
+        logger.warning("No webhook URL configured, skipping")
         return False
 
     try:
         requests.post(DISCORD_WEBHOOK_URL, json={'content': content}, timeout=10)
-        print(f"[DISCORD] {sender} - {subject}")
+        logger.info(f"Discord: {sender} - {subject}")
         return True
     except Exception as e:
-        print(f"[ERROR] Discord: {e}")
+        logger.error(f"Discord error: {e}")
         return False
 
 def sync_new_emails():
@@ -88,46 +93,59 @@ def sync_new_emails():
     current_time = time.time()
     if current_time - state_cache['last_refresh'] > STATE_CACHE_TTL:
         fresh_state = load_state()
-        state_cache['last_synced_msg_nums'] = fresh_state.get('last_synced_msg_nums', [])
+        state_cache['synced'] = SyncState(fresh_state.get('last_synced_msg_nums', []), MAX_SYNC_STATE)
         state_cache['last_refresh'] = current_time
     
+    # Unchanged since everything in it was synced: nothing to parse
+    try:
+        st = os.stat(INBOX_FILE)
+    except OSError:
+        return
+    signature = (st.st_mtime_ns, st.st_size)
+    if signature == state_cache['inbox_signature']:
+        return
+    
     try:
         with open(INBOX_FILE, 'r', encoding='utf-8') as f:
             inbox = json.load(f)
     except Exception as e:
-        print(f"[ERROR] Read inbox: {e}")
+        logger.error(f"Read inbox failed: {e}")
         return
 
-    last_synced = set(state_cache['last_synced_msg_nums'])
-    new_synced = []
-
+    synced = state_cache['synced']
     new_count = 0
-    for email in inbox.get('emails', []):
-        msg_num = email.get('msg_num')
-        if msg_num and msg_num not in last_synced:
+    failed = 0
+    # Oldest first, so the state forgets emails in the order they leave the inbox
+    for email in map(EmailRecord.from_dict, reversed(inbox.get('emails', []))):
+        # UIDL is stable across sessions; msg_num is reused once the server deletes mail
+        msg_num = f'uid:{email.uid}' if email.uid else email.msg_num
+        if msg_num and msg_num not in synced:
             # New email found!
-            print(f"[NEW] {email.get('sender')} - {email.get('subject')}")
+            logger.info(f"New: {email.sender} - {email.subject}")
             success = send_to_discord(
-                email.get('sender'),
-                email.get('subject'),
-                email.get('body'),
-                email.get('id', msg_num)
+                email.sender,
+                email.subject,
+                email.body,
+                email.id or email.msg_num
             )
             if success:
-                new_synced.append(msg_num)
-                last_synced.add(msg_num)
+                synced.add(msg_num)
                 new_count += 1
+            else:
+                failed += 1
+    
+    # Failed sends are retried on the next poll even if the file is unchanged
+    state_cache['inbox_signature'] = None if failed else signature
 
     # Update state if new emails synced
-    if new_synced:
-        state_cache['last_synced_msg_nums'] = list(last_synced)[:MAX_SYNC_STATE]
-        save_state(state_cache)
-        print(f"[SYNC] Complete - {new_count} new emails synced")
+    if new_count:
+        save_state({'last_synced_msg_nums': synced.to_list()})
+        logger.info(f"Sync complete - {new_count} new emails synced")
 
 def signal_handler(signum, frame):
     """Handle shutdown signals gracefully"""
     global shutdown_requested
-    print(f"\n[INFO] Received signal {signum}, shutting down...")
+    logger.info(f"Received signal {signum}, shutting down...")
     shutdown_requested = True
 
 def main():
@@ -145,7 +163,7 @@ def main():
     signal.signal(signal.SIGTERM, signal_handler)
     
     # Initialize state cache
-    state_cache['last_synced_msg_nums'] = load_state().get('last_synced_msg_nums', [])
+    state_cache['synced'] = SyncState(load_state().get('last_synced_msg_nums', []), MAX_SYNC_STATE)
     state_cache['last_refresh'] = time.time()
     
     try:
@@ -156,7 +174,7 @@ def main():
     except KeyboardInterrupt:
         pass
     
-    print("[INFO] Ravenclaw Sync stopped gracefully")
+    logger.info("Ravenclaw Sync stopped gracefully")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,174 @@
+# ravenclaw_tracing.py
+"""
+Ravenclaw Tracing - Per-email stage spans
+=========================================
+Every message gets a trace id when check_inbox() first sees it. Each
+stage (fetch, filter, parse, persist, forward attempts, auto-reply)
+records a span under that id.
+
+Spans are written one per line to a rotating JSONL file through the
+queued logging pipeline, using OTLP/JSON span field names
+(traceId, spanId, startTimeUnixNano, attributes as key/value pairs,
+status.code 1=OK 2=ERROR), so a line can be wrapped in
+{"resourceSpans": [{"scopeSpans": [{"spans": [...]}]}]} and sent to any
+collector. Recent traces are also kept in memory for /trace/<msg_id>.
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _plain_value(value):
+    (kind, raw), = value.items()
+    return int(raw) if kind == 'intValue' else raw
+
+
+class Span:
+    __slots__ = ('name', 'start', 'attributes', 'error')
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.start = time.time_ns()
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def fail(self, message):
+        self.error = str(message)
+
+
+class _NullSpan:
+    def set(self, key, value):
+        pass
+
+    def fail(self, message):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    def __init__(self, sink=None, path=None, keep=2000):
+        self._sink = sink  # logger whose messages are the JSONL lines; None disables tracing
+        self.path = path
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._recent = OrderedDict()  # trace id -> [span dict], most recent last
+
+    def new_trace(self):
+        """Fresh 128-bit trace id, or None when tracing is off (every span is then a no-op)"""
+        return secrets.token_hex(16) if self._sink else None
+
+    @contextmanager
+    def span(self, trace_id, name, **attributes):
+        """Time the block as a span; exceptions mark it ERROR and propagate"""
+        if not trace_id:
+            yield _NULL_SPAN
+            return
+        span = Span(name, attributes)
+        try:
+            yield span
+        except Exception as e:
+            span.fail(e)
+            raise
+        finally:
+            self.record(trace_id, name, span.start, time.time_ns(), span.attributes, span.error)
+
+    def record(self, trace_id, name, start_ns, end_ns, attributes=None, error=None):
+        """Record a span whose times are already known"""
+        if not trace_id:
+            return
+        span = {
+            'traceId': trace_id,
+            'spanId': secrets.token_hex(8),
+            'name': name,
+            'startTimeUnixNano': str(start_ns),
+            'endTimeUnixNano': str(end_ns),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in (attributes or {}).items()
+                           if v is not None],
+            'status': {'code': STATUS_ERROR, 'message': error} if error else {'code': STATUS_OK}
+        }
+        with self._lock:
+            spans = self._recent.pop(trace_id, None) or []
+            spans.append(span)
+            self._recent[trace_id] = spans
+            while len(self._recent) > self.keep:
+                self._recent.popitem(last=False)
+        self._sink.info(json.dumps(span, ensure_ascii=False))
+
+    def spans(self, trace_id):
+        """Spans of a trace, from memory or (for older traces) the trace files"""
+        with self._lock:
+            spans = list(self._recent.get(trace_id, ()))
+        if not spans and self.path and os.path.exists(self.path):
+            spans = list(self._scan(lambda span: span.get('traceId') == trace_id))
+        return sorted(spans, key=lambda s: int(s['startTimeUnixNano']))
+
+    def find_trace(self, message_id):
+        """Trace id recorded for a Message-ID, searching the trace files"""
+        if not self.path:
+            return None
+        for span in self._scan(lambda span: any(
+                a['key'] == 'email.message_id' and a['value'].get('stringValue') == message_id
+                for a in span.get('attributes', ()))):
+            return span['traceId']
+        return None
+
+    def _scan(self, match):
+        # Newest file first: path, path.1, path.2, ...
+        files = [self.path] + [f'{self.path}.{i}' for i in range(1, 100)]
+        for path in files:
+            if not os.path.exists(path):
+                if path != self.path:
+                    return
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        span = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line
+                    if match(span):
+                        yield span
+
+
+def timeline(spans):
+    """Readable view of spans: offsets and durations in ms from the first start"""
+    if not spans:
+        return {'spans': [], 'total_ms': 0}
+    origin = int(spans[0]['startTimeUnixNano'])
+    end = max(int(s['endTimeUnixNano']) for s in spans)
+    return {
+        'trace_id': spans[0]['traceId'],
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(origin / 1e9)),
+        'total_ms': round((end - origin) / 1e6, 3),
+        'spans': [{
+            'name': s['name'],
+            'offset_ms': round((int(s['startTimeUnixNano']) - origin) / 1e6, 3),
+            'duration_ms': round((int(s['endTimeUnixNano']) - int(s['startTimeUnixNano'])) / 1e6, 3),
+            'status': 'error' if s['status']['code'] == STATUS_ERROR else 'ok',
+            **({'error': s['status']['message']} if s['status'].get('message') else {}),
+            'attributes': {a['key']: _plain_value(a['value']) for a in s['attributes']}
+        } for s in spans]
+    }
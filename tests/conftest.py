@@ -0,0 +1,26 @@
+"""
+Shared setup: the modules live at the repository root, and ravenclaw_core
+reads its settings from the environment and keeps its state files in the
+working directory when imported. Tests run in a scratch directory with
+placeholder credentials.
+"""
+
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('EMAIL_USERNAME', 'test@example.com')
+os.environ.setdefault('EMAIL_PASSWORD', 'test')
+os.environ.setdefault('DOMAIN_FILTER', 'example.com')
+os.chdir(tempfile.mkdtemp(prefix='ravenclaw-tests-'))
+
+
+def pytest_unconfigure(config):
+    # Exit-time log lines would otherwise go to pytest's already closed capture stream
+    for listener in getattr(sys.modules.get('ravenclaw_logging'), '_listeners', ()):
+        for handler in listener.handlers:
+            if type(handler) is logging.StreamHandler:
+                handler.setStream(sys.__stdout__)
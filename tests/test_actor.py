@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+
+from ravenclaw_actor import InboxActor, SingleFlight
+from ravenclaw_records import EmailRecord
+
+
+def email(msg_id, msg_num, uid=None, sender='a@example.com'):
+    return EmailRecord.from_dict({'id': msg_id, 'msg_num': msg_num, 'uid': uid, 'sender': sender,
+                                  'subject': 's', 'body': 'b', 'timestamp': 0, 'read': False, 'replied': False})
+
+
+def actor(emails=()):
+    saved = []
+    inbox = InboxActor(lambda: {'emails': list(emails)}, saved.append)
+    return inbox, saved
+
+
+def test_msg_num_reused_across_sessions_matches_nothing_with_uid():
+    # Retention deleted session one's mail, so session two numbers from 1 again
+    inbox, _ = actor()
+    inbox.add([email('<a@example.com>', '1', uid='UA')])
+    inbox.add([email('<b@example.com>', '1', uid='UB')])
+
+    assert inbox.find('1') is None
+    assert inbox.mark_read(['1']) == []
+    assert inbox.counts()['unread'] == 2
+
+    assert inbox.find('uid:UB')['id'] == '<b@example.com>'
+    assert inbox.mark_read(['uid:UA']) == ['uid:UA']
+    unread = [e['id'] for e in inbox.snapshot() if not e['read']]
+    assert unread == ['<b@example.com>']
+
+
+def test_msg_num_still_matches_mail_without_uid():
+    inbox, _ = actor([email('<c@example.com>', '7')])
+    assert inbox.find('7')['id'] == '<c@example.com>'
+    assert inbox.mark_read(['7', '<c@example.com>']) == ['7', '<c@example.com>']
+
+
+def test_failed_save_publishes_nothing_and_archives_once():
+    archived = []
+    fail = [True]
+
+    def save(inbox):
+        if fail[0]:
+            raise OSError('disk full')
+
+    inbox = InboxActor(lambda: {'emails': [email('<old@example.com>', '1')]}, save,
+                       limit=1, on_trim=archived.append)
+    version = inbox.version()
+
+    with pytest.raises(OSError):
+        inbox.add([email('<new@example.com>', '2')])
+    assert [e['id'] for e in inbox.snapshot()] == ['<old@example.com>']
+    assert inbox.version() == version
+    assert inbox.counts()['total'] == 1
+
+    # The retry trims the same overflow again, but archives it only once
+    fail[0] = False
+    inbox.add([email('<new@example.com>', '2')])
+    assert [e['id'] for e in inbox.snapshot()] == ['<new@example.com>']
+    assert inbox.version() == version + 1
+    assert [[e['id'] for e in batch] for batch in archived] == [['<old@example.com>']]
+
+
+def test_concurrent_writers_share_commits_and_readers_see_whole_batches():
+    release = threading.Event()
+    saved = []
+
+    def save(inbox):
+        release.wait(5)  # Hold the first commit so the rest queue up behind it
+        saved.append(len(inbox['emails']))
+
+    inbox = InboxActor(lambda: {'emails': []}, save)
+    before = inbox.snapshot()
+    futures = [inbox.submit(lambda emails, counts, n=n: _add_one(emails, counts, n)) for n in range(10)]
+    release.set()
+    assert sorted(f.result() for f in futures) == list(range(10))
+
+    assert before == ()  # Snapshots are immutable
+    assert len(inbox.snapshot()) == 10
+    assert inbox.writes == len(saved) < 10
+    assert saved[-1] == 10
+
+
+def _add_one(emails, counts, n):
+    record = email(f'<n{n}@example.com>', str(n))
+    emails.insert(0, record)
+    counts.add(record)
+    return n, True
+
+
+def test_counts_follow_adds_reads_and_trims():
+    archived = []
+    inbox = InboxActor(lambda: {'emails': []}, lambda inbox: None, limit=2, on_trim=archived.extend)
+    inbox.add([email('<a@example.com>', '1'), email('<b@other.org>', '2', sender='b@other.org')])
+    assert inbox.counts() == {'total': 2, 'unread': 2, 'by_domain': {'example.com': 1, 'other.org': 1}}
+
+    inbox.mark_read(['<a@example.com>'])
+    inbox.add([email('<c@example.com>', '3')])  # Pushes the oldest (a) out to the archive
+    assert [e['id'] for e in archived] == ['<a@example.com>']
+    assert inbox.counts() == {'total': 2, 'unread': 2, 'by_domain': {'example.com': 1, 'other.org': 1}}
+
+    assert inbox.mark_all_read() == 2
+    assert inbox.counts()['unread'] == 0
+
+
+def test_single_flight_joins_the_running_job():
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def job():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return len(calls)
+
+    flight = SingleFlight(job, 'test')
+    first, started_first = flight.request()
+    started.wait(5)
+    second, started_second = flight.request()
+    release.set()
+    assert (started_first, started_second) == (True, False)
+    assert first.result() == second.result() == 1
+    assert flight.run() == 2  # A finished job is not reused
@@ -0,0 +1,46 @@
+import os
+
+from ravenclaw_archive import Archive
+
+
+def mail(n, day, sender='a@example.com'):
+    return {'id': f'<{n}@example.com>', 'sender': sender, 'subject': f's{n}', 'timestamp': f'{day}T09:00:00'}
+
+
+def ids(emails):
+    return [e['id'] for e in emails]
+
+
+def test_appends_accumulate_in_day_segments(tmp_path):
+    archive = Archive(str(tmp_path))
+    archive.append([mail(1, '2026-06-01'), mail(2, '2026-06-02', 'b@other.org')])
+    archive.append([mail(3, '2026-06-01')])  # A second gzip member in the same segment
+
+    segments = dict(archive.segments())
+    assert sorted(segments) == ['2026-06-01', '2026-06-02']
+    assert segments['2026-06-01']['count'] == 2
+    assert segments['2026-06-02']['domains'] == ['other.org']
+    assert ids(archive.query()) == ['<1@example.com>', '<3@example.com>', '<2@example.com>']
+
+    # The index is on disk, not only in this instance
+    assert dict(Archive(str(tmp_path)).segments()) == segments
+
+
+def test_query_filters_by_day_sender_and_limit(tmp_path):
+    archive = Archive(str(tmp_path))
+    archive.append([mail(1, '2026-06-01'), mail(2, '2026-06-02', 'b@other.org'),
+                    mail(3, '2026-06-03', 'c@example.com'), mail(4, '2026-06-03')])
+
+    assert ids(archive.query(start='2026-06-02', end='2026-06-02')) == ['<2@example.com>']
+    assert ids(archive.query(sender='example.com')) == ['<1@example.com>', '<3@example.com>', '<4@example.com>']
+    assert ids(archive.query(sender='C@Example.com')) == ['<3@example.com>']
+    assert ids(archive.query(start='2026-06-03', limit=1)) == ['<3@example.com>']
+
+
+def test_a_torn_final_member_keeps_what_was_written_before(tmp_path):
+    archive = Archive(str(tmp_path))
+    archive.append([mail(1, '2026-06-01')])
+    with open(os.path.join(str(tmp_path), '2026-06-01.jsonl.gz'), 'ab') as f:
+        f.write(b'\x1f\x8b\x08\x00partial')  # Crash in the middle of the next append
+
+    assert ids(archive.query()) == ['<1@example.com>']
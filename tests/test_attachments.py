@@ -0,0 +1,57 @@
+import base64
+import hashlib
+import os
+
+from ravenclaw_attachments import AttachmentSpool, MessageReader
+
+PDF = b'%PDF-1.4 ' + bytes(range(256)) * 20
+
+
+def multipart(text=b'Hello =E2=9C=93\r\nsecond line'):
+    encoded = base64.encodebytes(PDF).replace(b'\n', b'\r\n').rstrip()
+    return (b'From: a@example.com\r\nSubject: report\r\nMIME-Version: 1.0\r\n'
+            b'Content-Type: multipart/mixed; boundary="outer"\r\n\r\n'
+            b'preamble\r\n--outer\r\n'
+            b'Content-Type: multipart/alternative; boundary="inner"\r\n\r\n'
+            b'--inner\r\nContent-Type: text/plain; charset=utf-8\r\nContent-Transfer-Encoding: quoted-printable\r\n\r\n'
+            + text + b'\r\n--inner\r\nContent-Type: text/html\r\n\r\n<p>Hello</p>\r\n--inner--\r\n'
+            b'--outer\r\nContent-Type: application/pdf\r\nContent-Disposition: attachment; filename="r.pdf"\r\n'
+            b'Content-Transfer-Encoding: base64\r\n\r\n' + encoded + b'\r\n--outer--\r\nepilogue\r\n').split(b'\r\n')
+
+
+def test_text_body_and_spooled_attachment(tmp_path):
+    spool = AttachmentSpool(str(tmp_path))
+    reader = MessageReader(multipart())
+    assert reader.headers()['Subject'] == 'report'
+
+    body, attachments = reader.read_body(spool)
+    assert body == 'Hello ✓\nsecond line'
+    assert attachments == [{'filename': 'r.pdf', 'content_type': 'application/pdf', 'size': len(PDF),
+                            'sha256': hashlib.sha256(PDF).hexdigest()}]
+    with open(spool.path(attachments[0]['sha256']), 'rb') as f:
+        assert f.read() == PDF
+
+
+def test_the_same_attachment_is_stored_once(tmp_path):
+    spool = AttachmentSpool(str(tmp_path))
+    for _ in range(3):
+        MessageReader(multipart()).read_body(spool)
+    assert os.listdir(str(tmp_path)) == [hashlib.sha256(PDF).hexdigest()]
+
+
+def test_body_is_capped_and_the_prefix_is_put_back(tmp_path):
+    lines = [b'From: a@example.com', b'Subject: long', b''] + [b'x' * 99] * 50
+    reader = MessageReader(iter(lines), text_limit=1000)
+    assert reader.body_prefix(200).startswith(b'x' * 99 + b'\r\n')
+
+    body, attachments = reader.read_body(AttachmentSpool(str(tmp_path)))
+    assert len(body) == 1000 and body.startswith('x' * 99 + '\n')
+    assert attachments == []
+
+
+def test_drain_consumes_the_rest_unparsed():
+    lines = iter(multipart())
+    reader = MessageReader(lines)
+    reader.headers()
+    reader.drain()
+    assert next(lines, None) is None
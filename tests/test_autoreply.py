@@ -0,0 +1,69 @@
+import email.parser
+import email.policy
+import json
+import time
+
+from ravenclaw_autoreply import ReplySuppressor, is_auto_generated
+from ravenclaw_persist import GroupCommitWriter
+
+
+def headers(raw):
+    return email.parser.BytesHeaderParser(policy=email.policy.compat32).parsebytes(raw + b'\r\n\r\n')
+
+
+def test_automatic_and_bulk_mail_is_recognised():
+    for line in (b'Auto-Submitted: auto-replied', b'Precedence: Bulk', b'Precedence: list',
+                 b'X-Auto-Response-Suppress: OOF, AutoReply', b'X-Autoreply: yes',
+                 b'List-Id: <news.example.com>'):
+        assert is_auto_generated(headers(b'From: a@example.com\r\n' + line)), line
+
+
+def test_person_to_person_mail_is_not():
+    assert not is_auto_generated(headers(b'From: a@example.com\r\nSubject: hi'))
+    assert not is_auto_generated(headers(b'From: a@example.com\r\nAuto-Submitted: no'))
+    assert not is_auto_generated(headers(b'From: a@example.com\r\nX-Auto-Response-Suppress: OOF'))
+    assert not is_auto_generated(None)
+
+
+def test_one_reply_per_sender_per_ttl(tmp_path):
+    suppressor = ReplySuppressor(str(tmp_path / 'replies.json'), 0.2, 100, GroupCommitWriter(0.001))
+    assert suppressor.should_reply('a@example.com')
+    suppressor.record(['a@example.com'])
+
+    assert not suppressor.should_reply('A@Example.com')  # Senders are compared case-insensitively
+    assert not suppressor.should_reply('a@example.com')
+    assert suppressor.should_reply('b@example.com')
+    assert suppressor.stats() == {'tracked_senders': 1, 'suppressed': 2}
+
+    time.sleep(0.25)
+    assert suppressor.should_reply('a@example.com')
+
+
+def test_oldest_senders_are_evicted_first(tmp_path):
+    suppressor = ReplySuppressor(str(tmp_path / 'replies.json'), 3600, 2, GroupCommitWriter(0.001))
+    suppressor.record(['a@example.com'])
+    suppressor.record(['b@example.com'])
+    suppressor.record(['a@example.com'])  # Refreshed: b is now the oldest
+    suppressor.record(['c@example.com'])
+
+    assert suppressor.should_reply('b@example.com')
+    assert not suppressor.should_reply('a@example.com')
+    assert not suppressor.should_reply('c@example.com')
+
+
+def test_replies_survive_a_restart_until_they_expire(tmp_path):
+    path = str(tmp_path / 'replies.json')
+    writer = GroupCommitWriter(0.001)
+    ReplySuppressor(path, 3600, 100, writer).record(['a@example.com'])
+    writer.flush()
+
+    assert not ReplySuppressor(path, 3600, 100, writer).should_reply('a@example.com')
+
+    with open(path) as f:
+        senders = json.load(f)['senders']
+    senders['old@example.com'] = time.time() - 7200
+    with open(path, 'w') as f:
+        json.dump({'senders': senders}, f)
+    restarted = ReplySuppressor(path, 3600, 100, writer)
+    assert restarted.should_reply('old@example.com')
+    assert restarted.stats()['tracked_senders'] == 1
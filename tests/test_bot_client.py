@@ -0,0 +1,76 @@
+import asyncio
+import importlib.util
+import os
+
+import pytest
+
+pytest.importorskip('discord')
+from aiohttp import web  # noqa: E402  (ships with discord.py)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def bot_module():
+    os.environ.setdefault('DISCORD_BOT_TOKEN', 'test-token')
+    spec = importlib.util.spec_from_file_location('ravenclaw_bot', os.path.join(ROOT, 'ravenclaw-bot.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def with_bridge(test):
+    """Run test(client, hits) against a local bridge that counts requests per path"""
+    async def main(bot_module):
+        hits = {}
+
+        async def handler(request):
+            hits[request.path] = hits.get(request.path, 0) + 1
+            await asyncio.sleep(0.05)
+            return web.json_response({'path': request.path, 'hit': hits[request.path]})
+
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', 0).start()
+        port = runner.addresses[0][1]
+        client = bot_module.BridgeClient(f'http://127.0.0.1:{port}', cache_ttl=60)
+        await client.start()
+        try:
+            await test(client, hits)
+        finally:
+            await client.close()
+            await runner.cleanup()
+    return main
+
+
+def test_concurrent_identical_reads_share_one_request(bot_module):
+    async def test(client, hits):
+        results = await asyncio.gather(*[client.get('/stats') for _ in range(5)])
+        assert hits == {'/stats': 1}
+        assert {data['hit'] for _, data in results} == {1}
+    asyncio.run(with_bridge(test)(bot_module))
+
+
+def test_reads_are_cached_until_a_write(bot_module):
+    async def test(client, hits):
+        assert (await client.get('/health'))[1]['hit'] == 1
+        assert (await client.get('/health'))[1]['hit'] == 1  # Within the TTL
+        status, _ = await client.post('/check')
+        assert status == 200
+        assert (await client.get('/health'))[1]['hit'] == 2  # The write dropped the cache
+        assert hits == {'/health': 2, '/check': 1}
+    asyncio.run(with_bridge(test)(bot_module))
+
+
+def test_connection_errors_reach_the_command(bot_module):
+    async def main():
+        client = bot_module.BridgeClient('http://127.0.0.1:9', cache_ttl=60)
+        await client.start()
+        try:
+            with pytest.raises(Exception):
+                await client.get('/health')
+        finally:
+            await client.close()
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+from ravenclaw_breaker import CLOSED, HALF_OPEN, OPEN, BreakerBoard, CircuitBreaker, endpoint_label
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def breaker(clock):
+    return CircuitBreaker('test', window=10, min_calls=4, failure_rate=0.5, open_seconds=30, clock=clock)
+
+
+def call(b, success):
+    if not b.allow():
+        return False
+    b.record(success)
+    return True
+
+
+def test_opens_once_the_failure_rate_is_reached_over_enough_calls():
+    b = breaker(Clock())
+    for success in (False, False, False):
+        call(b, success)
+    assert b.state == CLOSED  # Below min_calls
+    call(b, True)
+    assert b.state == OPEN  # 3 of 4 failed
+    assert not b.allow() and not b.available()
+    assert b.snapshot()['rejected'] == 1
+
+
+def test_mostly_successful_traffic_stays_closed():
+    b = breaker(Clock())
+    for i in range(50):
+        call(b, i % 4 != 3)  # One failure in four
+    assert b.state == CLOSED and b.snapshot()['opened'] == 0
+
+
+def test_half_open_lets_one_probe_through():
+    clock = Clock()
+    b = breaker(clock)
+    for _ in range(4):
+        call(b, False)
+    assert b.retry_after() == 30
+
+    clock.now += 30
+    assert b.available()
+    assert b.allow()  # The probe
+    assert b.state == HALF_OPEN
+    assert not b.allow()  # Everyone else still fails fast
+    b.record(False)
+    assert b.state == OPEN and b.snapshot()['opened'] == 2
+
+    clock.now += 30
+    assert b.allow()
+    b.record(True)
+    assert b.state == CLOSED
+    assert b.snapshot()['calls_in_window'] == 0  # Starts over
+
+
+def test_board_shares_settings_and_keeps_secrets_out_of_names():
+    board = BreakerBoard(min_calls=1, failure_rate=1.0, open_seconds=60)
+    name = endpoint_label('webhook', 'https://discord.com/api/webhooks/123/SECRET-TOKEN')
+    assert name.startswith('webhook:discord.com#') and 'SECRET' not in name
+
+    board.get(name).allow()
+    board.get(name).record(False)
+    assert board.get(name) is board.get(name)
+    assert board.snapshot()[name]['state'] == OPEN
+    assert board.get('smtp').state == CLOSED
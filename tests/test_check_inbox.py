@@ -0,0 +1,203 @@
+import poplib
+import time
+
+import pytest
+
+import ravenclaw_core as core
+
+
+class FakePOP3:
+    """
+    poplib.POP3 stand-in over a list of (uid, bytes). Replies queue up like
+    bytes on a socket: lines a client leaves unread are what it reads next.
+    """
+
+    def __init__(self, messages, fail_after_lines=None):
+        self.messages = messages
+        self.fail_after_lines = fail_after_lines  # Drop the connection after this many reply lines
+        self.pending = []
+        self.read = 0
+        self.deleted = []
+        self.events = []  # DELE and QUIT, in order
+        self.quit_called = False
+        self.closed = False
+        self.listings = 0
+
+    def user(self, name):
+        pass
+
+    def pass_(self, password):
+        pass
+
+    def stat(self):
+        return len(self.messages), sum(len(data) for _, data in self.messages)
+
+    def uidl(self):
+        self.listings += 1
+        return b'+OK', [f'{i} {uid}'.encode() for i, (uid, _) in enumerate(self.messages, 1)], 0
+
+    def dele(self, which):
+        self.deleted.append(which)
+        self.events.append(f'DELE {which}')
+
+    def quit(self):
+        self.quit_called = True
+        self.events.append('QUIT')
+
+    def close(self):
+        self.closed = True
+
+    def _putcmd(self, line):
+        command, which = line.split()
+        assert command == 'RETR'
+        data = self.messages[int(which) - 1][1]
+        self.pending.append(b'+OK')
+        self.pending.extend(b'.' + line if line.startswith(b'.') else line for line in data.split(b'\r\n'))
+        self.pending.append(b'.')
+
+    def _getresp(self):
+        return self._getline()[0]
+
+    def _getline(self):
+        if self.fail_after_lines is not None and self.read >= self.fail_after_lines:
+            raise ConnectionResetError('connection reset')
+        self.read += 1
+        line = self.pending.pop(0)
+        return line, len(line) + 2
+
+
+def message(name, body=b'hello\r\nline2\r\nline3'):
+    return (f'{name}',
+            b'From: a@example.com\r\nSubject: ' + name.encode() + b'\r\nMessage-ID: <' + name.encode()
+            + b'@example.com>\r\n\r\n' + body)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    def connect(messages, **kwargs):
+        mail = FakePOP3(messages, **kwargs)
+        monkeypatch.setattr(core.poplib, 'POP3_SSL', lambda host, port: mail)
+        monkeypatch.setattr(core, 'mailbox_fingerprint', None)
+        return mail
+    return connect
+
+
+def stored(names):
+    ids = {email_data['id'] for email_data in core.inbox_store.snapshot()}
+    return [name for name in names if f'<{name}@example.com>' in ids]
+
+
+def test_a_message_that_fails_does_not_shift_the_next_ones(server, monkeypatch):
+    names = ['fail-1', 'fail-2', 'fail-3']
+    server([message(name) for name in names])
+    real_key = core.message_key
+
+    def message_key(msg, body_prefix):
+        if msg['Subject'] == 'fail-1':
+            raise ValueError('bad header')
+        return real_key(msg, body_prefix)
+    monkeypatch.setattr(core, 'message_key', message_key)
+
+    core.check_inbox()
+
+    assert stored(names) == ['fail-2', 'fail-3']
+    processed = core.load_processed()
+    assert {f'uid:{name}' for name in names} <= processed
+
+
+def test_a_broken_reply_leaves_the_rest_unprocessed(server):
+    names = ['cut-1', 'cut-2', 'cut-3']
+    # Each reply is 9 lines (+OK, 3 headers, blank, 3 body, .): the connection drops inside cut-2's
+    mail = server([message(name) for name in names], fail_after_lines=12)
+
+    core.check_inbox()
+
+    assert stored(names) == ['cut-1']
+    processed = core.load_processed()
+    assert 'uid:cut-1' in processed
+    assert not {'uid:cut-2', 'uid:cut-3'} & processed
+    assert mail.closed and not mail.quit_called and not mail.deleted
+
+
+def test_raw_8bit_subject_is_stored(server):
+    raw = (b'From: a@example.com\r\nSubject: Caf\xe9 menu\r\nDate: Mon, 1 Jun 2026 08:00:00 +0000\r\n'
+           b'\r\nhello')
+    server([('raw-1', raw)])
+
+    core.check_inbox()
+
+    subjects = [e['subject'] for e in core.inbox_store.snapshot() if e['uid'] == 'raw-1']
+    assert len(subjects) == 1 and subjects[0].startswith('Caf')
+    assert 'uid:raw-1' in core.load_processed()
+
+
+def test_a_failed_check_raises_instead_of_reporting_no_mail(monkeypatch):
+    def refuse(host, port):
+        raise ConnectionRefusedError('connection refused')
+    monkeypatch.setattr(core.poplib, 'POP3_SSL', refuse)
+
+    with pytest.raises(ConnectionRefusedError):
+        core.check_inbox()
+
+
+def test_an_unchanged_mailbox_skips_the_listing(server):
+    mail = server([message('stat-1')])
+    assert core.check_inbox() == 1
+    assert core.check_inbox() is None  # Same STAT as the last check
+    assert mail.listings == 1
+
+    mail.messages.append(message('stat-2'))
+    assert core.check_inbox() == 1
+    assert mail.listings == 2
+
+
+def test_after_ingest_deletes_once_committed_then_quits(server, monkeypatch):
+    monkeypatch.setitem(core.RETENTION, 'mode', 'after_ingest')
+    names = ['ingest-1', 'ingest-2']
+    mail = server([message(name) for name in names])
+    real_save = core.save_processed
+
+    def save_processed(*keys):
+        mail.events.append('processed')
+        real_save(*keys)
+    monkeypatch.setattr(core, 'save_processed', save_processed)
+
+    core.check_inbox()
+
+    assert stored(names) == names
+    assert mail.events == ['processed', 'DELE 1', 'DELE 2', 'QUIT']
+    # Gone from the server, so gone from the processed set and the ledger too
+    assert not {'uid:ingest-1', 'uid:ingest-2'} & core.load_processed()
+    assert not {'ingest-1', 'ingest-2'} & core.retention_ledger.uids()
+
+
+def test_after_days_waits_for_age_and_delivery(server, monkeypatch):
+    monkeypatch.setitem(core.RETENTION, 'mode', 'after_days')
+    mail = server([message('aged-1')])
+    core.check_inbox()
+    assert not mail.deleted and 'aged-1' in core.retention_ledger.uids()
+
+    # Old enough, but a route has not delivered it yet
+    core.retention_ledger.track('aged-1', ['discord'], when=time.time() - 31 * 86400)
+    assert core.check_inbox() is None
+    assert not mail.deleted
+
+    core.retention_ledger.delivered('aged-1', 'discord', True)
+    core.check_inbox()  # Same STAT, but something is due: the session goes ahead
+    assert mail.events[-2:] == ['DELE 1', 'QUIT']
+    assert 'aged-1' not in core.retention_ledger.uids()
+
+
+def test_a_second_copy_of_a_message_is_skipped(server):
+    name, raw = message('dup-1')
+    server([(name, raw), ('dup-1-copy', raw.replace(b'<dup-1@example.com>', b'< dup-1@EXAMPLE.com>'))])
+
+    core.check_inbox()
+
+    assert [e['uid'] for e in core.inbox_store.snapshot() if (e['uid'] or '').startswith('dup-1')] == ['dup-1']
+    assert {'uid:dup-1', 'uid:dup-1-copy'} <= core.load_processed()
+
+    # Redelivered later (other mailbox, renumbered server): still a duplicate
+    server([('dup-1-again', raw)])
+    core.check_inbox()
+    assert [e['uid'] for e in core.inbox_store.snapshot() if (e['uid'] or '').startswith('dup-1')] == ['dup-1']
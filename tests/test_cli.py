@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import ravenclaw_cli
+import ravenclaw_core as core
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(capsys, *argv):
+    code = ravenclaw_cli.main(list(argv))
+    out, err = capsys.readouterr()
+    return code, out, err
+
+
+def test_schedule_queues_the_email(capsys):
+    target = (datetime.now() + timedelta(days=1)).isoformat(timespec='seconds')
+    code, out, _ = run(capsys, 'schedule', 'cli@example.com', 'Subject', 'Body', target, '--cc', 'c@example.com')
+    assert code == 0
+    scheduled = json.loads(out)
+    entries = {e.id: e for e in core.load_scheduled_queue()['emails']}
+    assert entries[scheduled['id']].to == 'cli@example.com'
+    assert entries[scheduled['id']].cc == ['c@example.com']
+
+
+def test_schedule_rejects_other_domains_and_past_times(capsys):
+    target = (datetime.now() + timedelta(days=1)).isoformat(timespec='seconds')
+    code, out, err = run(capsys, 'schedule', 'x@elsewhere.org', 'S', 'B', target)
+    assert (code, out) == (1, '') and 'Domain not allowed' in err
+
+    code, _, err = run(capsys, 'schedule', 'cli@example.com', 'S', 'B', '2000-01-01T00:00:00')
+    assert code == 1 and 'future' in err
+
+
+def test_stats_without_loading_flask(tmp_path):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run(
+        [sys.executable, '-c', 'import sys, ravenclaw_cli; code = ravenclaw_cli.main(["stats"]); '
+                               'print("flask" in sys.modules); sys.exit(code)'],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    lines = result.stdout.splitlines()  # Log lines, the stats JSON (indented), then the flag
+    stats = json.loads('\n'.join(lines[lines.index('{'):lines.index('}') + 1]))
+    assert 'total' in stats
+    assert lines[-1] == 'False'
@@ -0,0 +1,34 @@
+import threading
+
+from ravenclaw_counters import Counters
+from ravenclaw_persist import GroupCommitWriter
+
+
+def test_a_burst_of_increments_is_one_write(tmp_path):
+    path = str(tmp_path / 'counters.json')
+    writer = GroupCommitWriter(0.05)
+    counters = Counters(path, writer)
+
+    def bump():
+        for _ in range(100):
+            counters.incr('received')
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writer.flush()
+
+    assert counters.snapshot() == {'received': 400}
+    assert writer.files_written < 10
+    assert Counters(path, writer).snapshot() == {'received': 400}
+
+
+def test_version_only_moves_on_change(tmp_path):
+    counters = Counters(str(tmp_path / 'counters.json'), GroupCommitWriter(0.001))
+    counters.incr('forwarded', 0)
+    assert counters.version == 0 and counters.snapshot() == {}
+    counters.incr('forwarded', 3)
+    counters.incr('rejected')
+    assert counters.version == 2
+    assert counters.snapshot() == {'forwarded': 3, 'rejected': 1}
@@ -0,0 +1,76 @@
+import email.parser
+import email.policy
+
+from ravenclaw_dedupe import DedupeIndex, message_key, normalize_message_id
+from ravenclaw_persist import GroupCommitWriter
+
+
+def headers(raw):
+    return email.parser.BytesHeaderParser(policy=email.policy.compat32).parsebytes(raw + b'\r\n\r\n')
+
+
+def test_message_ids_are_normalized():
+    assert normalize_message_id(' <Local.Part@Example.COM> ') == 'Local.Part@example.com'
+    assert normalize_message_id('<abc@\r\n example.com>') == 'abc@example.com'
+    assert normalize_message_id('no-brackets@Mail.Example.com') == 'no-brackets@mail.example.com'
+    assert normalize_message_id('<>') is None
+    assert normalize_message_id(None) is None
+
+
+def test_copies_of_one_message_share_a_key():
+    first = headers(b'From: a@example.com\r\nMessage-ID: <x1@Example.com>\r\nReceived: by mx1')
+    copy = headers(b'From: a@example.com\r\nMessage-ID:  <x1@example.COM>\r\nReceived: by mx2')
+    assert message_key(first, None) == message_key(copy, None)  # body_prefix is not needed
+    assert message_key(first, None) != message_key(headers(b'Message-ID: <X1@example.com>'), None)
+
+
+def test_without_message_id_headers_and_body_are_hashed():
+    raw = b'From: A <A@Example.com>\r\nDate: Mon, 1 Jun 2026 08:00:00 +0000\r\nSubject: hi'
+    key = message_key(headers(raw), lambda: b'body')
+    assert key == message_key(headers(raw.replace(b'A <A@Example.com>', b'a@example.com')), lambda: b'body')
+    assert key != message_key(headers(raw.replace(b'hi', b'hello')), lambda: b'body')
+
+
+def test_index_forgets_the_oldest_and_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'dedupe.txt')
+    writer = GroupCommitWriter(0.001)
+    index = DedupeIndex(path, 3, writer)
+    index.add([1, 2])
+    index.add([3, 4])
+    assert 1 not in index and all(key in index for key in (2, 3, 4))
+    assert index.stats()['keys'] == 3
+
+    reloaded = DedupeIndex(path, 3, writer)
+    assert all(key in reloaded for key in (2, 3, 4)) and 5 not in reloaded
+
+
+def test_a_key_added_by_another_bridge_is_seen(tmp_path):
+    path = str(tmp_path / 'dedupe.txt')
+    writer = GroupCommitWriter(0.001)
+    ours, theirs = DedupeIndex(path, 100, writer), DedupeIndex(path, 100, writer)
+    assert 7 not in ours
+    theirs.add([7])
+    assert 7 in ours
+
+
+def test_raw_8bit_subject_and_date_are_keyed():
+    raw = b'From: a@example.com\r\nSubject: Caf\xe9 menu\r\nDate: Mon, 1 Jun 2026 08:00:00 +0000\xa0'
+    key = message_key(headers(raw), lambda: b'hello')
+    assert key == message_key(headers(raw), lambda: b'hello')
+    assert key != message_key(headers(raw), lambda: b'other body')
+
+
+def test_raw_8bit_message_id_is_keyed():
+    msg = headers(b'From: a@example.com\r\nMessage-ID: <caf\xe9@Example.COM>')
+    assert message_key(msg, lambda: b'') == message_key(headers(b'Message-ID: <caf\xe9@example.com>'), None)
+
+
+def test_compaction_keeps_keys_other_bridges_appended(tmp_path):
+    path = str(tmp_path / 'dedupe.txt')
+    writer = GroupCommitWriter(0.001)
+    ours, theirs = DedupeIndex(path, 4, writer), DedupeIndex(path, 4, writer)
+    theirs.add([1, 2])
+    ours.add(range(3, 11))  # Twice the capacity: compacts the shared file
+
+    reloaded = DedupeIndex(path, 4, writer)
+    assert 1 in reloaded and 2 in reloaded
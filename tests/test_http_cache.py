@@ -0,0 +1,64 @@
+import gzip
+import json
+
+import pytest
+
+flask = pytest.importorskip('flask')
+import ravenclaw  # noqa: E402
+from ravenclaw_httpcache import etag_matches, negotiate  # noqa: E402
+from ravenclaw_records import EmailRecord  # noqa: E402
+
+
+def add_email(name, body='b'):
+    ravenclaw.inbox_store.add([EmailRecord.from_dict({
+        'id': f'<{name}@example.com>', 'msg_num': '', 'sender': 'a@example.com', 'subject': name, 'body': body,
+        'timestamp': 0, 'read': False, 'replied': False})])
+
+
+def test_unchanged_inbox_is_answered_with_304():
+    client = ravenclaw.app.test_client()
+    add_email('etag-1')
+    first = client.get('/inbox')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.headers['Vary'] == 'Accept-Encoding'
+
+    again = client.get('/inbox', headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.data == b''
+    assert client.get('/inbox', headers={'If-None-Match': f'"other", W/{etag}'}).status_code == 304
+
+    add_email('etag-2')
+    changed = client.get('/inbox', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert '<etag-2@example.com>' in {e['id'] for e in changed.get_json()['emails']}
+
+
+def test_large_views_are_gzipped_when_the_client_accepts_it():
+    client = ravenclaw.app.test_client()
+    add_email('gzip-1', body='x' * 4096)
+    plain = client.get('/unread')
+    zipped = client.get('/unread', headers={'Accept-Encoding': 'gzip, deflate;q=0.5'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert len(zipped.data) < len(plain.data)
+    assert json.loads(gzip.decompress(zipped.data)) == plain.get_json()
+    # Each representation has its own ETag
+    assert zipped.headers['ETag'] != plain.headers['ETag']
+    assert client.get('/unread', headers={'If-None-Match': plain.headers['ETag'],
+                                          'Accept-Encoding': 'gzip'}).status_code == 200
+
+
+def test_encoding_negotiation():
+    assert negotiate(None) is None
+    assert negotiate('br') is None
+    assert negotiate('deflate, gzip') == 'gzip'  # Tie: gzip preferred
+    assert negotiate('gzip;q=0.2, deflate;q=0.8') == 'deflate'
+    assert negotiate('*;q=0.5') == 'gzip'
+    assert negotiate('gzip;q=0') is None
+
+
+def test_etag_matching():
+    assert etag_matches('*', '"a"')
+    assert etag_matches('"b", W/"a"', '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert not etag_matches(None, '"a"')
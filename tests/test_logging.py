@@ -0,0 +1,53 @@
+import json
+import logging
+import sys
+import time
+
+from ravenclaw_logging import JsonFormatter, RepeatFilter, dropped, setup_logging
+
+
+def record(msg, level=logging.WARNING, args=(), exc_info=None):
+    return logging.LogRecord('test', level, __file__, 1, msg, args, exc_info)
+
+
+def test_file_lines_are_json():
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        rec = record('failed %s', logging.ERROR, ('sync',), sys.exc_info())
+    entry = json.loads(JsonFormatter('RAVENCLAW').format(rec))
+    assert entry['level'] == 'ERROR' and entry['component'] == 'RAVENCLAW'
+    assert entry['msg'] == 'failed sync'
+    assert 'ValueError: boom' in entry['exc']
+
+
+def test_identical_warnings_are_rate_limited():
+    repeats = RepeatFilter(window=0.1, burst=2)
+    passed = [repeats.filter(record('SMTP down')) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert repeats.filter(record('other problem'))
+    assert all(repeats.filter(record('routine', logging.INFO)) for _ in range(5))
+
+    time.sleep(0.15)
+    summary = record('SMTP down')
+    assert repeats.filter(summary)
+    assert summary.suppressed == 3
+    assert summary.getMessage() == 'SMTP down (+3 identical suppressed)'
+
+
+def test_a_full_queue_drops_instead_of_blocking(tmp_path, monkeypatch):
+    monkeypatch.setenv('LOG_QUEUE_SIZE', '1')
+    path = tmp_path / 'flood.log'
+    logger = setup_logging('ravenclaw-test-flood', 'FLOOD', str(path), console=False)
+
+    for i in range(2000):
+        logger.info('line %d', i)
+    assert dropped(logger) > 0
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        written = len(path.read_text().splitlines())
+        if written + dropped(logger) == 2000:
+            break
+        time.sleep(0.01)
+    assert written + dropped(logger) == 2000
@@ -0,0 +1,71 @@
+import json
+import os
+import stat
+
+import pytest
+
+from ravenclaw_persist import GroupCommitWriter, atomic_write_text, read_json
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX permissions')
+def test_atomic_write_leaves_the_process_umask_alone(tmp_path, monkeypatch):
+    umask = os.umask(0o022)
+    os.umask(umask)
+
+    def no_umask(mask):
+        raise AssertionError('umask changed while writing')
+    monkeypatch.setattr(os, 'umask', no_umask)
+
+    path = str(tmp_path / 'state.json')
+    atomic_write_text(path, '{}')
+    assert mode(path) == 0o666 & ~umask
+
+    os.chmod(path, 0o640)
+    atomic_write_text(path, '[]')
+    assert mode(path) == 0o640
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == '[]'
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_a_burst_is_one_commit_and_the_latest_replacement_wins(tmp_path):
+    writer = GroupCommitWriter(0.05)
+    state, journal = str(tmp_path / 'state.json'), str(tmp_path / 'journal.log')
+    rendered = []
+    futures = [writer.replace(state, lambda n=n: rendered.append(n) or str(n), wait=False) for n in range(5)]
+    futures += [writer.append(journal, f'{n}\n', wait=False) for n in range(3)]
+    for future in futures:
+        future.result()
+
+    assert read(state) == '4'
+    assert rendered == [4]  # Superseded versions are never rendered
+    assert read(journal) == '0\n1\n2\n'
+    assert writer.commits == 1 and writer.files_written == 2
+
+
+def test_a_failed_commit_reaches_every_waiter(tmp_path):
+    writer = GroupCommitWriter(0.001)
+    path = str(tmp_path / 'missing-dir' / 'state.json')
+    with pytest.raises(OSError):
+        writer.replace_json(path, {'a': 1})
+    writer.replace_json(str(tmp_path / 'ok.json'), {'a': 1})  # The writer keeps going
+    assert json.loads(read(str(tmp_path / 'ok.json'))) == {'a': 1}
+
+
+def test_read_json_moves_a_corrupt_file_aside(tmp_path):
+    path = str(tmp_path / 'state.json')
+    assert read_json(path, lambda: {'default': True}) == {'default': True}
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"truncated": ')
+    assert read_json(path, dict) == {}
+    assert not os.path.exists(path)
+    assert [name for name in os.listdir(tmp_path) if name.startswith('state.json.corrupt-')]
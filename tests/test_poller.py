@@ -0,0 +1,33 @@
+import pytest
+
+from ravenclaw_poller import AdaptivePoller
+
+
+def poller(*results):
+    results = list(results)
+
+    def check():
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return AdaptivePoller(check, 60, 1800)
+
+
+def test_backs_off_when_idle_and_resets_on_mail():
+    p = poller(0, None, 0, 3, 0)
+    assert [p.poll_once() for _ in range(5)] == [120, 240, 480, 60, 120]
+    assert p.snapshot()['stat_skips'] == 1
+    assert p.snapshot()['last_new'] == 0
+
+
+def test_a_failed_check_keeps_the_interval():
+    p = poller(0, OSError('connection refused'), OSError('connection refused'), 0)
+    assert p.poll_once() == 120
+    for _ in range(2):
+        with pytest.raises(OSError):
+            p.poll_once()
+        assert p.interval == 120
+    assert p.poll_once() == 240
+    assert p.snapshot()['failures'] == 2
+    assert p.snapshot()['checks'] == 4
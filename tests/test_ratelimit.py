@@ -0,0 +1,61 @@
+import pytest
+
+from ravenclaw_ratelimit import SendLimiter, parse_domain_rates, parse_rate
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_rates():
+    assert parse_rate('60/min') == (1.0, 60)
+    assert parse_rate('2/s') == (2.0, 2)
+    assert parse_rate('') is None
+    assert parse_domain_rates('Gmail.com=20/min, example.com=100/h') == {
+        'gmail.com': (20 / 60, 20), 'example.com': (100 / 3600, 100)}
+    for bad in ('0/min', '5/fortnight', 'many/s'):
+        with pytest.raises(ValueError):
+            parse_rate(bad)
+
+
+def test_burst_then_refill_without_blocking():
+    clock = Clock()
+    limiter = SendLimiter(global_rate=parse_rate('2/s'), clock=clock)
+    assert limiter.try_acquire(['a@example.com']) == (True, 0.0)
+    assert limiter.try_acquire(['b@example.com']) == (True, 0.0)
+    allowed, wait = limiter.try_acquire(['c@example.com'])
+    assert not allowed and wait == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert limiter.try_acquire(['c@example.com'])[0]
+    assert limiter.stats() == {'enabled': True, 'allowed': 3, 'throttled': 1, 'tracked_domains': 0}
+
+
+def test_a_throttled_domain_does_not_hold_up_others():
+    clock = Clock()
+    limiter = SendLimiter(domain_rates=parse_domain_rates('slow.org=1/min'), default_domain_rate=parse_rate('10/s'),
+                          clock=clock)
+    assert limiter.try_acquire(['a@slow.org'])[0]
+    allowed, wait = limiter.try_acquire(['b@slow.org'])
+    assert not allowed and wait == pytest.approx(60)
+    assert limiter.try_acquire(['a@example.com'])[0]
+
+
+def test_all_or_nothing_across_buckets():
+    clock = Clock()
+    limiter = SendLimiter(domain_rates=parse_domain_rates('slow.org=1/min,fast.org=10/s'), clock=clock)
+    assert limiter.try_acquire(['a@slow.org'])[0]
+    # The slow.org recipient blocks the message, so no fast.org token is taken either
+    for _ in range(3):
+        assert not limiter.try_acquire(['x@fast.org', 'b@slow.org'])[0]
+    assert all(limiter.try_acquire([f'{n}@fast.org'])[0] for n in range(10))
+
+
+def test_disabled_limiter_allows_everything():
+    limiter = SendLimiter()
+    assert not limiter.stats()['enabled']
+    assert all(limiter.try_acquire(['a@example.com'])[0] for _ in range(1000))
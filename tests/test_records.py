@@ -0,0 +1,14 @@
+from ravenclaw_bench_records import measure, sample_email
+from ravenclaw_records import EmailRecord
+
+
+def test_records_round_trip_the_json_entry():
+    entry = dict(sample_email(7), extra_field='kept')
+    record = EmailRecord.from_dict(dict(entry))
+    assert record.to_dict() == entry
+    assert record.received == 1780000420  # Held as epoch seconds, served as ISO-8601
+    assert record.get('missing', 'default') == 'default'
+
+
+def test_records_hold_the_inbox_in_well_under_the_memory_of_dicts():
+    assert measure(5000)['ratio'] < 0.7
@@ -0,0 +1,124 @@
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import ravenclaw_recurring
+from ravenclaw_persist import GroupCommitWriter
+from ravenclaw_recurring import Recurrence, RecurringStore
+
+NEW_YORK = ZoneInfo('America/New_York')
+
+
+class NullWriter:
+    def append(self, path, text, wait=True):
+        pass
+
+    def replace(self, path, render, wait=True):
+        pass
+
+    def flush(self):
+        pass
+
+
+def store(directory):
+    directory.mkdir(exist_ok=True)
+    return RecurringStore(str(directory / 'recurring.jsonl'), NullWriter())
+
+
+def test_default_start_is_now_in_any_timezone(tmp_path, monkeypatch):
+    # 07:58 UTC is 03:58 in New York (EDT): an hourly cron fires next at 04:00 New York time
+    now = datetime(2026, 6, 1, 7, 58, tzinfo=timezone.utc).timestamp()
+    monkeypatch.setattr(ravenclaw_recurring.time, 'time', lambda: now)
+    hourly = store(tmp_path / 'ny')
+    hourly.add({'to': 'a@example.com', 'subject': 's', 'body': 'b',
+                'cron': '0 * * * *', 'timezone': 'America/New_York'})
+    assert hourly.next_due() == datetime(2026, 6, 1, 4, 0, tzinfo=NEW_YORK).timestamp()
+
+    interval = store(tmp_path / 'tokyo')
+    added = interval.add({'to': 'a@example.com', 'subject': 's', 'body': 'b',
+                          'every': '2h', 'timezone': 'Asia/Tokyo'})
+    # First fire at creation, not shifted by Tokyo's +9h offset
+    assert interval.next_due() == now
+    assert [definition['id'] for definition, _ in interval.due(now)] == [added['id']]
+
+
+@pytest.mark.parametrize('count', [0, -1, '0', 'many'])
+def test_count_must_be_positive(count):
+    with pytest.raises(ValueError):
+        Recurrence({'every': '1h', 'count': count})
+
+
+def test_count_limits_fires():
+    recurrence = Recurrence({'every': '1h', 'count': 2, 'start': 1000})
+    assert recurrence.next_after(999, fired=1) == 1000
+    assert recurrence.next_after(999, fired=2) is None
+    assert Recurrence({'every': '1h', 'start': int(time.time())}).count is None
+
+
+def at(*args):
+    return datetime(*args, tzinfo=NEW_YORK).timestamp()
+
+
+def test_weekday_cron_skips_the_weekend():
+    recurrence = Recurrence({'cron': '0 9 * * 1-5', 'timezone': 'America/New_York', 'start': at(2026, 6, 1)})
+    friday = at(2026, 6, 5, 9, 0)
+    assert recurrence.next_after(friday) == at(2026, 6, 8, 9, 0)  # Monday
+    assert recurrence.next_after(at(2026, 6, 8, 8, 59)) == at(2026, 6, 8, 9, 0)
+
+
+def test_daily_times_keep_their_wall_clock_across_dst():
+    # New York springs forward on 8 March 2026: 02:00 -> 03:00
+    daily = Recurrence({'every': '1d', 'timezone': 'America/New_York', 'start': '2026-03-07T09:00:00'})
+    sunday = daily.next_after(at(2026, 3, 7, 9, 0))
+    assert sunday == at(2026, 3, 8, 9, 0)
+    assert sunday - at(2026, 3, 7, 9, 0) == 23 * 3600
+
+    # 02:30 does not exist on the 8th: that occurrence is skipped, not moved
+    gap = Recurrence({'cron': '30 2 * * *', 'timezone': 'America/New_York', 'start': at(2026, 3, 7)})
+    assert gap.next_after(at(2026, 3, 7, 3, 0)) == at(2026, 3, 9, 2, 30)
+
+
+def test_fires_are_popped_once_and_a_count_finishes_the_schedule(tmp_path):
+    schedules = store(tmp_path)
+    added = schedules.add({'to': 'a@example.com', 'subject': 's', 'body': 'b', 'every': '1h',
+                           'count': 2, 'start': 1_000_000})
+    first = schedules.next_due()
+    # Long past start: the next slot on the hourly grid, not a backlog of missed ones
+    assert (first - 1_000_000) % 3600 == 0 and first - 3600 < time.time() <= first + 1
+    assert schedules.due(first - 1) == []
+
+    [(definition, occurrence)] = schedules.due(first)
+    assert definition['id'] == added['id'] and occurrence == first
+    assert schedules.due(first) == []  # Taken until fired() or postpone()
+
+    schedules.postpone(added['id'], occurrence, first + 60)
+    assert schedules.next_due() == first + 60
+    assert schedules.failed_attempt(added['id']) == 1
+    [(_, retried)] = schedules.due(first + 60)
+    assert retried == occurrence
+
+    schedules.fired(added['id'], occurrence)
+    assert len(schedules) == 1
+    [(_, second)] = schedules.due(float('inf'))
+    schedules.fired(added['id'], second)
+    assert len(schedules) == 0 and schedules.next_due() is None
+
+
+def test_the_journal_restores_fires_and_cancellations(tmp_path):
+    path = str(tmp_path / 'recurring.jsonl')
+    writer = GroupCommitWriter(0.001)
+    schedules = RecurringStore(path, writer)
+    spec = {'to': 'a@example.com', 'subject': 's', 'body': 'b', 'every': '1h', 'count': 3}
+    kept = schedules.add(spec)['id']
+    cancelled = schedules.add(spec)['id']
+    [(_, occurrence)] = [fire for fire in schedules.due() if fire[0]['id'] == kept]
+    schedules.fired(kept, occurrence)
+    assert schedules.cancel(cancelled) and not schedules.cancel(cancelled)
+    schedules.flush()
+
+    restarted = RecurringStore(path, writer)
+    [view] = restarted.list()
+    assert view['id'] == kept and view['fired'] == 1
+    assert restarted.next_due() == occurrence + 3600
@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+
+import pytest
+
+import ravenclaw_routing
+from ravenclaw_persist import GroupCommitWriter
+from ravenclaw_routing import PendingRetries, Router
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_pending_retries_survive_a_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(ravenclaw_routing, 'RETRY_DELAY', 0.05)
+    path = str(tmp_path / 'retries.json')
+    writer = GroupCommitWriter(0.001)
+    email = {'id': '<a@example.com>', 'sender': 'a@example.com', 'subject': 's', 'body': 'b'}
+
+    attempts = []
+    failing = Router({}, {'discord': lambda dest, e: attempts.append(e['id']) or False},
+                     retries=PendingRetries(path, writer))
+    failing.dispatch(email)
+    wait_for(lambda: failing.workers['discord'].retrying() == 1)
+    writer.flush()
+    with open(path) as f:
+        assert [(e['destination'], e['attempt'], e['email']['id']) for e in json.load(f)] == \
+            [('discord', 1, '<a@example.com>')]
+
+    # "Restart": a new router over the saved file resumes the backoff and settles it
+    # (a copy, since the first router's worker thread keeps retrying into the original)
+    restarted = str(tmp_path / 'restarted.json')
+    with open(path) as src, open(restarted, 'w') as dst:
+        dst.write(src.read())
+    path = restarted
+    delivered = []
+    results = []
+    Router({}, {'discord': lambda dest, e: delivered.append(e['id']) or True},
+           on_result=lambda name, ok, e: results.append((name, ok, e['id'])),
+           retries=PendingRetries(path, writer))
+    wait_for(lambda: delivered)
+    assert results == [('discord', True, '<a@example.com>')]
+    writer.flush()
+    with open(path) as f:
+        assert json.load(f) == []
+
+
+def test_retries_for_removed_destinations_are_dropped(tmp_path):
+    path = tmp_path / 'retries.json'
+    path.write_text(json.dumps([{'destination': 'gone', 'due': 0, 'attempt': 2, 'email': {'id': '<x@example.com>'}}]))
+    retries = PendingRetries(str(path), GroupCommitWriter(0.001))
+    Router({}, {'discord': lambda dest, e: True}, retries=retries)
+    assert len(retries) == 0
+
+
+CONFIG = {
+    'destinations': {'ops': {'type': 'webhook', 'url': 'http://ops'}, 'support': {'type': 'webhook', 'url': 'http://s'}},
+    'rules': [
+        {'sender_domain': ['alerts.example.com'], 'to': ['ops']},
+        {'subject': '(?i)ticket|support', 'to': ['support'], 'stop': True},
+        {'header': {'X-Priority': '^1'}, 'to': ['ops', 'discord']}
+    ],
+    'default': ['discord']
+}
+SENDERS = {'webhook': lambda dest, e: True, 'discord': lambda dest, e: True}
+
+
+def route(sender, subject='hello', headers=None):
+    return Router(CONFIG, SENDERS).route({'sender': sender, 'subject': subject}, headers)
+
+
+def test_rules_match_in_order_with_subdomains_stop_and_default():
+    assert route('bot@alerts.example.com') == ['ops']
+    assert route('bot@eu.alerts.example.com') == ['ops']  # Subdomains match their parent
+    assert route('bot@example.com') == ['discord']  # No rule: the default
+    assert route('bot@alerts.example.com', 'Support ticket') == ['ops', 'support']
+    assert route('a@example.com', 'ticket', {'X-Priority': '1 (Highest)'}) == ['support']  # stop
+    assert route('a@example.com', headers={'X-Priority': '1 (Highest)'}) == ['ops', 'discord']
+
+
+def test_bad_routes_fail_at_startup():
+    with pytest.raises(ValueError, match='unknown destination'):
+        Router({'rules': [{'to': ['nowhere']}]}, SENDERS)
+    with pytest.raises(ValueError, match='unknown type'):
+        Router({'destinations': {'x': {'type': 'carrier-pigeon'}}}, SENDERS)
+
+
+def test_a_slow_destination_only_delays_itself():
+    release = threading.Event()
+    delivered = []
+    senders = {'webhook': lambda dest, e: release.wait(5) and delivered.append(dest['url']) or True,
+               'discord': lambda dest, e: delivered.append('discord') or True}
+    router = Router({'destinations': {'slow': {'type': 'webhook', 'url': 'slow'}}}, senders)
+    assert router.dispatch({'id': '<x@example.com>'}, ['slow', 'discord']) == ['slow', 'discord']
+
+    wait_for(lambda: delivered == ['discord'])
+    release.set()
+    assert router.wait_idle(5)
+    assert delivered == ['discord', 'slow']
+    assert router.stats()['slow']['delivered'] == 1
+
+
+def test_failed_deliveries_back_off_then_give_up(monkeypatch):
+    monkeypatch.setattr(ravenclaw_routing, 'RETRY_DELAY', 0.01)
+    attempts, results = [], []
+    router = Router({}, {'discord': lambda dest, e: attempts.append(time.time()) and False},
+                    on_result=lambda name, ok, e: results.append((name, ok)))
+    router.dispatch({'id': '<x@example.com>'})
+
+    wait_for(lambda: results)
+    assert results == [('discord', False)]
+    assert len(attempts) == ravenclaw_routing.RETRY_ATTEMPTS
+    gaps = [b - a for a, b in zip(attempts, attempts[1:])]
+    assert gaps[-1] > gaps[0]  # Exponential backoff
+    assert router.stats()['discord']['failed'] == 1
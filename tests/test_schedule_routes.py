@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+flask = pytest.importorskip('flask')
+import ravenclaw  # noqa: E402
+from ravenclaw_records import EmailRecord  # noqa: E402
+
+
+def item(**overrides):
+    target = (datetime.now() + timedelta(days=1)).isoformat(timespec='seconds')
+    return {'to': 'a@example.com', 'subject': 's', 'body': 'b', 'target_time': target, **overrides}
+
+
+def test_batch_reports_mistyped_items_per_index():
+    client = ravenclaw.app.test_client()
+    response = client.post('/schedule/batch', json={'emails': [item(), item(target_time=5), item(to=['x'])]})
+    assert response.status_code == 400
+    errors = response.get_json()['errors']
+    assert [(e['index'], e['code']) for e in errors] == [(1, 400), (2, 400)]
+    assert 'target_time' in errors[0]['error']
+
+
+@pytest.mark.parametrize('field, value', [('cc', 5), ('bcc', {'a': 1}), ('cc', ['a@example.com', 5]),
+                                          ('subject', None), ('body', ['b'])])
+def test_batch_rejects_mistyped_fields(field, value):
+    response = ravenclaw.app.test_client().post('/schedule/batch', json={'emails': [item(**{field: value})]})
+    assert response.status_code == 400
+    assert field in response.get_json()['errors'][0]['error']
+
+
+def test_batch_accepts_cc_and_bcc_lists():
+    response = ravenclaw.app.test_client().post(
+        '/schedule/batch', json={'emails': [item(cc='c@example.com', bcc=['d@example.com', 'e@example.com'])]})
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 1
+
+
+def test_single_schedule_rejects_mistyped_target_time():
+    response = ravenclaw.app.test_client().post('/schedule', json=item(target_time=None))
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('path', ['/schedule/cancel/batch', '/mark-read/batch'])
+@pytest.mark.parametrize('ids', [[['x']], [{'a': 1}], ['ok', 5]])
+def test_batch_ids_must_be_strings(path, ids):
+    response = ravenclaw.app.test_client().post(path, json={'ids': ids})
+    assert response.status_code == 400
+    assert 'ids' in response.get_json()['error']
+
+
+def recurring(**overrides):
+    return {'to': 'a@example.com', 'subject': 's', 'body': 'b', 'every': '1d', **overrides}
+
+
+@pytest.mark.parametrize('field, value', [('to', ['x']), ('subject', 5), ('body', None), ('cron', 5),
+                                          ('every', 60), ('timezone', 5), ('start', 5), ('until', ['2027']),
+                                          ('count', '3'), ('count', 2.5), ('count', True), ('cc', 5)])
+def test_recurring_rejects_mistyped_fields(field, value):
+    data = recurring(**{field: value})
+    if field == 'cron':
+        del data['every']
+    response = ravenclaw.app.test_client().post('/schedule/recurring', json=data)
+    assert response.status_code == 400
+    assert field in response.get_json()['error']
+
+
+def test_recurring_accepts_well_typed_fields():
+    response = ravenclaw.app.test_client().post('/schedule/recurring', json=recurring(
+        timezone='Europe/Berlin', count=3, cc=['c@example.com']))
+    assert response.status_code == 200
+    assert ravenclaw.app.test_client().post(f"/schedule/recurring/cancel/{response.get_json()['id']}").status_code == 200
+
+
+@pytest.mark.parametrize('body', [{}, {'emails': []}, {'emails': 'x'}])
+def test_batch_needs_a_list_of_emails(body):
+    response = ravenclaw.app.test_client().post('/schedule/batch', json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Missing: emails'
+
+
+def test_batch_is_all_or_nothing():
+    client = ravenclaw.app.test_client()
+    pending = client.get('/schedule/list').get_json()['pending']
+    response = client.post('/schedule/batch', json={'emails': [item(), item(to='x@elsewhere.org'), 'x']})
+    assert response.status_code == 400
+    assert [(e['index'], e['code']) for e in response.get_json()['errors']] == [(1, 403), (2, 400)]
+    assert client.get('/schedule/list').get_json()['pending'] == pending
+
+
+def test_cancel_batch_reports_what_it_did_not_find():
+    client = ravenclaw.app.test_client()
+    ids = client.post('/schedule/batch', json={'emails': [item(), item()]}).get_json()['ids']
+    response = client.post('/schedule/cancel/batch', json={'ids': ids + ['sched_missing']})
+    assert response.status_code == 200
+    assert sorted(response.get_json()['cancelled']) == sorted(ids)
+    assert response.get_json()['not_found'] == ['sched_missing']
+    # Already cancelled: nothing left to cancel
+    assert client.post('/schedule/cancel/batch', json={'ids': ids}).get_json()['not_found'] == ids
+
+
+def test_mark_read_batch_reports_what_it_did_not_find():
+    ravenclaw.inbox_store.add([EmailRecord.from_dict({
+        'id': '<batch-read@example.com>', 'msg_num': '', 'sender': 'a@example.com', 'subject': 's', 'body': 'b',
+        'timestamp': 0, 'read': False, 'replied': False})])
+    response = ravenclaw.app.test_client().post('/mark-read/batch', json={'ids': ['<batch-read@example.com>', 'nope']})
+    assert response.status_code == 200
+    assert response.get_json()['marked'] == ['<batch-read@example.com>']
+    assert response.get_json()['not_found'] == ['nope']
+    assert ravenclaw.inbox_store.find('<batch-read@example.com>')['read'] is True
@@ -0,0 +1,42 @@
+import pytest
+
+from ravenclaw_soak import BUDGETS, ENTRY_METRICS, evaluate, main
+
+
+def samples(days, leak_per_day=0.0, warmup=10):
+    """Hourly samples: flat after the warm-up, plus leak_per_day of RSS"""
+    points = []
+    for hour in range(int(days * 24)):
+        day = hour / 24
+        sample = {'day': day, 'rss_mb': 50 + leak_per_day * day, 'fds': 12, 'threads': 9,
+                  'state_kb': 300.0, 'logs_kb': None}
+        sample.update({metric: 1000 if day >= warmup else int(100 * day) for metric in ENTRY_METRICS})
+        points.append(sample)
+    return points
+
+
+def test_a_flat_run_passes_and_unmeasured_metrics_are_skipped():
+    results = evaluate(samples(28), BUDGETS, 10)
+    assert results['logs_kb']['status'] == 'skipped'
+    assert all(r['status'] == 'ok' for metric, r in results.items() if metric != 'logs_kb')
+    assert results['inbox']['budget'] == 100  # 10% of the starting 1000 entries
+
+
+def test_a_slow_leak_fails_its_budget():
+    results = evaluate(samples(28, leak_per_day=2.0), BUDGETS, 10)
+    assert results['rss_mb']['status'] == 'FAIL'
+    assert results['rss_mb']['per_day'] == pytest.approx(2.0)
+    assert results['fds']['status'] == 'ok'
+
+
+def test_too_few_samples_after_the_warmup():
+    assert 'error' in evaluate(samples(10.2), BUDGETS, 10)
+
+
+@pytest.mark.parametrize('argv', [['--warmup-days', '5'], ['--warmup-days', '7'],
+                                  ['--retention-days', '12'], ['--days', '10']])
+def test_warmups_that_end_too_early_are_refused(argv, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(argv)
+    assert exit_info.value.code == 2
+    assert '--' in capsys.readouterr().err
@@ -0,0 +1,66 @@
+import json
+import time
+
+import pytest
+
+from ravenclaw_logging import setup_sink
+from ravenclaw_tracing import STATUS_ERROR, Tracer, timeline
+
+
+@pytest.fixture
+def tracer(tmp_path):
+    path = str(tmp_path / 'traces.jsonl')
+    return Tracer(setup_sink(f'ravenclaw-test-traces-{tmp_path.name}', path), path, keep=2)
+
+
+def written(path, count):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        with open(path) as f:
+            lines = f.read().splitlines()
+        if len(lines) >= count:
+            return [json.loads(line) for line in lines]
+        time.sleep(0.01)
+    raise AssertionError(f'{count} spans not written')
+
+
+def test_stages_are_recorded_in_order_as_otlp_spans(tracer):
+    trace_id = tracer.new_trace()
+    with tracer.span(trace_id, 'fetch', **{'email.message_id': '<a@example.com>'}) as span:
+        span.set('bytes', 512)
+    with pytest.raises(ValueError):
+        with tracer.span(trace_id, 'forward', destination='discord'):
+            raise ValueError('webhook 500')
+
+    spans = tracer.spans(trace_id)
+    assert [s['name'] for s in spans] == ['fetch', 'forward']
+    assert {'key': 'bytes', 'value': {'intValue': '512'}} in spans[0]['attributes']
+    assert spans[1]['status'] == {'code': STATUS_ERROR, 'message': 'webhook 500'}
+
+    view = timeline(spans)
+    assert view['trace_id'] == trace_id
+    assert view['spans'][0]['attributes'] == {'email.message_id': '<a@example.com>', 'bytes': 512}
+    assert view['spans'][1]['status'] == 'error' and view['spans'][1]['error'] == 'webhook 500'
+
+
+def test_older_traces_are_found_in_the_files(tracer):
+    first = tracer.new_trace()
+    with tracer.span(first, 'fetch', **{'email.message_id': '<old@example.com>'}):
+        pass
+    for _ in range(3):  # Pushes the first trace out of memory (keep=2)
+        tracer.record(tracer.new_trace(), 'fetch', 0, 1)
+    written(tracer.path, 4)
+
+    assert tracer.find_trace('<old@example.com>') == first
+    assert [s['name'] for s in tracer.spans(first)] == ['fetch']
+    assert tracer.find_trace('<missing@example.com>') is None
+
+
+def test_tracing_off_makes_spans_no_ops():
+    tracer = Tracer()
+    trace_id = tracer.new_trace()
+    assert trace_id is None
+    with tracer.span(trace_id, 'fetch') as span:
+        span.set('bytes', 1)
+    tracer.record(trace_id, 'fetch', 0, 1)
+    assert tracer.spans('anything') == [] and timeline([]) == {'spans': [], 'total_ms': 0}